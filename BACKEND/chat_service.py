@@ -1,7 +1,20 @@
 import os
+import random
+import asyncio
 import logging
-from openai import OpenAI, AuthenticationError, RateLimitError, APIConnectionError, APIStatusError
-from typing import List, Dict, Any, Optional
+import httpx
+from openai import AsyncOpenAI, AuthenticationError, RateLimitError, APIConnectionError, APIStatusError
+from typing import List, Dict, Any, Optional, AsyncIterator
+from datetime import datetime, timezone, timedelta
+from services.chat_context import construir_contexto, separar_resumen, parse_timestamp
+from services.faq_cache import FAQCache
+from services.llm_limiter import (
+    AdaptiveConcurrencyLimiter,
+    LimiterSaturadoError,
+    PRIORIDAD_ALTA,
+    PRIORIDAD_NORMAL,
+    PRIORIDAD_BAJA,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -13,8 +26,33 @@ if not OPENAI_API_KEY:
         "El chatbot estará INACTIVO. Verificar variables de entorno."
     )
 
+# ── CLIENTE ASYNC CON POOL DE CONEXIONES ─────────────────────────────────────
+# Un único httpx.AsyncClient compartido por todo el proceso: las conexiones TLS
+# hacia api.openai.com se reutilizan entre requests (keep-alive) en lugar de
+# abrir un handshake nuevo por cada mensaje del chat.
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "15.0"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+
 # Inicializar cliente solo si hay key
-client = OpenAI(api_key=OPENAI_API_KEY, timeout=15.0) if OPENAI_API_KEY else None
+client = (
+    AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        timeout=OPENAI_TIMEOUT,
+        # Los 429 los maneja el limitador adaptativo (services.llm_limiter):
+        # si el SDK reintentara por su cuenta, el limitador no vería la presión.
+        max_retries=0,
+        http_client=httpx.AsyncClient(
+            timeout=OPENAI_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            ),
+        ),
+    )
+    if OPENAI_API_KEY
+    else None
+)
 
 SYSTEM_PROMPT = """
 Eres SapucAI, el asistente virtual de la plataforma "Sociedad Rural", un orientador inteligente agropecuario, comercial y rural.
@@ -59,10 +97,58 @@ Tu rol es asistir a usuarios del ámbito rural, estudiantes, productores, empren
   * "Se recomienda consultar con un profesional especializado para un diagnóstico o asesoramiento preciso."
 """
 
+# ── PRESUPUESTO DE CONTEXTO ──────────────────────────────────────────────────
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "4000"))
+SUMMARY_MAX_TOKENS = 300
+VISION_MODEL = "gpt-4o"
+
+SUMMARY_PROMPT = """
+Resumí la conversación entre un usuario y SapucAI (asistente agropecuario) para usarla como contexto en turnos futuros.
+Integrá el resumen previo si existe. Conservá solo datos útiles: animales, cultivos o negocio en cuestión, síntomas, edades,
+ubicación, lo observado en imágenes, hipótesis planteadas y recomendaciones ya dadas.
+Máximo 150 palabras, en español, en tercera persona, sin saludos.
+""".strip()
+
+
+# ── CACHÉ DE RESPUESTAS FRECUENTES ───────────────────────────────────────────
+# Solo se consulta en el primer turno de una conversación (sin historial o con
+# el último mensaje más viejo que FAQ_SESION_INACTIVA_MIN) y sin imagen.
+FAQ_SESION_INACTIVA_MIN = int(os.getenv("FAQ_SESION_INACTIVA_MIN", "30"))
+
+
+# ── LIMITADOR DE CONCURRENCIA ────────────────────────────────────────────────
+LLM_REINTENTOS_429 = int(os.getenv("LLM_REINTENTOS_429", "2"))
+
+
+def _backoff(intento: int) -> float:
+    """Espera exponencial con jitter antes de reintentar tras un 429."""
+    return (0.5 * (2 ** intento)) * (0.5 + random.random())
+
+
+# Modos de ChatRequest que se atienden antes que el chat casual
+MODOS_PRIORITARIOS = frozenset({"soporte"})
+
+
+def prioridad_para_modo(mode: Optional[str]) -> int:
+    return PRIORIDAD_ALTA if (mode or "").strip().lower() in MODOS_PRIORITARIOS else PRIORIDAD_NORMAL
+
+
 class ChatService:
     def __init__(self, model: str = "gpt-4o-mini"):
         self.model = model
         self._ready = client is not None
+        self.faq_cache = FAQCache(
+            umbral=float(os.getenv("FAQ_CACHE_UMBRAL", "0.85")),
+            ttl_seconds=int(os.getenv("FAQ_CACHE_TTL_HORAS", "168")) * 3600,
+            max_entries=int(os.getenv("FAQ_CACHE_MAX", "500")),
+            auto_aprobar=os.getenv("FAQ_CACHE_AUTO_APROBAR", "false").lower() == "true",
+        )
+        self.limiter = AdaptiveConcurrencyLimiter(
+            limite_inicial=float(os.getenv("LLM_LIMITE_INICIAL", "4")),
+            limite_max=float(os.getenv("LLM_LIMITE_MAX", "32")),
+            max_cola=int(os.getenv("LLM_MAX_COLA", "200")),
+            timeout_espera=float(os.getenv("LLM_TIMEOUT_COLA", "30")),
+        )
         if self._ready:
             logger.info(f"[ChatService] Iniciado con modelo '{self.model}'.")
         else:
@@ -71,98 +157,247 @@ class ChatService:
     def get_system_prompt(self) -> Dict[str, str]:
         return {"role": "system", "content": SYSTEM_PROMPT.strip()}
 
+    def build_context(
+        self,
+        history: List[Dict[str, Any]],
+        user_message: str,
+        image_url: Optional[str] = None,
+        image_detail: str = "auto"
+    ) -> Dict[str, Any]:
+        """
+        Arma el prompt dentro del presupuesto de tokens (ver services.chat_context)
+        y elige el modelo: gpt-4o solo si el turno actual trae imagen.
+        """
+        contexto = construir_contexto(
+            system_prompt=SYSTEM_PROMPT.strip(),
+            history=history,
+            user_message=user_message,
+            image_url=image_url,
+            presupuesto_tokens=CHAT_CONTEXT_TOKEN_BUDGET,
+            image_detail=image_detail,
+        )
+        contexto["model"] = VISION_MODEL if contexto["requiere_vision"] else self.model
+        return contexto
+
+    def es_primer_turno(self, history: List[Dict[str, Any]], image_url: Optional[str] = None) -> bool:
+        """True si el mensaje no depende de contexto previo (apto para el caché FAQ)."""
+        if image_url:
+            return False
+        resumen, mensajes = separar_resumen(history)
+        if not mensajes:
+            return resumen is None
+        ultimo = parse_timestamp(mensajes[-1].get("created_at"))
+        if ultimo is None:
+            return False
+        if ultimo.tzinfo is None:
+            ultimo = ultimo.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - ultimo > timedelta(minutes=FAQ_SESION_INACTIVA_MIN)
+
+    def _check_ready(self):
+        if not self._ready:
+            logger.error("[ChatService] Llamado sin OPENAI_API_KEY configurada.")
+            raise RuntimeError("El servicio de IA no está disponible. Contacte al administrador.")
+
+    def _to_runtime_error(self, e: Exception) -> RuntimeError:
+        """Traduce errores de OpenAI a RuntimeError con mensaje apto para el usuario."""
+        if isinstance(e, AuthenticationError):
+            logger.error(f"[ChatService] AuthenticationError – API Key inválida o expirada: {e}")
+            return RuntimeError("Error de autenticación con OpenAI. Contacte al administrador.")
+
+        if isinstance(e, RateLimitError):
+            logger.warning(f"[ChatService] RateLimitError – Límite de solicitudes excedido: {e}")
+            return RuntimeError("Se alcanzó el límite de solicitudes. Intente nuevamente en unos instantes.")
+
+        if isinstance(e, APIConnectionError):
+            logger.error(f"[ChatService] APIConnectionError – Sin conexión a OpenAI: {e}")
+            return RuntimeError("No se pudo conectar con el servicio de IA. Verifique la conexión del servidor.")
+
+        if isinstance(e, APIStatusError):
+            logger.error(f"[ChatService] APIStatusError {e.status_code} – {e.message}")
+            return RuntimeError(f"Error del servicio de IA (código {e.status_code}). Intente más tarde.")
+
+        logger.error(f"[ChatService] Error inesperado en OpenAI: {type(e).__name__}: {e}")
+        return RuntimeError("Error inesperado al procesar la consulta. Intente de nuevo.")
+
+    async def _completion(self, user_id: str, prioridad: int, **params):
+        """
+        Llamada no-streaming a OpenAI pasando por el limitador de concurrencia.
+        Ante un 429 el limitador reduce el límite y se reintenta con backoff
+        antes de devolver el error al usuario.
+        """
+        for intento in range(LLM_REINTENTOS_429 + 1):
+            try:
+                async with self.limiter.slot(user_id, prioridad) as slot:
+                    try:
+                        return await client.chat.completions.create(**params)
+                    except RateLimitError:
+                        slot.rate_limited()
+                        raise
+            except RateLimitError as e:
+                if intento < LLM_REINTENTOS_429:
+                    await asyncio.sleep(_backoff(intento))
+                    continue
+                raise self._to_runtime_error(e)
+            except LimiterSaturadoError:
+                raise
+            except Exception as e:
+                raise self._to_runtime_error(e)
+
     async def get_response(
         self,
-        history: List[Dict[str, str]],
+        history: List[Dict[str, Any]],
         user_message: str,
-        image_url: Optional[str] = None
+        image_url: Optional[str] = None,
+        contexto: Optional[Dict[str, Any]] = None,
+        user_id: str = "anon",
+        prioridad: int = PRIORIDAD_NORMAL
     ) -> str:
         """
         Genera una respuesta usando OpenAI considerando el historial.
         Lanza excepción en caso de error para que el endpoint HTTP retorne
         el código de estado correcto al frontend.
         """
-        if not self._ready:
-            logger.error("[ChatService] get_response llamado sin OPENAI_API_KEY configurada.")
-            raise RuntimeError("El servicio de IA no está disponible. Contacte al administrador.")
+        primer_turno = self.es_primer_turno(history, image_url)
+        if primer_turno:
+            faq = self.faq_cache.buscar(user_message)
+            if faq:
+                logger.info(f"[ChatService] Respuesta servida desde caché FAQ (id={faq['id']}, sim={faq['similitud']})")
+                return faq["respuesta"]
 
-        messages = [self.get_system_prompt()]
-
-        # Check if there is an image in the current message or in history
-        has_image_in_history = any(isinstance(m.get("metadata", {}), dict) and m.get("metadata", {}).get("image_url") for m in history)
-
-        # Añadir historial (máximo 20 mensajes)
-        for msg in history[-20:]:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            meta = msg.get("metadata", {})
-            
-            # OpenAI requires a specific format for images
-            if isinstance(meta, dict) and meta.get("image_url"):
-                messages.append({
-                    "role": role,
-                    "content": [
-                        {"type": "text", "text": content},
-                        {"type": "image_url", "image_url": {"url": meta["image_url"]}}
-                    ]
-                })
-            else:
-                messages.append({"role": role, "content": content})
-
-        # Construir mensaje actual
-        if image_url:
-            # Mensaje multimodal: forzar gpt-4o para visión
-            current_message = {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": user_message},
-                    {"type": "image_url", "image_url": {"url": image_url}}
-                ]
-            }
-            model_to_use = "gpt-4o"
-        else:
-            current_message = {"role": "user", "content": user_message}
-            model_to_use = "gpt-4o" if has_image_in_history else self.model
-
-        messages.append(current_message)
+        self._check_ready()
+        if contexto is None:
+            contexto = self.build_context(history, user_message, image_url)
+        messages, model_to_use = contexto["messages"], contexto["model"]
 
         logger.info(
             f"[ChatService] Enviando request → modelo={model_to_use}, "
-            f"history_len={len(history)}, has_image={image_url is not None}"
+            f"history_len={len(history)}, tokens_estimados={contexto['tokens_estimados']}, "
+            f"has_image={image_url is not None}"
         )
 
-        try:
-            response = client.chat.completions.create(
-                model=model_to_use,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000
-            )
-            content = response.choices[0].message.content
-            logger.info(
-                f"[ChatService] Respuesta OK → tokens_usados={response.usage.total_tokens if response.usage else 'N/A'}"
-            )
-            return content
-
-        except AuthenticationError as e:
-            logger.error(f"[ChatService] AuthenticationError – API Key inválida o expirada: {e}")
-            raise RuntimeError("Error de autenticación con OpenAI. Contacte al administrador.")
+        response = await self._completion(
+            user_id,
+            prioridad,
+            model=model_to_use,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1000
+        )
+        content = response.choices[0].message.content
+        logger.info(
+            f"[ChatService] Respuesta OK → tokens_usados={response.usage.total_tokens if response.usage else 'N/A'}"
+        )
+        if primer_turno:
+            self.faq_cache.guardar(user_message, content)
+        return content
 
-        except RateLimitError as e:
-            logger.warning(f"[ChatService] RateLimitError – Límite de solicitudes excedido: {e}")
-            raise RuntimeError("Se alcanzó el límite de solicitudes. Intente nuevamente en unos instantes.")
+    async def stream_response(
+        self,
+        history: List[Dict[str, Any]],
+        user_message: str,
+        image_url: Optional[str] = None,
+        contexto: Optional[Dict[str, Any]] = None,
+        user_id: str = "anon",
+        prioridad: int = PRIORIDAD_NORMAL
+    ) -> AsyncIterator[str]:
+        """
+        Igual que get_response pero entrega la respuesta por fragmentos (tokens)
+        a medida que el modelo los genera. Lanza RuntimeError ante errores.
+        El slot del limitador se mantiene durante todo el stream.
+        """
+        primer_turno = self.es_primer_turno(history, image_url)
+        if primer_turno:
+            faq = self.faq_cache.buscar(user_message)
+            if faq:
+                logger.info(f"[ChatService] Respuesta servida desde caché FAQ (id={faq['id']}, sim={faq['similitud']})")
+                yield faq["respuesta"]
+                return
 
-        except APIConnectionError as e:
-            logger.error(f"[ChatService] APIConnectionError – Sin conexión a OpenAI: {e}")
-            raise RuntimeError("No se pudo conectar con el servicio de IA. Verifique la conexión del servidor.")
+        self._check_ready()
+        if contexto is None:
+            contexto = self.build_context(history, user_message, image_url)
+        messages, model_to_use = contexto["messages"], contexto["model"]
 
-        except APIStatusError as e:
-            logger.error(f"[ChatService] APIStatusError {e.status_code} – {e.message}")
-            raise RuntimeError(f"Error del servicio de IA (código {e.status_code}). Intente más tarde.")
+        logger.info(
+            f"[ChatService] Enviando request (stream) → modelo={model_to_use}, "
+            f"history_len={len(history)}, tokens_estimados={contexto['tokens_estimados']}, "
+            f"has_image={image_url is not None}"
+        )
+
+        partes = []
+        for intento in range(LLM_REINTENTOS_429 + 1):
+            try:
+                async with self.limiter.slot(user_id, prioridad) as slot:
+                    try:
+                        stream = await client.chat.completions.create(
+                            model=model_to_use,
+                            messages=messages,
+                            temperature=0.7,
+                            max_tokens=1000,
+                            stream=True
+                        )
+                    except RateLimitError:
+                        slot.rate_limited()
+                        raise
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            partes.append(delta)
+                            yield delta
+                break
+            except RateLimitError as e:
+                # Solo se reintenta si todavía no se envió nada al cliente
+                if intento < LLM_REINTENTOS_429 and not partes:
+                    await asyncio.sleep(_backoff(intento))
+                    continue
+                raise self._to_runtime_error(e)
+            except LimiterSaturadoError:
+                raise
+            except Exception as e:
+                raise self._to_runtime_error(e)
+
+        if primer_turno:
+            self.faq_cache.guardar(user_message, "".join(partes))
+
+    async def summarize(
+        self,
+        resumen_previo: Optional[str],
+        mensajes: List[Dict[str, Any]],
+        user_id: str = "anon"
+    ) -> str:
+        """
+        Compacta mensajes antiguos en un resumen rodante breve (modelo económico).
+        Corre con prioridad baja en el limitador. Lanza RuntimeError ante errores.
+        """
+        self._check_ready()
+        transcripcion = "\n".join(
+            f"{'Usuario' if m.get('role') == 'user' else 'SapucAI'}: {m.get('content', '')}"
+            for m in mensajes
+        )
+        partes = []
+        if resumen_previo:
+            partes.append(f"Resumen previo:\n{resumen_previo}")
+        partes.append(f"Mensajes nuevos:\n{transcripcion}")
+
+        response = await self._completion(
+            user_id,
+            PRIORIDAD_BAJA,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": "\n\n".join(partes)},
+            ],
+            temperature=0.2,
+            max_tokens=SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content.strip()
 
-        except Exception as e:
-            logger.error(f"[ChatService] Error inesperado en OpenAI: {type(e).__name__}: {e}")
-            raise RuntimeError("Error inesperado al procesar la consulta. Intente de nuevo.")
+    async def aclose(self):
+        """Cierra el pool de conexiones HTTP (llamar en el shutdown de la app)."""
+        if client is not None:
+            await client.close()
 
 
 # Instancia global
@@ -1,6 +1,5 @@
 import os
 import re
-import csv
 import io
 import uuid
 import secrets
@@ -24,7 +23,7 @@ from fastapi import (
 )
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 
 # =============================================================================
 # ESTADOS DE CUENTA — FUENTE ÚNICA DE VERDAD
@@ -298,7 +297,7 @@ def log_secure(message: str, data: Any = None):
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 
 
 """
@@ -380,6 +379,7 @@ scheduler.add_job(trigger_local_cron, CronTrigger(hour=9, minute=15, timezone=TZ
 scheduler.add_job(trigger_local_cron, CronTrigger(day=11, hour=8, minute=15, timezone=TZ_ARGENTINA), args=["/api/cron/detectar-mora", "POST"], id="backup_detectar_mora", max_instances=1, replace_existing=True, misfire_grace_time=3600)
 scheduler.add_job(trigger_local_cron, CronTrigger(day=11, hour=9, minute=15, timezone=TZ_ARGENTINA), args=["/api/v1/cron/notificar-mora"], id="backup_notificar_mora", max_instances=1, replace_existing=True, misfire_grace_time=3600)
 scheduler.add_job(trigger_local_cron, CronTrigger(hour=0, minute=0, timezone=TZ_ARGENTINA), args=["/api/cron/limpiar-notificaciones", "POST"], id="cleanup_notificaciones", max_instances=1, replace_existing=True, misfire_grace_time=3600)
+scheduler.add_job(trigger_local_cron, CronTrigger(hour=3, minute=30, timezone=TZ_ARGENTINA), args=["/api/cron/limpiar-chat-images", "POST"], id="cleanup_chat_images", max_instances=1, replace_existing=True, misfire_grace_time=3600)
 
 app = FastAPI(title="Sociedad Rural Del Norte De Corrientes API")
 app.state.limiter = limiter
@@ -605,6 +605,7 @@ class UpdateProfileRequest(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     image_url: Optional[str] = None
+    image_detail: Optional[str] = None  # "low" | "high" | "auto" (detalle de visión)
     mode: Optional[str] = "Básico"
     email: Optional[str] = None
     direccion: Optional[str] = None
@@ -1996,45 +1997,162 @@ def require_titular(current_user=Depends(get_current_user)):
 
 
 
+# 4.3 DATOS DE REFERENCIA EN MEMORIA (municipios, roles, cuotas)
+from services.reference_data import ReferenceDataCache, normalizar_nombre
+
+referencias = ReferenceDataCache(ttl_seconds=float(os.getenv("REFERENCIAS_TTL_HORAS", "6")) * 3600)
+referencias.registrar(
+    "municipios",
+    lambda: supabase.table("municipios").select("id, nombre, activo, latitud, longitud").order("nombre").execute().data,
+    indices={"nombre": normalizar_nombre},
+)
+referencias.registrar(
+    "roles",
+    lambda: supabase.table("roles").select("*").execute().data,
+    indices={"nombre": lambda v: str(v or "").upper()},
+)
+referencias.registrar(
+    "configuracion_cuotas",
+    lambda: supabase.table("configuracion_cuotas").select("*").execute().data,
+    indices={"rol": lambda v: str(v or "").upper()},
+)
+
+
+def resolver_municipio_id(nombre: Optional[str], solo_activos: bool = False) -> Optional[str]:
+    """Nombre de municipio (sin importar acentos ni mayúsculas) → id, o None."""
+    if not nombre:
+        return None
+    municipio = referencias.buscar("municipios", "nombre", nombre)
+    if not municipio or (solo_activos and not municipio.get("activo")):
+        return None
+    return municipio["id"]
+
+
+@app.on_event("startup")
+def precargar_referencias():
+    referencias.precargar()
+
+
+@app.post("/api/admin/referencias/refrescar")
+def refrescar_referencias(tabla: Optional[str] = None, current_admin=Depends(get_current_admin)):
+    """[ADMIN] Recarga a demanda las tablas de referencia (p.ej. tras agregar un municipio)."""
+    try:
+        return {"status": "success", "tablas": referencias.refrescar(tabla)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Tabla de referencia desconocida: {tabla}")
+    except Exception as e:
+        logger.error(f"[REFERENCIAS] Error al refrescar: {e}")
+        raise HTTPException(status_code=500, detail="Error al refrescar datos de referencia")
+
+
+@app.get("/api/admin/referencias/stats")
+def stats_referencias(current_admin=Depends(get_current_admin)):
+    return referencias.stats()
+
+
 # 4.4 LISTADO DE MUNICIPIOS (DINÁMICO DESDE DB)
 @app.get("/api/municipios")
 @limiter.limit("60/minute")
 def get_municipios(request: Request):
-    """Retorna la lista de localidades/municipios activos desde la base de datos."""
+    """Retorna la lista de localidades/municipios activos (desde el caché de referencias)."""
     try:
-        # Consultamos la tabla municipios filtrando por activo = true
-        res = (
-            supabase.table("municipios")
-            .select("id, nombre")
-            .eq("activo", True)
-            .order("nombre")
-            .execute()
-        )
-        return {"municipios": res.data or []}
+        municipios = [
+            {"id": m["id"], "nombre": m["nombre"]}
+            for m in referencias.filas("municipios")
+            if m.get("activo")
+        ]
+        return {"municipios": municipios}
     except Exception as e:
         logger.error(f"Error cargando municipios: {str(e)}")
         raise HTTPException(status_code=500, detail="Error interno al cargar municipios")
 
 
+# ── PAGINACIÓN DE CATÁLOGOS PÚBLICOS ─────────────────────────────────────────
+from services.paginacion import CursorInvalidoError, pagina_keyset, recorrer_keyset, metricas_lecturas
+
+CATALOGO_PAGINA_DEFECTO = int(os.getenv("CATALOGO_PAGINA_DEFECTO", "20"))
+CATALOGO_PAGINA_MAX = int(os.getenv("CATALOGO_PAGINA_MAX", "100"))
+# Compatibilidad con versiones viejas de la app: sin limit ni cursor se
+# devuelve el listado completo (recorrido por páginas para no truncarse).
+CATALOGO_LEGACY_SIN_PAGINAR = os.getenv("CATALOGO_LEGACY_SIN_PAGINAR", "true").lower() == "true"
+
+
+def _listar_catalogo(construir_query, orden, limit: Optional[int], cursor: Optional[str]):
+    """
+    Resuelve un listado público paginado por cursor.
+
+    Returns:
+        (filas, next_cursor, paginado). Si `paginado` es False la respuesta
+        debe mantener el formato legacy (sin next_cursor).
+    """
+    if limit is None and not cursor and CATALOGO_LEGACY_SIN_PAGINAR:
+        return list(recorrer_keyset(construir_query, orden)), None, False
+    limite = min(limit or CATALOGO_PAGINA_DEFECTO, CATALOGO_PAGINA_MAX)
+    try:
+        filas, next_cursor = pagina_keyset(construir_query, orden, limite, cursor)
+    except CursorInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return filas, next_cursor, True
+
+
+# ── LECTURA MASIVA (jobs que recorren tablas enteras) ───────────────────────
+# Un solo .execute() queda truncado en max-rows de PostgREST; estos jobs leen
+# por keyset, de a una página, con la siguiente pedida en segundo plano.
+LECTURA_MASIVA_TAM_PAGINA = int(os.getenv("LECTURA_MASIVA_TAM_PAGINA", "1000"))
+LECTURA_MASIVA_PREFETCH = os.getenv("LECTURA_MASIVA_PREFETCH", "true").lower() == "true"
+
+
+def _leer_todo(construir_query, nombre: str, orden=(("id", False),)):
+    """Itera todas las filas de `construir_query()` (el select debe incluir las columnas de `orden`)."""
+    return recorrer_keyset(
+        construir_query,
+        orden,
+        tamano_pagina=LECTURA_MASIVA_TAM_PAGINA,
+        prefetch=LECTURA_MASIVA_PREFETCH,
+        nombre=nombre,
+    )
+
+
+@app.get("/api/admin/lecturas-masivas/stats")
+def get_lecturas_masivas_stats(admin_user=Depends(get_current_admin)):
+    """Páginas, filas y latencia de la última lectura completa de cada job."""
+    return {"lecturas": metricas_lecturas()}
+
+
 # ── ENDPOINT PÚBLICO: listar comercios adheridos ─────────────────────────────
 @app.get("/api/comercios")
 @limiter.limit("60/minute")
-def listar_comercios(request: Request, rubro: Optional[str] = None, municipio: Optional[str] = None):
-    """Retorna la lista de comercios aprobados, filtrable por rubro o municipio."""
-    try:
+def listar_comercios(
+    request: Request,
+    rubro: Optional[str] = None,
+    municipio: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+    cursor: Optional[str] = None,
+):
+    """Retorna la lista de comercios aprobados, filtrable por rubro o municipio.
+    Con `limit`/`cursor` pagina por (nombre_apellido, id) y retorna `next_cursor`."""
+    def construir_query():
         query = (
             supabase.table("profiles")
             .select("id, nombre_apellido, rubro, municipio, telefono, email")
             .eq("rol", "COMERCIO")
             .eq("estado", "APROBADO")
-            .order("nombre_apellido")
         )
         if rubro:
             query = query.eq("rubro", rubro)
         if municipio:
             query = query.eq("municipio", municipio)
-        result = query.execute()
-        return {"comercios": result.data}
+        return query
+
+    try:
+        comercios, next_cursor, paginado = _listar_catalogo(
+            construir_query, [("nombre_apellido", False), ("id", False)], limit, cursor
+        )
+        if paginado:
+            return {"comercios": comercios, "next_cursor": next_cursor}
+        return {"comercios": comercios}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
@@ -2232,50 +2350,204 @@ async def validar_qr_dinamico(request: Request):
 
 
 # ── ENDPOINT CHATBOT ESPECIALIZADO ──────────────────────────────────────────
-from chat_service import chat_service
+from chat_service import chat_service, prioridad_para_modo
+from services.chat_history_cache import crear_chat_history_cache
+from services.chat_images import (
+    leer_con_limite,
+    procesar_imagen_async,
+    cerrar_pool as cerrar_pool_imagenes,
+    resolver_detalle,
+    ImagenInvalidaError,
+    ImagenDemasiadoGrandeError,
+)
 import asyncio
+import json
 
 
-async def delete_chat_image(path: str):
-    """Borra una imagen del storage después de ser procesada por la IA"""
-    try:
-        # Esperar unos segundos para asegurar que OpenAI terminó de descargarla
-        await asyncio.sleep(10)
-        supabase.storage.from_("chat-images").remove([path])
-        logger.info(f"Imagen temporal borrada: {path}")
-    except Exception as e:
-        logger.error(f"Error borrando imagen temporal {path}: {e}")
+CHAT_IMAGES_BUCKET = "chat-images"
+CHAT_IMAGES_RETENCION_DIAS = int(os.getenv("CHAT_IMAGES_RETENCION_DIAS", "7"))
 
 
 @app.post("/api/chat/upload-image")
 async def upload_chat_image(
     file: UploadFile = File(...), current_user=Depends(get_current_user)
 ):
-    """Sube una imagen temporal para que la IA la analice"""
+    """
+    Sube una imagen temporal para que la IA la analice.
+    La imagen se normaliza antes de guardarla (tope de tamaño, sin EXIF,
+    redimensionada y re-comprimida) para ahorrar ancho de banda y tokens de visión.
+    """
+    try:
+        file_content = await leer_con_limite(file)
+    except ImagenDemasiadoGrandeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    try:
+        procesada, info = await procesar_imagen_async(file_content)
+    except ImagenInvalidaError as e:
+        logger.warning(f"[CHAT IMG] Imagen inválida de {current_user.id}: {e}")
+        raise HTTPException(status_code=400, detail="El archivo no es una imagen válida.")
+
     try:
-        file_content = await file.read()
-        file_ext = file.filename.split(".")[-1]
         # Ruta temporal con prefijo 'temp_'
-        path = f"temp_{current_user.id}_{uuid4().hex}.{file_ext}"
+        path = f"temp_{current_user.id}_{uuid4().hex}.{info['extension']}"
 
-        supabase.storage.from_("chat-images").upload(
+        await asyncio.to_thread(
+            supabase.storage.from_(CHAT_IMAGES_BUCKET).upload,
             path=path,
-            file=file_content,
-            file_options={"content-type": file.content_type, "upsert": "true"},
+            file=procesada,
+            file_options={"content-type": info["content_type"], "upsert": "true"},
+        )
+        logger.info(
+            f"[CHAT IMG] {path}: {info['original']['bytes']}B "
+            f"{info['original']['ancho']}x{info['original']['alto']} → "
+            f"{info['procesada']['bytes']}B {info['procesada']['ancho']}x{info['procesada']['alto']}"
         )
 
         # URL Pública (asumiendo que el bucket es público para que OpenAI la vea)
-        image_url = f"{SUPABASE_URL}/storage/v1/object/public/chat-images/{path}"
+        image_url = f"{SUPABASE_URL}/storage/v1/object/public/{CHAT_IMAGES_BUCKET}/{path}"
 
         return {"image_url": image_url, "path": path}
     except Exception as e:
-        logger.error(f"Error en endpoint upload_chat_image: {str(e)}")
         logger.error(f"Error subiendo imagen a Supabase Storage: {str(e)}")
         raise HTTPException(
             status_code=500, detail="Error interno del servidor"
         )
 
 
+@app.post("/api/cron/limpiar-chat-images")
+def cron_limpiar_chat_images(request: Request):
+    """
+    Cron: elimina del bucket 'chat-images' las imágenes con más de
+    CHAT_IMAGES_RETENCION_DIAS días. Lista por páginas ordenadas por antigüedad
+    y borra en lotes (una llamada a remove() por página).
+    """
+    header_secret = request.headers.get("X-API-Secret")
+    if header_secret != os.getenv("API_SECRET_TOKEN"):
+        if request.headers.get("X-Cron-Secret") != os.getenv("CRON_SECRET"):
+            raise HTTPException(status_code=401, detail="No autorizado")
+
+    limite = datetime.now(timezone.utc) - timedelta(days=CHAT_IMAGES_RETENCION_DIAS)
+    bucket = supabase.storage.from_(CHAT_IMAGES_BUCKET)
+    borradas = 0
+    lotes = 0
+    try:
+        while True:
+            pagina = bucket.list(
+                "",
+                {"limit": 100, "offset": 0, "sortBy": {"column": "created_at", "order": "asc"}},
+            ) or []
+            vencidas = []
+            for obj in pagina:
+                creado = obj.get("created_at")
+                if not creado or not obj.get("name", "").startswith("temp_"):
+                    continue
+                if datetime.fromisoformat(creado.replace("Z", "+00:00")) < limite:
+                    vencidas.append(obj["name"])
+
+            if not vencidas:
+                break
+            bucket.remove(vencidas)
+            borradas += len(vencidas)
+            lotes += 1
+            # La página tenía objetos más nuevos que el límite: no quedan más por borrar
+            if len(vencidas) < len(pagina):
+                break
+
+        logger.info(f"[CHAT IMG] Limpieza: {borradas} imágenes borradas en {lotes} lotes")
+        return {"message": "Limpieza de imágenes del chat ejecutada", "borradas": borradas, "lotes": lotes}
+    except Exception as e:
+        logger.error(f"Error en cron_limpiar_chat_images: {e}")
+        raise HTTPException(status_code=500, detail="Error ejecutando limpieza de imágenes")
+
+
+chat_history_cache = crear_chat_history_cache(max_turns=20)
+
+
+def _cargar_historial_chat(user_id: str) -> list:
+    """Retorna los últimos 20 mensajes del usuario en orden cronológico.
+    Se sirven desde el caché; solo el primer turno de una conversación lee la base."""
+    cached = chat_history_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    history_res = (
+        supabase.table("chat_history")
+        .select("role, content, metadata, created_at")
+        .eq("user_id", user_id)
+        .order("created_at", desc=True)
+        .limit(20)
+        .execute()
+    )
+    # Invertir para que estén en orden cronológico
+    history = history_res.data[::-1] if history_res.data else []
+    chat_history_cache.warm(user_id, history)
+    return history
+
+
+def _guardar_turno_chat(user_id: str, data: ChatRequest, assistant_response: str):
+    """Persiste en chat_history el mensaje del usuario y la respuesta del asistente
+    en un único INSERT (un solo round-trip) y actualiza el caché."""
+    # created_at explícito: ambos registros se insertan en la misma sentencia y
+    # con now() compartirían timestamp, perdiendo el orden usuario → asistente.
+    ahora = datetime.now(timezone.utc)
+    user_msg = {
+        "role": "user",
+        "content": data.message,
+        "metadata": {
+            "mode": data.mode,
+            "has_image": data.image_url is not None,
+            "image_url": data.image_url,
+        },
+        "created_at": ahora.isoformat(),
+    }
+    assistant_msg = {
+        "role": "assistant",
+        "content": assistant_response,
+        "metadata": None,
+        "created_at": (ahora + timedelta(milliseconds=1)).isoformat(),
+    }
+
+    # PostgREST exige las mismas columnas en todas las filas de un insert masivo
+    supabase.table("chat_history").insert([
+        {"user_id": user_id, **user_msg},
+        {"user_id": user_id, **assistant_msg},
+    ]).execute()
+
+    chat_history_cache.append(user_id, [user_msg, assistant_msg])
+
+
+async def _compactar_conversacion(user_id: str, resumen_previo: Optional[str], a_resumir: list):
+    """
+    Tarea en segundo plano: resume los mensajes antiguos de la conversación y
+    guarda el resumen rodante en chat_history (role='system', metadata.tipo='resumen').
+    Los mensajes con created_at <= resumen_hasta dejan de enviarse a OpenAI.
+    """
+    resumen_hasta = a_resumir[-1].get("created_at") if a_resumir else None
+    if not resumen_hasta:
+        return
+    try:
+        resumen = await chat_service.summarize(resumen_previo, a_resumir, user_id=user_id)
+    except RuntimeError as e:
+        logger.warning(f"[CHAT COMPACT] No se pudo resumir la conversación de {user_id}: {e}")
+        return
+
+    resumen_msg = {
+        "role": "system",
+        "content": resumen,
+        "metadata": {"tipo": "resumen", "resumen_hasta": resumen_hasta},
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        await asyncio.to_thread(
+            lambda: supabase.table("chat_history").insert({"user_id": user_id, **resumen_msg}).execute()
+        )
+        chat_history_cache.append(user_id, [resumen_msg])
+        logger.info(f"[CHAT COMPACT] {len(a_resumir)} mensajes resumidos para user {user_id}")
+    except Exception as e:
+        logger.error(f"[CHAT COMPACT] Error guardando resumen de {user_id}: {type(e).__name__}: {e}")
+
+
 @app.post("/api/chat")
 async def chat_with_assistant(
     data: ChatRequest,
@@ -2289,52 +2561,40 @@ async def chat_with_assistant(
     user_id = user.id
 
     try:
-        # 1. Recuperar historial previo (últimos 20 mensajes)
-        history_res = (
-            supabase.table("chat_history")
-            .select("role, content, metadata")
-            .eq("user_id", user_id)
-            .order("created_at", desc=True)
-            .limit(20)
-            .execute()
-        )
-
-        # Invertir para que estén en orden cronológico
-        history = history_res.data[::-1] if history_res.data else []
+        # 1. Recuperar historial previo (últimos 20 mensajes).
+        # El cliente de Supabase es síncrono: se ejecuta en un thread para no
+        # bloquear el event loop mientras espera a la base de datos.
+        history = await asyncio.to_thread(_cargar_historial_chat, user_id)
 
         # 2. Obtener respuesta de la IA (puede lanzar RuntimeError con mensaje descriptivo)
+        contexto = chat_service.build_context(
+            history, data.message, data.image_url, image_detail=resolver_detalle(data.image_detail)
+        )
         try:
             assistant_response = await chat_service.get_response(
-                history=history, user_message=data.message, image_url=data.image_url
+                history=history,
+                user_message=data.message,
+                image_url=data.image_url,
+                contexto=contexto,
+                user_id=user_id,
+                prioridad=prioridad_para_modo(data.mode),
             )
         except RuntimeError as ia_err:
             # Error conocido del servicio de IA – retornar 503 con mensaje legible
             logger.warning(f"[/api/chat] Error de servicio IA para user {user_id}: {ia_err}")
             raise HTTPException(status_code=503, detail=str(ia_err))
 
-        # 3. Guardar en historial (Mensaje del Usuario)
-        supabase.table("chat_history").insert(
-            {
-                "user_id": user_id,
-                "role": "user",
-                "content": data.message,
-                "metadata": {
-                    "mode": data.mode,
-                    "has_image": data.image_url is not None,
-                    "image_url": data.image_url,
-                },
-            }
-        ).execute()
+        # 3. Guardar en historial (mensaje del usuario + respuesta del asistente)
+        await asyncio.to_thread(_guardar_turno_chat, user_id, data, assistant_response)
 
-        # 4. Guardar en historial (Respuesta del Asistente)
-        supabase.table("chat_history").insert(
-            {"user_id": user_id, "role": "assistant", "content": assistant_response}
-        ).execute()
+        # 4. Compactar en segundo plano los mensajes que quedaron fuera del presupuesto
+        if contexto["a_resumir"]:
+            background_tasks.add_task(
+                _compactar_conversacion, user_id, contexto["resumen_previo"], contexto["a_resumir"]
+            )
 
-        # 5. Si hay imagen, NO programar su borrado automático para permitir diagnóstico guiado
-        # if data.image_url and "chat-images" in data.image_url:
-        #     path_coords = data.image_url.split("/")[-1]
-        #     background_tasks.add_task(delete_chat_image, path_coords)
+        # Las imágenes se conservan para el diagnóstico guiado y se borran por
+        # lotes en /api/cron/limpiar-chat-images al vencer la retención.
 
         logger.info(f"[/api/chat] Respuesta enviada al usuario {user_id}")
         return {"response": assistant_response, "history_count": len(history) + 2}
@@ -2348,6 +2608,144 @@ async def chat_with_assistant(
         )
 
 
+def _sse(event: str, payload: dict) -> str:
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_with_assistant_stream(
+    data: ChatRequest,
+    background_tasks: BackgroundTasks,
+    user: Any = Depends(get_current_user),
+):
+    """
+    Variante en streaming de /api/chat: envía la respuesta del asistente como
+    Server-Sent Events a medida que el modelo genera los tokens.
+
+    Eventos emitidos:
+      - `delta`: {"text": "..."} fragmento de la respuesta.
+      - `done`:  {"history_count": N} la respuesta completa ya fue guardada.
+      - `error`: {"detail": "..."} falló el servicio de IA o la persistencia.
+    """
+    user_id = user.id
+
+    try:
+        history = await asyncio.to_thread(_cargar_historial_chat, user_id)
+    except Exception as e:
+        logger.error(f"[/api/chat/stream] Error cargando historial para user {user_id}: {type(e).__name__}: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error interno procesando la solicitud de chat."
+        )
+
+    contexto = chat_service.build_context(
+        history, data.message, data.image_url, image_detail=resolver_detalle(data.image_detail)
+    )
+    if contexto["a_resumir"]:
+        # Corre al finalizar el stream
+        background_tasks.add_task(
+            _compactar_conversacion, user_id, contexto["resumen_previo"], contexto["a_resumir"]
+        )
+
+    async def event_generator():
+        partes = []
+        try:
+            async for delta in chat_service.stream_response(
+                history=history,
+                user_message=data.message,
+                image_url=data.image_url,
+                contexto=contexto,
+                user_id=user_id,
+                prioridad=prioridad_para_modo(data.mode),
+            ):
+                partes.append(delta)
+                yield _sse("delta", {"text": delta})
+        except RuntimeError as ia_err:
+            logger.warning(f"[/api/chat/stream] Error de servicio IA para user {user_id}: {ia_err}")
+            yield _sse("error", {"detail": str(ia_err)})
+            return
+
+        # Persistir la respuesta completa una vez terminado el stream
+        assistant_response = "".join(partes)
+        try:
+            await asyncio.to_thread(_guardar_turno_chat, user_id, data, assistant_response)
+        except Exception as e:
+            logger.error(f"[/api/chat/stream] Error guardando historial para user {user_id}: {type(e).__name__}: {e}")
+            yield _sse("error", {"detail": "No se pudo guardar la conversación."})
+            return
+
+        logger.info(f"[/api/chat/stream] Respuesta enviada al usuario {user_id}")
+        yield _sse("done", {"history_count": len(history) + 2})
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Evita que proxies (nginx/Easypanel) acumulen el stream en buffer
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_chat_service():
+    await chat_service.aclose()
+    cerrar_pool_imagenes()
+
+
+@app.get("/api/admin/chat/cache-stats")
+def get_chat_cache_stats(admin_user=Depends(get_current_admin)):
+    """Métricas de los cachés del chat (historial y respuestas frecuentes)."""
+    return {
+        "historial": chat_history_cache.stats(),
+        "faq": chat_service.faq_cache.stats(),
+    }
+
+
+@app.get("/api/admin/chat/llm-stats")
+def get_chat_llm_stats(admin_user=Depends(get_current_admin)):
+    """Estado del limitador de concurrencia hacia OpenAI (límite, cola, esperas, 429)."""
+    return {"limitador": chat_service.limiter.stats()}
+
+
+class AprobarFAQRequest(BaseModel):
+    respuesta: Optional[str] = None  # Permite corregir la respuesta al aprobarla
+
+
+@app.get("/api/admin/chat/faq-cache")
+def listar_faq_cache(admin_user=Depends(get_current_admin)):
+    """Lista las respuestas frecuentes cacheadas (aprobadas y pendientes) con sus métricas."""
+    return {
+        "stats": chat_service.faq_cache.stats(),
+        "entradas": chat_service.faq_cache.listar(),
+    }
+
+
+@app.post("/api/admin/chat/faq-cache/{entry_id}/aprobar")
+def aprobar_faq_cache(entry_id: str, req: AprobarFAQRequest, admin_user=Depends(get_current_admin)):
+    """Habilita una respuesta para ser servida desde el caché."""
+    if not chat_service.faq_cache.aprobar(entry_id, req.respuesta):
+        raise HTTPException(status_code=404, detail="Entrada no encontrada")
+    logger.info(f"[FAQ CACHE] Entrada {entry_id} aprobada por {admin_user.email}")
+    return {"success": True}
+
+
+@app.delete("/api/admin/chat/faq-cache/{entry_id}")
+def eliminar_faq_cache(entry_id: str, admin_user=Depends(get_current_admin)):
+    if not chat_service.faq_cache.eliminar(entry_id):
+        raise HTTPException(status_code=404, detail="Entrada no encontrada")
+    return {"success": True}
+
+
+@app.delete("/api/admin/chat/faq-cache")
+def purgar_faq_cache(admin_user=Depends(get_current_admin)):
+    """Vacía por completo el caché de respuestas frecuentes."""
+    eliminadas = chat_service.faq_cache.purgar()
+    logger.info(f"[FAQ CACHE] Purga total ({eliminadas} entradas) por {admin_user.email}")
+    return {"success": True, "eliminadas": eliminadas}
+
+
 class ChatbotSoporteRequest(BaseModel):
     dispositivo: Optional[str] = None
     version_app: Optional[str] = None
@@ -2548,8 +2946,7 @@ def create_administrador(
             raise HTTPException(status_code=400, detail="Rol inválido")
 
         # Get Role IDs
-        roles_res = supabase.table("roles").select("*").execute()
-        roles_map = {r["nombre"]: r["id"] for r in roles_res.data}
+        roles_map = {r["nombre"]: r["id"] for r in referencias.filas("roles")}
 
         # Validar Username unico
         existing = (
@@ -2653,8 +3050,7 @@ def update_administrador_role(
             raise HTTPException(status_code=400, detail="Rol inválido")
 
         # Get Role IDs
-        roles_res = supabase.table("roles").select("*").execute()
-        roles_map = {r["nombre"]: r["id"] for r in roles_res.data}
+        roles_map = {r["nombre"]: r["id"] for r in referencias.filas("roles")}
         target_role_id = roles_map.get(rol_asignar)
         if not target_role_id:
             raise HTTPException(
@@ -2834,6 +3230,9 @@ def approve_user(
                 ),
             )
 
+        _invalidar_directorio()
+
+        background_tasks.add_task(_reindexar_perfil, user_id)
         return {"message": "Usuario aprobado correctamente"}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -2879,6 +3278,8 @@ def reject_user(
             modulo="Gestión Usuarios",
             request=request,
         )
+        _invalidar_directorio()
+        background_tasks.add_task(_reindexar_perfil, user_id)
         return {"message": "Usuario rechazado correctamente"}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -2966,6 +3367,8 @@ def update_user_status(
             modulo="Gestión Usuarios",
             request=request,
         )
+        _invalidar_directorio()
+        background_tasks.add_task(_reindexar_perfil, user_id)
         return {"message": f"Estado actualizado a {req.estado}", "user": res.data[0]}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -3082,6 +3485,8 @@ def update_user_details(
             modulo="Gestión Usuarios",
             request=request,
         )
+        _invalidar_directorio()
+        background_tasks.add_task(_reindexar_perfil, user_id)
         return {"message": "Usuario actualizado", "user": res.data[0]}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -3142,6 +3547,10 @@ def delete_user(
             modulo="Gestión Usuarios",
             request=request,
         )
+        _invalidar_directorio()
+        buscador.eliminar("comercio", user_id)
+        buscador.eliminar("profesional", user_id)
+        geo_comercios.eliminar(user_id)
         return {"message": "Usuario eliminado correctamente"}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -3368,6 +3777,9 @@ def create_commerce(
             request=request,
         )
 
+        _invalidar_directorio()
+
+        background_tasks.add_task(_reindexar_perfil, user_id)
         return {
             "message": f"Comercio creado correctamente. Contraseña temporal: {default_password}",
             "comercio": profile_data,
@@ -3462,6 +3874,9 @@ def create_profesional(
             request=request,
         )
 
+        _invalidar_directorio()
+
+        background_tasks.add_task(_reindexar_perfil, user_id)
         return {
             "message": f"Profesional creado correctamente. Contraseña temporal: {default_password}",
             "profesional": profile_data,
@@ -3483,44 +3898,60 @@ def create_profesional(
 
 
 # ── ENDPOINT PÚBLICO: Listar profesionales ────────────────────────────────────
+from services.response_cache import VersionedResponseCache, etag_coincide
+
+# El directorio cambia poco y se consulta mucho: respuestas serializadas por
+# (municipio, página). Toda alta, baja o cambio de estado de un perfil llama a
+# _invalidar_directorio(); el TTL cubre cambios hechos por fuera de la API.
+profesionales_cache = VersionedResponseCache(
+    ttl_seconds=float(os.getenv("PROFESIONALES_CACHE_TTL", "600")),
+    max_entries=int(os.getenv("PROFESIONALES_CACHE_MAX", "256")),
+)
+
+
+def _invalidar_directorio():
+    profesionales_cache.bump()
+
+
 @app.get("/api/profesionales")
-def get_profesionales_publicos(municipio: Optional[str] = None):
+def get_profesionales_publicos(
+    request: Request,
+    municipio: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+    cursor: Optional[str] = None,
+):
     """
     Retorna lista de profesionales aprobados para visualización pública.
     Solo expone campos no sensibles. No requiere autenticación.
+    Con `limit`/`cursor` pagina por (nombre_apellido, id) y retorna `next_cursor`.
+    Una sola consulta a la vista profesionales_directorio (profiles + matrícula),
+    servida desde profesionales_cache con ETag/304.
     """
-    try:
+    def construir_query():
         query = (
-            supabase.table("profiles")
-            .select("id, nombre_apellido, rubro, municipio, provincia, telefono, direccion")
-            .eq("rol", "SOCIO")
-            .eq("es_profesional", True)
-            .eq("estado", "APROBADO")
-            .order("nombre_apellido")
+            supabase.table("profesionales_directorio")
+            .select("id, nombre_apellido, rubro, municipio, provincia, telefono, direccion, matricula")
         )
         if municipio:
             query = query.eq("municipio", municipio)
-        res = query.execute()
-        profesionales_list = res.data or []
-
-        if profesionales_list:
-            ids = [p["id"] for p in profesionales_list if p.get("id")]
-            if ids:
-                prof_extra = (
-                    supabase.table("profesionales")
-                    .select("id, matricula")
-                    .in_("id", ids)
-                    .execute()
-                )
-                matricula_map = {
-                    row["id"]: row.get("matricula")
-                    for row in (prof_extra.data or [])
-                }
-                for p in profesionales_list:
-                    p["matricula"] = matricula_map.get(p["id"])
+        return query
 
+    def cargar():
+        profesionales_list, next_cursor, paginado = _listar_catalogo(
+            construir_query, [("nombre_apellido", False), ("id", False)], limit, cursor
+        )
+        if paginado:
+            return {"profesionales": profesionales_list, "next_cursor": next_cursor}
         return {"profesionales": profesionales_list}
+
+    try:
+        clave = f"profesionales:{municipio or '*'}:{limit or ''}:{cursor or ''}"
+        entry = profesionales_cache.get_or_load(clave, cargar)
+        return _respuesta_cacheada(entry, request)
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("[/api/profesionales] Error inesperado:")
         raise HTTPException(
             status_code=500,
             detail="Error interno del servidor"
@@ -3590,114 +4021,640 @@ class OfertaUpdateRequest(BaseModel):
 
 
 # ── ENDPOINT PÚBLICO: ver ofertas por municipio (para socios) ─────────────────
+# Respuestas ya aplanadas y serializadas, por municipio y por oferta. Las
+# escrituras sobre 'promociones' llaman a _invalidar_ofertas().
+ofertas_cache = VersionedResponseCache(
+    ttl_seconds=float(os.getenv("OFERTAS_CACHE_TTL", "60")),
+    max_entries=int(os.getenv("OFERTAS_CACHE_MAX", "512")),
+)
+# Tarjetas individuales (formato del listado) para hidratar favoritos
+tarjetas_cache = VersionedResponseCache(
+    ttl_seconds=float(os.getenv("OFERTAS_CACHE_TTL", "60")),
+    max_entries=int(os.getenv("TARJETAS_CACHE_MAX", "5000")),
+)
+
+
+def _invalidar_ofertas():
+    ofertas_cache.bump()
+    tarjetas_cache.bump()
+
+_OFERTA_CAMPOS_LISTADO = (
+    "id, titulo, descripcion, tipo, "
+    "valor_descuento, tipo_descuento, imagen_url, "
+    "instagram_url, facebook_url, fecha_inicio, fecha_fin, "
+    "activo, es_exclusiva_profesionales, created_at"
+)
+_OFERTA_CAMPOS_DETALLE = (
+    "id, titulo, subtitulo, descripcion_corta, descripcion, tipo, "
+    "precio_lista, precio_final, porcentaje_descuento, monto_descuento, "
+    "whatsapp, direccion, localidad, ubicacion, categoria, destacada, imagenes_secundarias, "
+    "valor_descuento, tipo_descuento, imagen_url, "
+    "instagram_url, facebook_url, fecha_inicio, fecha_fin, "
+    "activo, es_exclusiva_profesionales, created_at"
+)
+
+
+def _select_oferta_con_comercio(campos: str, filtrar_comercio: bool = False) -> str:
+    # Un solo embed de profiles en lugar de tres. Con !inner el filtro por
+    # municipio se resuelve en la base y descarta las ofertas de otros municipios.
+    inner = "!inner" if filtrar_comercio else ""
+    return (
+        f"{campos}, "
+        f"comercio:comercios{inner}(id, perfil:profiles{inner}(nombre_apellido, municipio, rubro))"
+    )
+
+
+def _aplanar_oferta(o: dict) -> dict:
+    """Aplana comercio → perfil al formato que espera el frontend."""
+    comercio_data = o.pop("comercio", None) or {}
+    perfil = comercio_data.get("perfil") or {}
+    if isinstance(perfil, list):
+        perfil = perfil[0] if perfil else {}
+    o["comercio"] = {
+        "nombre_apellido": perfil.get("nombre_apellido") or "",
+        "municipio":       perfil.get("municipio") or "",
+        "rubro":           perfil.get("rubro") or "",
+    }
+    return o
+
+
+def _respuesta_cacheada(entry, request: Request, privado: bool = False) -> Response:
+    alcance = "private" if privado else "public"
+    headers = {"ETag": entry.etag, "Cache-Control": f"{alcance}, max-age=0, must-revalidate"}
+    if etag_coincide(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/ofertas/publicas")
-def get_ofertas_publicas(municipio: Optional[str] = None):
+def get_ofertas_publicas(
+    request: Request,
+    municipio: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+    cursor: Optional[str] = None,
+    sort: str = Query(default="recientes", description="recientes | popular"),
+):
     """
     Retorna promociones/ofertas activas de comercios aprobados.
     Tabla real: 'promociones' (con FK a 'comercios' -> profiles).
+    Con `limit`/`cursor` pagina por (created_at DESC, id DESC) y retorna `next_cursor`.
+    Con sort=popular ordena por el puntaje precalculado del ranking de popularidad.
+    Se sirve desde ofertas_cache y responde 304 si el ETag del cliente coincide.
     """
-    try:
+    if sort not in ("recientes", "popular"):
+        raise HTTPException(status_code=400, detail="Orden inválido. Valores permitidos: recientes, popular")
+
+    def construir_query():
         query = (
             supabase.table("promociones")
-            .select(
-                "id, titulo, descripcion, tipo, "
-                "valor_descuento, tipo_descuento, imagen_url, "
-                "instagram_url, facebook_url, fecha_inicio, fecha_fin, "
-                "activo, es_exclusiva_profesionales, created_at, "
-                "comercio:comercios(id, nombre_apellido:profiles(nombre_apellido), "
-                "municipio:profiles(municipio), rubro:profiles(rubro))"
-            )
+            .select(_select_oferta_con_comercio(_OFERTA_CAMPOS_LISTADO, filtrar_comercio=bool(municipio)))
             .eq("activo", True)
-            .order("created_at", desc=True)
         )
-
-        res = query.execute()
-        ofertas = res.data or []
-
-        # Aplanar la relación anidada para compatibilidad con el frontend
-        result = []
-        for o in ofertas:
-            comercio_data = o.pop("comercio", {}) or {}
-            # comercio_data puede tener sub-relaciones anidadas de profiles
-            nombre = comercio_data.get("nombre_apellido") or {}
-            if isinstance(nombre, dict):
-                nombre = nombre.get("nombre_apellido", "")
-            mun = comercio_data.get("municipio") or {}
-            if isinstance(mun, dict):
-                mun = mun.get("municipio", "")
-            rub = comercio_data.get("rubro") or {}
-            if isinstance(rub, dict):
-                rub = rub.get("rubro", "")
-
-            o["comercio"] = {
-                "nombre_apellido": nombre,
-                "municipio":       mun,
-                "rubro":           rub,
-            }
-            result.append(o)
-
         if municipio:
-            result = [
-                o for o in result
-                if o["comercio"].get("municipio") == municipio
-            ]
+            query = query.eq("comercio.perfil.municipio", municipio)
+        return query
 
-        return {"ofertas": result}
+    orden = [("created_at", True), ("id", True)]
 
+    def cargar():
+        if sort == "popular":
+            ofertas, next_cursor, paginado = _listar_por_popularidad(construir_query, orden, municipio, limit, cursor)
+        else:
+            ofertas, next_cursor, paginado = _listar_catalogo(construir_query, orden, limit, cursor)
+            ofertas = [_aplanar_oferta(o) for o in ofertas]
+        payload = {"ofertas": ofertas}
+        if paginado:
+            payload["next_cursor"] = next_cursor
+        return payload
+
+    try:
+        clave = f"ofertas:{sort}:{municipio or '*'}:{limit or ''}:{cursor or ''}"
+        entry = ofertas_cache.get_or_load(clave, cargar)
+        return _respuesta_cacheada(entry, request)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"[/api/ofertas/publicas] Error inesperado:")
         raise HTTPException(status_code=500, detail="Error al obtener ofertas.")
 
 @app.get("/api/ofertas/publicas/{oferta_id}")
-def get_oferta_publica(oferta_id: str):
+def get_oferta_publica(oferta_id: str, request: Request):
     if oferta_id == "undefined" or not oferta_id:
         raise HTTPException(status_code=400, detail="ID de oferta inválido.")
-    try:
-        query = (
+
+    def cargar():
+        res = (
             supabase.table("promociones")
-            .select(
-                "id, titulo, subtitulo, descripcion_corta, descripcion, tipo, "
-                "precio_lista, precio_final, porcentaje_descuento, monto_descuento, "
-                "whatsapp, direccion, localidad, ubicacion, categoria, destacada, imagenes_secundarias, "
-                "valor_descuento, tipo_descuento, imagen_url, "
-                "instagram_url, facebook_url, fecha_inicio, fecha_fin, "
-                "activo, es_exclusiva_profesionales, created_at, "
-                "comercio:comercios(id, nombre_apellido:profiles(nombre_apellido), "
-                "municipio:profiles(municipio), rubro:profiles(rubro))"
-            )
+            .select(_select_oferta_con_comercio(_OFERTA_CAMPOS_DETALLE))
             .eq("id", oferta_id)
             .eq("activo", True)
+            .execute()
         )
-
-        res = query.execute()
         if not res.data:
+            # No se cachea: get_or_load propaga la excepción
             raise HTTPException(status_code=404, detail="Oferta no encontrada.")
+        return {"oferta": _aplanar_oferta(res.data[0])}
 
-        oferta = res.data[0]
-
-        comercio_data = oferta.pop("comercio", {}) or {}
-        nombre = comercio_data.get("nombre_apellido") or {}
-        if isinstance(nombre, dict):
-            nombre = nombre.get("nombre_apellido", "")
-        mun = comercio_data.get("municipio") or {}
-        if isinstance(mun, dict):
-            mun = mun.get("municipio", "")
-        rub = comercio_data.get("rubro") or {}
-        if isinstance(rub, dict):
-            rub = rub.get("rubro", "")
-
-        oferta["comercio"] = {
-            "nombre_apellido": nombre,
-            "municipio":       mun,
-            "rubro":           rub,
-        }
-
-        return {"oferta": oferta}
+    try:
+        entry = ofertas_cache.get_or_load(f"oferta:{oferta_id}", cargar)
+        return _respuesta_cacheada(entry, request)
     except HTTPException:
         raise
     except Exception as e:
         logger.exception(f"[/api/ofertas/publicas/{oferta_id}] Error inesperado:")
         raise HTTPException(status_code=500, detail="Error al obtener la oferta.")
+
+
+def _tarjetas_ofertas(ids: List[str]) -> List[bytes]:
+    """Tarjetas JSON ya serializadas (formato del listado público) de las ofertas
+    activas en `ids`, en ese orden. Las que faltan en tarjetas_cache se leen
+    juntas en una consulta por cada 100 ids."""
+    def cargar(claves: List[str]) -> dict:
+        cargadas = {}
+        faltantes = [c.split(":", 1)[1] for c in claves]
+        for i in range(0, len(faltantes), 100):
+            res = (
+                supabase.table("promociones")
+                .select(_select_oferta_con_comercio(_OFERTA_CAMPOS_LISTADO))
+                .in_("id", faltantes[i:i + 100])
+                .eq("activo", True)
+                .execute()
+            )
+            for o in res.data or []:
+                cargadas[f"tarjeta:{o['id']}"] = _aplanar_oferta(o)
+        return cargadas
+
+    entradas = tarjetas_cache.get_many_or_load([f"tarjeta:{i}" for i in ids], cargar)
+    # Las inactivas o borradas quedan cacheadas como null y se omiten
+    return [e.body for e in (entradas[f"tarjeta:{i}"] for i in ids) if e.body != b"null"]
+
+
+# ── POPULARIDAD: ranking precalculado para /api/ofertas/publicas?sort=popular ──
+import time
+import threading
+from services.popularidad import RankingPopularidad, calcular_scores
+
+ranking_popularidad = RankingPopularidad(max_listados=int(os.getenv("POPULARIDAD_MAX_LISTADOS", "64")))
+POPULARIDAD_VIDA_MEDIA_DIAS = float(os.getenv("POPULARIDAD_VIDA_MEDIA_DIAS", "7"))
+POPULARIDAD_VENTANA_DIAS = int(os.getenv("POPULARIDAD_VENTANA_DIAS", "30"))
+POPULARIDAD_FACTOR_DESTACADA = float(os.getenv("POPULARIDAD_FACTOR_DESTACADA", "1.5"))
+# Los eventos más nuevos que esto quedan para la próxima corrida (inserts en vuelo)
+POPULARIDAD_MARGEN_SEGUNDOS = int(os.getenv("POPULARIDAD_MARGEN_SEGUNDOS", "60"))
+
+
+def _listar_por_popularidad(construir_query, orden, municipio: Optional[str], limit: Optional[int], cursor: Optional[str]):
+    """Como _listar_catalogo, pero ordenando por el puntaje precalculado.
+    El catálogo ordenado (ya aplanado) se lee una vez por municipio y por
+    versión del ranking y de ofertas_cache; cada página se corta de esa lista."""
+    ofertas = ranking_popularidad.listado(
+        municipio or "*",
+        lambda: (_aplanar_oferta(o) for o in recorrer_keyset(construir_query, orden)),
+        version_ofertas=ofertas_cache.version,
+        ttl_seconds=ofertas_cache.ttl_seconds,
+    )
+    if limit is None and not cursor and CATALOGO_LEGACY_SIN_PAGINAR:
+        return ofertas, None, False
+    limite = min(limit or CATALOGO_PAGINA_DEFECTO, CATALOGO_PAGINA_MAX)
+    try:
+        filas, next_cursor = ranking_popularidad.pagina(ofertas, limite, cursor)
+    except CursorInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return filas, next_cursor, True
+
+
+def _guardar_popularidad(scores: dict):
+    """Persiste los puntajes en promociones_popularidad y borra los que quedaron fuera."""
+    marca = datetime.now(timezone.utc).isoformat()
+    filas = [{"promocion_id": pid, "score": score, "actualizado_en": marca} for pid, score in scores.items()]
+    for i in range(0, len(filas), 500):
+        supabase.table("promociones_popularidad").upsert(filas[i:i + 500]).execute()
+    supabase.table("promociones_popularidad").delete().lt("actualizado_en", marca).execute()
+
+
+def acumular_analytics_diario() -> int:
+    """Acumula en promociones_analytics_diario solo los eventos posteriores a la
+    marca de agua (RPC acumular_analytics_diario, que también la avanza).
+    Retorna la cantidad de eventos nuevos procesados."""
+    hasta = datetime.now(timezone.utc) - timedelta(seconds=POPULARIDAD_MARGEN_SEGUNDOS)
+    acumulado = supabase.rpc("acumular_analytics_diario", {"p_hasta": hasta.isoformat()}).execute()
+    return (acumulado.data or [{}])[0].get("eventos", 0)
+
+
+def actualizar_ranking_popularidad():
+    """
+    1. Acumula los eventos nuevos en los agregados diarios.
+    2. Recalcula los puntajes desde los agregados diarios de la ventana.
+    """
+    try:
+        inicio = time.monotonic()
+        eventos = acumular_analytics_diario()
+
+        hoy = datetime.now(TZ_ARGENTINA).date()
+        desde = (hoy - timedelta(days=POPULARIDAD_VENTANA_DIAS)).isoformat()
+        diarios = recorrer_keyset(
+            lambda: supabase.table("promociones_analytics_diario")
+            .select("promocion_id, fecha, tipo_evento, cantidad")
+            .gte("fecha", desde),
+            [("promocion_id", False), ("fecha", False), ("tipo_evento", False)],
+        )
+        destacadas = [
+            o["id"] for o in recorrer_keyset(
+                lambda: supabase.table("promociones").select("id").eq("activo", True).eq("destacada", True),
+                [("id", False)],
+            )
+        ]
+        scores = calcular_scores(
+            diarios, hoy,
+            vida_media_dias=POPULARIDAD_VIDA_MEDIA_DIAS,
+            destacadas=destacadas,
+            factor_destacada=POPULARIDAD_FACTOR_DESTACADA,
+        )
+        ranking_popularidad.reemplazar(scores)
+        ofertas_cache.bump()
+        _guardar_popularidad(scores)
+        logger.info(
+            f"[POPULARIDAD] {eventos} eventos nuevos acumulados, {len(scores)} ofertas con puntaje "
+            f"en {time.monotonic() - inicio:.1f}s"
+        )
+    except Exception as e:
+        logger.error(f"[POPULARIDAD] Error actualizando el ranking: {e}")
+
+
+def _cargar_popularidad_guardada():
+    # Puntajes de la última corrida (de este u otro worker) para no arrancar vacío
+    try:
+        filas = recorrer_keyset(
+            lambda: supabase.table("promociones_popularidad").select("promocion_id, score"),
+            [("promocion_id", False)],
+        )
+        ranking_popularidad.reemplazar({f["promocion_id"]: f["score"] for f in filas})
+    except Exception as e:
+        logger.warning(f"[POPULARIDAD] No se pudieron cargar los puntajes guardados: {e}")
+    actualizar_ranking_popularidad()
+
+
+@app.on_event("startup")
+def iniciar_ranking_popularidad():
+    threading.Thread(target=_cargar_popularidad_guardada, daemon=True).start()
+    scheduler.add_job(
+        actualizar_ranking_popularidad, "interval",
+        minutes=float(os.getenv("POPULARIDAD_JOB_MINUTOS", "30")),
+        id="ranking_popularidad", max_instances=1, replace_existing=True,
+    )
+
+
+# ── BÚSQUEDA: /api/buscar sobre ofertas, comercios, profesionales y eventos ──
+from services.search_index import SearchIndex
+
+buscador = SearchIndex()
+TIPOS_BUSQUEDA = ("oferta", "comercio", "profesional", "evento")
+
+
+def _doc_oferta(o: dict):
+    return (
+        "oferta", o["id"],
+        [(o.get("titulo"), 3.0), (o.get("subtitulo"), 1.5), (o.get("categoria"), 2.0),
+         (o.get("descripcion_corta"), 1.0), (o.get("descripcion"), 1.0)],
+        {"titulo": o.get("titulo"), "detalle": o.get("categoria") or o.get("subtitulo"),
+         "imagen_url": o.get("imagen_url")},
+    )
+
+
+def _doc_comercio(c: dict):
+    return (
+        "comercio", c["id"],
+        [(c.get("nombre_apellido"), 3.0), (c.get("rubro"), 2.0), (c.get("municipio"), 0.5)],
+        {"titulo": c.get("nombre_apellido"), "detalle": c.get("rubro"), "municipio": c.get("municipio")},
+    )
+
+
+def _doc_profesional(p: dict):
+    return (
+        "profesional", p["id"],
+        [(p.get("nombre_apellido"), 3.0), (p.get("rubro"), 2.0), (p.get("matricula"), 2.0),
+         (p.get("municipio"), 0.5)],
+        {"titulo": p.get("nombre_apellido"), "detalle": p.get("rubro"), "municipio": p.get("municipio"),
+         "matricula": p.get("matricula")},
+    )
+
+
+def _doc_evento(e: dict):
+    return (
+        "evento", e["id"],
+        [(e.get("titulo"), 3.0), (e.get("lugar"), 2.0), (e.get("tipo"), 1.0)],
+        {"titulo": e.get("titulo"), "detalle": e.get("lugar"), "fecha": e.get("fecha"),
+         "slug": e.get("slug"), "imagen_url": e.get("imagen_url")},
+    )
+
+
+def _indexar_oferta(o: Optional[dict]):
+    if not o or not o.get("id"):
+        return
+    if o.get("activo"):
+        buscador.upsert(*_doc_oferta(o))
+        try:
+            _ubicar_oferta(o)
+        except Exception as e:
+            logger.error(f"[GEO] Error ubicando oferta {o['id']}: {e}")
+    else:
+        buscador.eliminar("oferta", o["id"])
+        geo_ofertas.eliminar(o["id"])
+
+
+def _indexar_evento(e: Optional[dict]):
+    if not e or not e.get("id"):
+        return
+    if e.get("estado") == "publicado":
+        buscador.upsert(*_doc_evento(e))
+    else:
+        buscador.eliminar("evento", e["id"])
+
+
+def _reindexar_perfil(user_id: str):
+    """Reindexa un perfil como comercio o profesional según su rol y estado actual."""
+    try:
+        res = (
+            supabase.table("profiles")
+            .select("id, nombre_apellido, rubro, municipio, rol, estado, es_profesional")
+            .eq("id", user_id)
+            .execute()
+        )
+        perfil = res.data[0] if res.data else None
+        if not perfil or perfil.get("estado") != "APROBADO":
+            buscador.eliminar("comercio", user_id)
+            buscador.eliminar("profesional", user_id)
+            geo_comercios.eliminar(user_id)
+        elif perfil.get("rol") == "COMERCIO":
+            buscador.upsert(*_doc_comercio(perfil))
+            _ubicar_comercio(perfil)
+        elif perfil.get("rol") == "SOCIO" and perfil.get("es_profesional"):
+            prof = supabase.table("profesionales").select("matricula").eq("id", user_id).execute()
+            perfil["matricula"] = prof.data[0].get("matricula") if prof.data else None
+            buscador.upsert(*_doc_profesional(perfil))
+        else:
+            buscador.eliminar("comercio", user_id)
+            buscador.eliminar("profesional", user_id)
+            geo_comercios.eliminar(user_id)
+    except Exception as e:
+        logger.error(f"[BUSCADOR] Error reindexando perfil {user_id}: {e}")
+
+
+def _documentos_busqueda():
+    """Recorre las cuatro fuentes por páginas (sin quedar truncado por max-rows)."""
+    for o in recorrer_keyset(
+        lambda: supabase.table("promociones")
+        .select("id, titulo, subtitulo, descripcion_corta, descripcion, categoria, imagen_url, activo, created_at")
+        .eq("activo", True),
+        [("created_at", True), ("id", True)],
+    ):
+        yield _doc_oferta(o)
+
+    for c in recorrer_keyset(
+        lambda: supabase.table("profiles")
+        .select("id, nombre_apellido, rubro, municipio")
+        .eq("rol", "COMERCIO")
+        .eq("estado", "APROBADO"),
+        [("id", False)],
+    ):
+        yield _doc_comercio(c)
+
+    matriculas = {
+        row["id"]: row.get("matricula")
+        for row in recorrer_keyset(lambda: supabase.table("profesionales").select("id, matricula"), [("id", False)])
+    }
+    for p in recorrer_keyset(
+        lambda: supabase.table("profiles")
+        .select("id, nombre_apellido, rubro, municipio")
+        .eq("rol", "SOCIO")
+        .eq("es_profesional", True)
+        .eq("estado", "APROBADO"),
+        [("id", False)],
+    ):
+        p["matricula"] = matriculas.get(p["id"])
+        yield _doc_profesional(p)
+
+    for e in recorrer_keyset(
+        lambda: supabase.table("eventos_sociales")
+        .select("id, titulo, lugar, tipo, fecha, slug, imagen_url")
+        .eq("estado", "publicado"),
+        [("id", False)],
+    ):
+        yield _doc_evento(e)
+
+
+def reconstruir_indice_busqueda():
+    try:
+        inicio = time.monotonic()
+        total = buscador.reconstruir(_documentos_busqueda())
+        logger.info(f"[BUSCADOR] Índice reconstruido: {total} documentos en {time.monotonic() - inicio:.1f}s")
+    except Exception as e:
+        logger.error(f"[BUSCADOR] Error reconstruyendo el índice: {e}")
+
+
+@app.on_event("startup")
+def iniciar_buscador():
+    # La carga inicial corre en segundo plano para no demorar el arranque; la
+    # reconstrucción periódica cubre cambios hechos por fuera de esta API.
+    threading.Thread(target=reconstruir_indice_busqueda, daemon=True).start()
+    scheduler.add_job(
+        reconstruir_indice_busqueda, "interval",
+        hours=float(os.getenv("BUSCADOR_REBUILD_HORAS", "6")),
+        id="reconstruir_buscador", max_instances=1, replace_existing=True,
+    )
+
+
+@app.get("/api/buscar")
+@limiter.limit("120/minute")
+def buscar(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100),
+    tipo: Optional[str] = Query(default=None, description="Filtro: oferta,comercio,profesional,evento"),
+    limit: int = Query(default=20, ge=1, le=50),
+    offset: int = Query(default=0, ge=0, le=500),
+):
+    """Búsqueda por texto (sin acentos, con raíces y prefijos) rankeada por relevancia."""
+    tipos = [t.strip() for t in tipo.split(",") if t.strip()] if tipo else None
+    if tipos and any(t not in TIPOS_BUSQUEDA for t in tipos):
+        raise HTTPException(status_code=400, detail=f"Tipo inválido. Valores permitidos: {', '.join(TIPOS_BUSQUEDA)}")
+    resultado = buscador.buscar(q, tipos=tipos, limit=limit, offset=offset)
+    resultado["limit"] = limit
+    resultado["offset"] = offset
+    return resultado
+
+
+@app.get("/api/admin/buscador/stats")
+def stats_buscador(current_admin=Depends(get_current_admin)):
+    return {
+        **buscador.stats(),
+        "geo_ofertas": geo_ofertas.stats(),
+        "geo_comercios": geo_comercios.stats(),
+        "popularidad": ranking_popularidad.stats(),
+    }
+
+
+# ── CERCANÍA: ofertas y comercios "cerca mío" ───────────────────────────────
+from services.geo_index import GridIndex, geocodificar
+
+GEO_CELDA_GRADOS = float(os.getenv("GEO_CELDA_GRADOS", "0.05"))  # ~5.5 km
+GEO_RADIO_MAX_KM = float(os.getenv("GEO_RADIO_MAX_KM", "100"))
+geo_ofertas = GridIndex(celda_grados=GEO_CELDA_GRADOS)
+geo_comercios = GridIndex(celda_grados=GEO_CELDA_GRADOS)
+
+
+def _centroide_municipio(nombre: Optional[str]):
+    if not nombre:
+        return None
+    try:
+        m = referencias.buscar("municipios", "nombre", nombre)
+    except Exception as e:
+        logger.error(f"[GEO] No se pudo consultar municipios: {e}")
+        return None
+    if m and m.get("latitud") is not None and m.get("longitud") is not None:
+        return float(m["latitud"]), float(m["longitud"])
+    return None
+
+
+def _coordenadas(fila: dict):
+    """(lat, lon, precision) de una oferta/comercio sin servicios externos, o None."""
+    return geocodificar(fila, _centroide_municipio)
+
+
+def _punto_oferta(o: dict):
+    coords = _coordenadas(o)
+    if not coords:
+        return None
+    lat, lon, precision = coords
+    return o["id"], lat, lon, {
+        "titulo": o.get("titulo"),
+        "categoria": o.get("categoria"),
+        "imagen_url": o.get("imagen_url"),
+        "localidad": o.get("localidad") or o.get("municipio"),
+        "precision": precision,
+    }
+
+
+def _punto_comercio(c: dict):
+    coords = _coordenadas(c)
+    if not coords:
+        return None
+    lat, lon, precision = coords
+    return c["id"], lat, lon, {
+        "nombre_apellido": c.get("nombre_apellido"),
+        "rubro": c.get("rubro"),
+        "municipio": c.get("municipio"),
+        "precision": precision,
+    }
+
+
+def _ubicar_oferta(o: dict):
+    punto = _punto_oferta(o)
+    if punto is None and o.get("comercio_id"):
+        # Sin datos propios: se usa el municipio del comercio
+        perfil = supabase.table("profiles").select("municipio").eq("id", o["comercio_id"]).execute()
+        if perfil.data:
+            punto = _punto_oferta({**o, "municipio": perfil.data[0].get("municipio")})
+    if punto is None:
+        geo_ofertas.eliminar(o["id"])
+    else:
+        geo_ofertas.upsert(*punto)
+
+
+def _ubicar_comercio(perfil: dict):
+    extra = (
+        supabase.table("comercios")
+        .select("direccion, latitud, longitud")
+        .eq("id", perfil["id"])
+        .execute()
+    )
+    punto = _punto_comercio({**perfil, **(extra.data[0] if extra.data else {})})
+    if punto is None:
+        geo_comercios.eliminar(perfil["id"])
+    else:
+        geo_comercios.upsert(*punto)
+
+
+def reconstruir_indice_geo():
+    try:
+        ofertas = []
+        for o in recorrer_keyset(
+            lambda: supabase.table("promociones")
+            .select(
+                "id, titulo, categoria, imagen_url, ubicacion, direccion, localidad, "
+                "latitud, longitud, created_at, comercio:comercios(perfil:profiles(municipio))"
+            )
+            .eq("activo", True),
+            [("created_at", True), ("id", True)],
+        ):
+            perfil = ((o.pop("comercio", None) or {}).get("perfil")) or {}
+            o["municipio"] = perfil.get("municipio") if isinstance(perfil, dict) else None
+            punto = _punto_oferta(o)
+            if punto:
+                ofertas.append(punto)
+
+        extras = {
+            c["id"]: c
+            for c in recorrer_keyset(
+                lambda: supabase.table("comercios").select("id, direccion, latitud, longitud"),
+                [("id", False)],
+            )
+        }
+        comercios = []
+        for c in recorrer_keyset(
+            lambda: supabase.table("profiles")
+            .select("id, nombre_apellido, rubro, municipio")
+            .eq("rol", "COMERCIO")
+            .eq("estado", "APROBADO"),
+            [("id", False)],
+        ):
+            punto = _punto_comercio({**c, **extras.get(c["id"], {})})
+            if punto:
+                comercios.append(punto)
+
+        geo_ofertas.reemplazar(ofertas)
+        geo_comercios.reemplazar(comercios)
+        logger.info(f"[GEO] Índice espacial reconstruido: {len(ofertas)} ofertas, {len(comercios)} comercios")
+    except Exception as e:
+        logger.error(f"[GEO] Error reconstruyendo el índice espacial: {e}")
+
+
+@app.on_event("startup")
+def iniciar_indice_geo():
+    threading.Thread(target=reconstruir_indice_geo, daemon=True).start()
+    scheduler.add_job(
+        reconstruir_indice_geo, "interval",
+        hours=float(os.getenv("BUSCADOR_REBUILD_HORAS", "6")),
+        id="reconstruir_geo", max_instances=1, replace_existing=True,
+    )
+
+
+@app.get("/api/cercanos")
+@limiter.limit("120/minute")
+def buscar_cercanos(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radio_km: float = Query(default=10, gt=0),
+    tipo: str = Query(default="oferta", description="oferta | comercio"),
+    limit: int = Query(default=20, ge=1, le=50),
+    offset: int = Query(default=0, ge=0, le=500),
+):
+    """Ofertas activas (o comercios) más cercanas a (lat, lon) dentro de `radio_km`, por distancia."""
+    indices = {"oferta": geo_ofertas, "comercio": geo_comercios}
+    if tipo not in indices:
+        raise HTTPException(status_code=400, detail="Tipo inválido. Valores permitidos: oferta, comercio")
+    radio_km = min(radio_km, GEO_RADIO_MAX_KM)
+    # Se pide uno más para saber si hay otra página
+    resultados = indices[tipo].cercanos(lat, lon, radio_km, limit=limit + 1, offset=offset)
+    hay_mas = len(resultados) > limit
+    return {
+        "resultados": resultados[:limit],
+        "radio_km": radio_km,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if hay_mas else None,
+    }
+
+
 @app.put("/api/perfil")
 def update_profile(
     req: UpdateProfileRequest,
@@ -3755,6 +4712,8 @@ def update_profile(
             modulo="Perfil",
             request=request,
         )
+        _invalidar_directorio()
+        background_tasks.add_task(_reindexar_perfil, current_user.id)
         return {"message": "Perfil actualizado", "user": res.data[0]}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -4708,33 +5667,32 @@ def get_combined_eventos(
     municipio: Optional[str] = None,
     tipo: Optional[str] = None,
     fecha_desde: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+    cursor: Optional[str] = None,
 ):
     """
     Consulta la lista de eventos desde la tabla unificada eventos_sociales.
+    Con `limit`/`cursor` pagina por (fecha, id) y retorna `next_cursor`.
     """
     try:
-        resolved_municipio_id = municipio_id
-        if not resolved_municipio_id and municipio:
-            # Intentar resolver el UUID real del municipio por nombre
-            mun_res = supabase.table("municipios").select("id").ilike("nombre", municipio).execute()
-            if mun_res.data:
-                resolved_municipio_id = mun_res.data[0]["id"]
+        # Intentar resolver el UUID real del municipio por nombre
+        resolved_municipio_id = municipio_id or resolver_municipio_id(municipio)
 
-        query = supabase.table("eventos_sociales").select("*").eq("estado", "publicado")
-        
-        if resolved_municipio_id:
-            query = query.eq("municipio_id", resolved_municipio_id)
-        elif municipio:
-            query = query.ilike("lugar", f"%{municipio}%")
-            
-        if tipo:
-            query = query.ilike("tipo", f"%{tipo}%")
-            
-        if fecha_desde:
-            query = query.gte("fecha", fecha_desde)
+        def construir_query():
+            query = supabase.table("eventos_sociales").select("*").eq("estado", "publicado")
+            if resolved_municipio_id:
+                query = query.eq("municipio_id", resolved_municipio_id)
+            elif municipio:
+                query = query.ilike("lugar", f"%{municipio}%")
+            if tipo:
+                query = query.ilike("tipo", f"%{tipo}%")
+            if fecha_desde:
+                query = query.gte("fecha", fecha_desde)
+            return query
 
-        res = query.order("fecha", desc=False).execute()
-        eventos = res.data or []
+        eventos, next_cursor, paginado = _listar_catalogo(
+            construir_query, [("fecha", False), ("id", False)], limit, cursor
+        )
 
         # Normalizar fallback_ig
         for ev in eventos:
@@ -4749,7 +5707,11 @@ def get_combined_eventos(
             elif not ev.get("link_instagram"):
                 ev["link_instagram"] = fallback_ig
 
+        if paginado:
+            return {"eventos": eventos, "next_cursor": next_cursor}
         return {"eventos": eventos}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error combinando eventos: {str(e)}")
         raise HTTPException(
@@ -4819,6 +5781,7 @@ def create_evento(
                 modulo="Gestión Eventos",
                 request=request,
             )
+            _indexar_evento(evento_creado)
             return {"message": "Evento creado exitosamente", "evento": evento_creado}
         raise HTTPException(
             status_code=500, detail="Error desconocido al insertar evento"
@@ -4845,6 +5808,7 @@ def delete_evento(
             raise HTTPException(status_code=404, detail="Evento no encontrado")
 
         supabase.table("eventos_sociales").delete().eq("id", evento_id).execute()
+        buscador.eliminar("evento", evento_id)
 
         background_tasks.add_task(
             registrar_auditoria,
@@ -4914,6 +5878,7 @@ def update_evento(
             modulo="Gestión Eventos",
             request=request,
         )
+        _indexar_evento(res.data[0] if res.data else None)
         return {"message": "Evento actualizado correctamente", "evento": res.data[0]}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -4983,18 +5948,7 @@ async def importar_evento(payload: WebhookEventoPayload, request: Request, backg
 
     try:
         # FASE 2: Validar Municipio
-        municipio_id_validado = None
-        if payload.municipio:
-            mun_res = (
-                supabase.table("municipios")
-                .select("id")
-                .ilike("nombre", payload.municipio)
-                .eq("activo", True)
-                .limit(1)
-                .execute()
-            )
-            if mun_res.data:
-                municipio_id_validado = mun_res.data[0]["id"]
+        municipio_id_validado = resolver_municipio_id(payload.municipio, solo_activos=True)
 
         # 3. Procesar Imagen de forma estricta
         logger.info(f"Procesando imagen para external_id {payload.external_id}")
@@ -5036,6 +5990,7 @@ async def importar_evento(payload: WebhookEventoPayload, request: Request, backg
 
         if res.data:
             evento_id = res.data[0].get("id")
+            _indexar_evento(res.data[0])
             
             logger.info(json.dumps({
                 "event": "importar_evento_success",
@@ -5050,13 +6005,12 @@ async def importar_evento(payload: WebhookEventoPayload, request: Request, backg
 
             # DISPARAR PUSH AUTOMÁTICA
             # Solo usuarios aprobados — evita spam a cuentas pendientes/inactivas
-            users_res = supabase.table("profiles").select("id").eq("estado", "APROBADO").execute()
-            logger.info({
-                "event": "push_dispatch_filtered",
-                "total_users": len(users_res.data or []),
-                "filter": "estado=APROBADO"
-            })
-            for u in (users_res.data or []):
+            audiencia = 0
+            for u in _leer_todo(
+                lambda: supabase.table("profiles").select("id").eq("estado", "APROBADO"),
+                "importar_evento.audiencia",
+            ):
+                audiencia += 1
                 background_tasks.add_task(
                     enviar_notificacion_push_inapp,
                     usuario_id=u["id"],
@@ -5065,6 +6019,11 @@ async def importar_evento(payload: WebhookEventoPayload, request: Request, backg
                     link_url=f"/eventos/{payload.external_id}",
                     evento_id=evento_id
                 )
+            logger.info({
+                "event": "push_dispatch_filtered",
+                "total_users": audiencia,
+                "filter": "estado=APROBADO"
+            })
 
             return {
                 "success": True,
@@ -5156,6 +6115,7 @@ def update_evento_social_status(
             modulo="Gestión Eventos Sociales",
             request=request,
         )
+        _indexar_evento(res.data[0] if res.data else None)
         return {"message": f"Estado actualizado a {req.status}", "evento": res.data[0]}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -5216,6 +6176,7 @@ def update_evento_social(
             modulo="Gestión Eventos Sociales",
             request=request,
         )
+        _indexar_evento(res.data[0] if res.data else None)
         return {"message": "Evento actualizado correctamente", "evento": res.data[0]}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -5243,6 +6204,7 @@ def delete_evento_social(
             raise HTTPException(status_code=404, detail="Evento no encontrado")
 
         supabase.table("eventos_sociales").delete().eq("id", evento_id).execute()
+        buscador.eliminar("evento", evento_id)
 
         background_tasks.add_task(
             registrar_auditoria,
@@ -5527,6 +6489,108 @@ def enviar_notificacion_push_inapp(
         }))
 
 
+def enviar_notificaciones_push_lote(notificaciones: List[Dict[str, Any]], lote: int = 500):
+    """
+    Versión por lotes de enviar_notificacion_push_inapp para avisos masivos con
+    contenido distinto por usuario. Cada elemento: usuario_id, titulo, mensaje,
+    link_url opcional. Un INSERT por lote de notificaciones, una lectura de
+    preferencias y tokens, y FCM send_each en bloques de hasta 500 mensajes.
+    """
+    import json
+    if not notificaciones:
+        return
+    ahora = datetime.now(TZ_ARGENTINA).isoformat()
+    filas = [
+        {
+            "usuario_id": n["usuario_id"],
+            "titulo": n["titulo"],
+            "mensaje": n["mensaje"],
+            "link_url": n.get("link_url"),
+            "leido": False,
+            "fecha": ahora,
+        }
+        for n in notificaciones
+    ]
+    try:
+        for i in range(0, len(filas), lote):
+            supabase.table("notificaciones").insert(filas[i:i + lote]).execute()
+    except Exception as e:
+        logger.error(json.dumps({"event": "notificaciones_lote_error", "total": len(filas), "error": str(e)}))
+        return
+
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        logger.info(json.dumps({"event": "push_skipped_firebase_not_init", "total": len(filas)}))
+        return
+
+    try:
+        usuario_ids = list({n["usuario_id"] for n in notificaciones})
+        sonido: Dict[str, bool] = {}
+        tokens: Dict[str, List[str]] = {}
+        for i in range(0, len(usuario_ids), lote):
+            ids = usuario_ids[i:i + lote]
+            for p in supabase.table("profiles").select("id, sonido_notificaciones_habilitado").in_("id", ids).execute().data or []:
+                sonido[p["id"]] = p.get("sonido_notificaciones_habilitado") is not False
+            for t in supabase.table("push_tokens").select("usuario_id, token").in_("usuario_id", ids).execute().data or []:
+                tokens.setdefault(t["usuario_id"], []).append(t["token"])
+
+        mensajes, destino = [], []
+        for n in notificaciones:
+            sound_enabled = sonido.get(n["usuario_id"], True)
+            for token in tokens.get(n["usuario_id"], []):
+                mensajes.append(messaging.Message(
+                    notification=messaging.Notification(title=n["titulo"], body=n["mensaje"]),
+                    data={
+                        "link_url": n.get("link_url") or "/",
+                        "sound_enabled": "true" if sound_enabled else "false",
+                        "sound_file": "notification.mp3",
+                    },
+                    android=messaging.AndroidConfig(
+                        priority="high",
+                        notification=(
+                            messaging.AndroidNotification(sound="notification", channel_id="high_importance_channel")
+                            if sound_enabled
+                            else None
+                        ),
+                    ),
+                    apns=messaging.APNSConfig(
+                        payload=(
+                            messaging.APNSPayload(aps=messaging.Aps(sound="notification.mp3", badge=1))
+                            if sound_enabled
+                            else None
+                        )
+                    ),
+                    token=token,
+                ))
+                destino.append(token)
+
+        enviados, fallidos, tokens_invalidos = 0, 0, []
+        for i in range(0, len(mensajes), 500):
+            response = messaging.send_each(mensajes[i:i + 500])
+            enviados += response.success_count
+            fallidos += response.failure_count
+            for idx, res in enumerate(response.responses):
+                if not res.success and getattr(res.exception, "code", None) in [
+                    "registration-token-not-registered",
+                    "invalid-argument",
+                    "invalid-registration-token",
+                ]:
+                    tokens_invalidos.append(destino[i + idx])
+        if tokens_invalidos:
+            supabase.table("push_tokens").delete().in_("token", tokens_invalidos).execute()
+
+        logger.info({
+            "event": "push_lote_sent",
+            "notificaciones": len(filas),
+            "success": enviados,
+            "failure": fallidos,
+            "tokens_limpiados": len(tokens_invalidos),
+        })
+    except Exception as e:
+        logger.error(json.dumps({"event": "push_lote_error", "total": len(filas), "error": str(e)}))
+
+
 def enviar_push_segmentado(
     titulo: str,
     mensaje: str,
@@ -5541,30 +6605,31 @@ def enviar_push_segmentado(
     NO reemplaza el flujo existente — es una función adicional.
     """
     try:
-        query = supabase.table("profiles").select("id").eq("estado", "APROBADO")
-        if municipio:
-            query = query.eq("municipio", municipio)
-        if tipo_socio:
-            query = query.eq("tipo_socio", tipo_socio)
-
-        users_res = query.execute()
-        usuarios = users_res.data or []
+        def construir_query():
+            query = supabase.table("profiles").select("id").eq("estado", "APROBADO")
+            if municipio:
+                query = query.eq("municipio", municipio)
+            if tipo_socio:
+                query = query.eq("tipo_socio", tipo_socio)
+            return query
 
-        logger.info({
-            "event": "push_segmentado_dispatch",
-            "total_users": len(usuarios),
-            "filtros": {"municipio": municipio, "tipo_socio": tipo_socio}
-        })
-
-        for u in usuarios:
+        enviados = 0
+        for u in _leer_todo(construir_query, "push_segmentado.audiencia"):
             enviar_notificacion_push_inapp(
                 usuario_id=u["id"],
                 titulo=titulo,
                 mensaje=mensaje,
                 link_url=link_url or "/",
             )
+            enviados += 1
+
+        logger.info({
+            "event": "push_segmentado_dispatch",
+            "total_users": enviados,
+            "filtros": {"municipio": municipio, "tipo_socio": tipo_socio}
+        })
 
-        return {"ok": True, "total_enviados": len(usuarios)}
+        return {"ok": True, "total_enviados": enviados}
     except Exception as e:
         logger.error({
             "event": "push_segmentado_error",
@@ -5818,23 +6883,21 @@ def detectar_mora(
 
         # Obtenemos todos los miembros aprobados/restringidos:
         # SOCIOs, COMERCIOs y EMPLEADOS COMERCIALES activos.
-        query = (
-            supabase.table("profiles")
+        todos = _leer_todo(
+            lambda: supabase.table("profiles")
             .select("id, nombre_apellido, telefono, rol, email, es_empleado_comercial, activo_empleado")
-            .in_("estado", list(ESTADOS_ACTIVOS))
+            .in_("estado", list(ESTADOS_ACTIVOS)),
+            "detectar_mora.perfiles",
         )
 
-        socios_res = query.execute()
-        todos = socios_res.data or []
-
         if not admin_user:
             # Incluir SOCIOs y EMPLEADOS COMERCIALES activos.
             # Excluir COMERCIOs puros (no pagan cuota mensual propia).
-            todos = [
+            todos = (
                 s for s in todos
                 if s.get("rol") == "SOCIO"
                 or (s.get("es_empleado_comercial") and s.get("activo_empleado", True))
-            ]
+            )
 
         socios = [s for s in todos if s.get("email") not in EMAILS_EXCLUIDOS_MORA]
 
@@ -5844,18 +6907,18 @@ def detectar_mora(
         next_year = anio_actual if mes_actual < 12 else anio_actual + 1
         fecha_fin_mes = f"{next_year}-{next_month:02d}-01"
 
-        # 1. Traer TODOS los pagos del mes en una sola query optimizada
-        pagos_res = (
-            supabase.table("pagos_cuotas")
-            .select("socio_id")
+        # 1. Traer TODOS los pagos del mes (por páginas, sin truncarse en max-rows)
+        pagos_mes = _leer_todo(
+            lambda: supabase.table("pagos_cuotas")
+            .select("id, socio_id")
             .gte("fecha_vencimiento", fecha_inicio_mes)
             .lt("fecha_vencimiento", fecha_fin_mes)
-            .in_("estado_pago", ["PAGADO", "PENDIENTE_VALIDACION"])
-            .execute()
+            .in_("estado_pago", ["PAGADO", "PENDIENTE_VALIDACION"]),
+            "detectar_mora.pagos_mes",
         )
 
         # 2. Usar un Set en memoria (O(1) lookup) para socios al día
-        socios_al_dia = {pago["socio_id"] for pago in pagos_res.data}
+        socios_al_dia = {pago["socio_id"] for pago in pagos_mes}
 
         # 3. Filtrar morosos
         morosos = [socio for socio in socios if socio["id"] not in socios_al_dia]
@@ -5876,6 +6939,7 @@ def detectar_mora(
                             "motivo": f"Mora automática cuota {mes_actual}/{anio_actual}",
                         }
                     ).in_("id", chunk_ids).execute()
+                    _invalidar_directorio()
 
                     # B. Upsert Deudas (Bulk). UNIQUE(socio_id, fecha_vencimiento) confirmado en DB (Ajuste 2)
                     deudas_bulk = []
@@ -5995,218 +7059,114 @@ def get_user_activity(user_id: str, admin_user=Depends(get_current_admin)):
 
 
 # 12.6 REPORTES: Exportación de Socios (Excel/PDF)
-@app.get("/api/admin/reports/socios/excel")
-def exportar_socios_excel(admin_user=Depends(get_current_admin)):
-    """Genera un reporte en Excel (.xlsx) nativo con la lista de socios."""
-    try:
-        import pandas as pd
-
-        # Consultar socios y comercios (que actúan como socios en el sistema)
-        logger.info("[REPORTS] Solicitando perfiles para rol: SOCIO, COMERCIO, ADMIN")
-        res = (
-            supabase.table("profiles")
-            .select(
-                "nombre_apellido, dni, email, telefono, estado, municipio, created_at, rol"
-            )
-            .in_("rol", ["SOCIO", "COMERCIO", "ADMIN"])
-            .execute()
-        )
-
-        logger.info(f"[REPORTS] Datos encontrados: {len(res.data) if res.data else 0}")
-
-        if not res.data:
-            return JSONResponse(
-                status_code=404, content={"detail": "No hay socios para exportar"}
-            )
-
-        df = pd.DataFrame(res.data)
-
-        # Mapeo de nombres de columnas
-        cols_map = {
-            "nombre_apellido": "Nombre y Apellido",
-            "dni": "DNI",
-            "email": "Email",
-            "telefono": "Teléfono",
-            "estado": "Estado",
-            "municipio": "Municipio",
-            "created_at": "Fecha de Alta",
-        }
-        df = df[list(cols_map.keys())].rename(columns=cols_map)
-
-        # Formatear fecha
-        df["Fecha de Alta"] = pd.to_datetime(df["Fecha de Alta"]).dt.strftime(
-            "%d/%m/%Y"
-        )
-
-        # Crear Excel en memoria
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Socios")
+import itertools
+from services.reportes import generar_csv_contabilidad, escribir_xlsx_socios, leer_en_bloques
+from services.reporte_pdf import (
+    fila_pdf,
+    hash_contenido,
+    generar_pdf_en_pool,
+    cerrar_pool as cerrar_pool_pdf,
+)
+from services.almacen_reportes import crear_almacen
+
+REPORTES_TAM_PAGINA = int(os.getenv("REPORTES_TAM_PAGINA", "1000"))
+REPORTES_SPOOL_MAX_BYTES = int(os.getenv("REPORTES_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+ROLES_REPORTE_SOCIOS = ["SOCIO", "COMERCIO", "ADMIN"]
+COLUMNAS_SOCIOS_EXCEL = "id, nombre_apellido, dni, email, telefono, estado, municipio, created_at, rol"
+COLUMNAS_CONTABILIDAD = (
+    "id, nombre_apellido, dni, email, telefono, estado, municipio, rol, es_profesional, "
+    "titular_id, created_at, es_empleado_comercial, activo_empleado"
+)
+COLUMNAS_SOCIOS_PDF = "id, nombre_apellido, dni, estado, telefono, municipio, rol, created_at"
 
-            # Ajustar ancho de columnas automáticamente (opcional pero profesional)
-            worksheet = writer.sheets["Socios"]
-            for i, col in enumerate(df.columns):
-                column_len = max(df[col].astype(str).str.len().max(), len(col)) + 2
-                worksheet.column_dimensions[chr(65 + i)].width = min(column_len, 50)
+# Reportes generados (trabajos asincrónicos y PDF cacheado): bucket privado o carpeta local
+REPORTES_BUCKET = os.getenv("REPORTES_BUCKET", "reportes")
+almacen_reportes = crear_almacen(supabase, REPORTES_BUCKET)
 
-        output.seek(0)
 
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": "attachment; filename=socios_sociedad_rural.xlsx"
-            },
-        )
-    except Exception as e:
-        logger.error(f"Error en reporte excel: {e}")
-        raise HTTPException(status_code=500, detail="Error al generar el reporte Excel")
+def _perfiles_socios(
+    columnas: str,
+    roles: Optional[List[str]] = ROLES_REPORTE_SOCIOS,
+    municipio: Optional[str] = None,
+    estado: Optional[str] = None,
+):
+    """Itera los perfiles del padrón por páginas (keyset por created_at, id)."""
+    def construir_query():
+        query = supabase.table("profiles").select(columnas)
+        if roles:
+            query = query.in_("rol", roles)
+        if municipio:
+            query = query.eq("municipio", municipio)
+        if estado:
+            query = query.eq("estado", estado)
+        return query
+
+    return recorrer_keyset(
+        construir_query,
+        [("created_at", False), ("id", False)],
+        tamano_pagina=REPORTES_TAM_PAGINA,
+        prefetch=LECTURA_MASIVA_PREFETCH,
+        nombre="reportes.perfiles",
+    )
 
 
-@app.get("/api/admin/reports/contabilidad/csv")
-def exportar_contabilidad_csv(admin_user=Depends(get_current_admin)):
-    """Genera un reporte CSV especializado para contabilidad con resumen de categorías."""
+@app.get("/api/admin/reports/socios/excel")
+def exportar_socios_excel(admin_user=Depends(get_current_admin)):
+    """Genera un reporte en Excel (.xlsx) nativo con la lista de socios.
+    Los perfiles se recorren por páginas y se escriben en modo write-only a un
+    archivo temporal (en memoria hasta REPORTES_SPOOL_MAX_BYTES, luego a disco)."""
+    archivo = None
     try:
-        # 1. Obtener todos los perfiles
-        res = (
-            supabase.table("profiles")
-            .select(
-                "nombre_apellido, dni, email, telefono, estado, municipio, rol, es_profesional, titular_id, created_at, es_empleado_comercial, activo_empleado"
-            )
-            .execute()
-        )
-
-        if not res.data:
-            raise HTTPException(status_code=404, detail="No hay datos para exportar")
-
-        data = res.data
-
-        # 2. Calcular Conteos
-        conteos = {
-            "Socio Común": 0,
-            "Grupo Familiar": 0,
-            "Profesional": 0,
-            "Comercial": 0,
-            "Empleados": 0,
-            "Total General (Al día)": 0,
-        }
-
-        for p in data:
-            rol = p.get("rol", "SOCIO")
-            titular_id = p.get("titular_id")
-            es_profesional = p.get("es_profesional", False)
-            estado = p.get("estado", "PENDIENTE")
-            es_empleado = p.get("es_empleado_comercial", False) and p.get("activo_empleado", True)
-
-            # Clasificación
-            if es_empleado:
-                conteos["Empleados"] += 1
-            elif rol == "COMERCIO":
-                if titular_id:
-                    conteos["Empleados"] += 1
-                else:
-                    conteos["Comercial"] += 1
-            else:  # SOCIO o fallback
-                if titular_id:
-                    conteos["Grupo Familiar"] += 1
-                elif es_profesional:
-                    conteos["Profesional"] += 1
-                else:
-                    conteos["Socio Común"] += 1
-
-            # Total al día
-            if estado == "APROBADO":
-                conteos["Total General (Al día)"] += 1
-
-        # 3. Generar CSV en memoria (Delimitado por punto y coma para Excel)
-        output = io.StringIO()
-        # Añadir BOM para que Excel detecte UTF-8 correctamente
-        output.write("\ufeff")
-
-        writer = csv.writer(output, delimiter=";", quoting=csv.QUOTE_MINIMAL)
-
-        # Encabezado del Reporte
-        writer.writerow(["REPORTE DE CONTABILIDAD - SOCIEDAD RURAL DEL NORTE DE CORRIENTES"])
-        writer.writerow(
-            [
-                "Fecha de Generación",
-                datetime.now(TZ_ARGENTINA).strftime("%d/%m/%Y %H:%M:%S"),
-            ]
-        )
-        writer.writerow([])
-
-        # DETALLE DE SOCIOS (Arriba)
-        writer.writerow(["DETALLE DE SOCIOS"])
-        headers = [
-            "Nombre y Apellido",
-            "DNI/CUIT",
-            "Email",
-            "Teléfono",
-            "Categoría",
-            "Municipio",
-            "Estado",
-            "Fecha Alta",
-        ]
-        writer.writerow(headers)
-
-        # Filas de detalle
-        for p in data:
-            # Re-clasificar para mostrar en la columna Categoría
-            rol = p.get("rol", "SOCIO")
-            titular_id = p.get("titular_id")
-            es_profesional = p.get("es_profesional", False)
-            es_empleado = p.get("es_empleado_comercial", False) and p.get("activo_empleado", True)
-
-            cat_label = "Socio Común"
-            if es_empleado:
-                cat_label = "Empleado Comercial"
-            elif rol == "COMERCIO":
-                cat_label = "Empleado Comercial" if titular_id else "Comercio"
-            else:
-                if titular_id:
-                    cat_label = "Familiar (Adherente)"
-                elif es_profesional:
-                    cat_label = "Profesional"
-
-            fecha_alta = (
-                datetime.fromisoformat(p["created_at"].replace("Z", "+00:00")).strftime(
-                    "%d/%m/%Y"
-                )
-                if p.get("created_at")
-                else "-"
+        # Consultar socios y comercios (que actúan como socios en el sistema)
+        logger.info("[REPORTS] Solicitando perfiles para rol: SOCIO, COMERCIO, ADMIN")
+        perfiles = _perfiles_socios(COLUMNAS_SOCIOS_EXCEL)
+        primero = next(perfiles, None)
+        if primero is None:
+            return JSONResponse(
+                status_code=404, content={"detail": "No hay socios para exportar"}
             )
 
-            writer.writerow(
-                [
-                    p.get("nombre_apellido", "-"),
-                    p.get("dni", "-"),
-                    p.get("email", "-"),
-                    p.get("telefono", "-"),
-                    cat_label,
-                    p.get("municipio", "No especificado"),
-                    p.get("estado", "PENDIENTE"),
-                    fecha_alta,
-                ]
-            )
+        archivo = tempfile.SpooledTemporaryFile(max_size=REPORTES_SPOOL_MAX_BYTES)
+        total = escribir_xlsx_socios(itertools.chain([primero], perfiles), archivo)
+        tamano = archivo.tell()
+        logger.info(f"[REPORTS] Excel generado: {total} socios, {tamano} bytes")
+
+        return StreamingResponse(
+            leer_en_bloques(archivo),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={
+                "Content-Disposition": "attachment; filename=socios_sociedad_rural.xlsx",
+                "Content-Length": str(tamano),
+            },
+        )
+    except Exception as e:
+        if archivo is not None:
+            archivo.close()
+        logger.error(f"Error en reporte excel: {e}")
+        raise HTTPException(status_code=500, detail="Error al generar el reporte Excel")
 
-        writer.writerow([])
-        writer.writerow([])
 
-        # Sección de Resumen (Abajo)
-        writer.writerow(["RESUMEN DE CATEGORÍAS"])
-        writer.writerow(["Categoría", "Cantidad"])
-        for cat, cant in conteos.items():
-            writer.writerow([cat, cant])
+@app.get("/api/admin/reports/contabilidad/csv")
+def exportar_contabilidad_csv(admin_user=Depends(get_current_admin)):
+    """Genera un reporte CSV especializado para contabilidad con resumen de categorías.
+    Se transmite a medida que se recorren los perfiles por páginas (memoria constante)."""
+    try:
+        perfiles = _perfiles_socios(COLUMNAS_CONTABILIDAD, roles=None)
+        # La primera página se lee antes de empezar a responder: así "sin datos"
+        # y los errores de la base siguen respondiendo 404/500.
+        primero = next(perfiles, None)
+        if primero is None:
+            raise HTTPException(status_code=404, detail="No hay datos para exportar")
 
-        # 4. Retornar StreamingResponse
-        output.seek(0)
         return StreamingResponse(
-            io.BytesIO(output.getvalue().encode("utf-8-sig")),
-            media_type="text/csv",
+            generar_csv_contabilidad(itertools.chain([primero], perfiles), datetime.now(TZ_ARGENTINA)),
+            media_type="text/csv; charset=utf-8",
             headers={
                 "Content-Disposition": "attachment; filename=reporte_contabilidad_sr.csv"
             },
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error en reporte contabilidad: {e}")
         raise HTTPException(
@@ -6214,121 +7174,216 @@ def exportar_contabilidad_csv(admin_user=Depends(get_current_admin)):
         )
 
 
+REPORTES_PDF_TIMEOUT = int(os.getenv("REPORTES_PDF_TIMEOUT", "300"))
+
+_pdf_en_curso: Dict[str, Any] = {}
+_pdf_lock = threading.Lock()
+
+
 @app.get("/api/admin/reports/socios/pdf")
 def exportar_socios_pdf(admin_user=Depends(get_current_admin)):
-    """Genera un reporte PDF con diseño institucional de los socios."""
-    try:
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.platypus import (
-            SimpleDocTemplate,
-            Table,
-            TableStyle,
-            Paragraph,
-            Spacer,
-            Image,
-        )
-        from reportlab.lib.styles import getSampleStyleSheet
-        from reportlab.lib import colors
-        from reportlab.lib.units import cm
+    """Genera un reporte PDF con diseño institucional de los socios.
+    El PDF se arma en un proceso aparte y se guarda en storage identificado por
+    el contenido del padrón y el día: mientras no cambien, se sirve el guardado."""
+    try:
+        filas = [fila_pdf(s) for s in _perfiles_socios(COLUMNAS_SOCIOS_PDF)]
+        logger.info(f"[REPORTS-PDF] Datos encontrados: {len(filas)}")
+
+        ahora = datetime.now(TZ_ARGENTINA)
+        clave = hash_contenido(filas, ahora.strftime("%Y-%m-%d"))
+        path = f"socios/{clave}.pdf"
+        headers = {
+            "Content-Disposition": "attachment; filename=reporte_socios.pdf",
+            "X-Reporte-Hash": clave,
+        }
 
-        res = (
-            supabase.table("profiles")
-            .select("nombre_apellido, dni, estado, telefono, municipio, rol")
-            .in_("rol", ["SOCIO", "COMERCIO", "ADMIN"])
-            .execute()
-        )
-        logger.info(f"[REPORTS-PDF] Datos encontrados: {len(res.data) if res.data else 0}")
-        data = res.data
+        pdf = almacen_reportes.leer(path)
+        if pdf is not None:
+            logger.info(f"[REPORTS-PDF] Servido desde storage: {path}")
+            return Response(content=pdf, media_type="application/pdf", headers=headers)
+
+        # Si ya hay una generación en curso con los mismos datos, se espera esa
+        with _pdf_lock:
+            futuro = _pdf_en_curso.get(clave)
+            propio = futuro is None
+            if propio:
+                futuro = generar_pdf_en_pool(filas, ahora.strftime("%d/%m/%Y %H:%M"), os.path.join(BASE_DIR, "logo.jpg"))
+                _pdf_en_curso[clave] = futuro
+        try:
+            inicio = time.monotonic()
+            pdf = futuro.result(timeout=REPORTES_PDF_TIMEOUT)
+            if propio:
+                logger.info(f"[REPORTS-PDF] Generado en {time.monotonic() - inicio:.2f}s: {len(filas)} socios, {len(pdf)} bytes")
+                try:
+                    almacen_reportes.guardar(path, io.BytesIO(pdf), "application/pdf")
+                except Exception as e:
+                    logger.warning(f"[REPORTS-PDF] No se pudo guardar en storage: {e}")
+        finally:
+            if propio:
+                with _pdf_lock:
+                    _pdf_en_curso.pop(clave, None)
+
+        return Response(content=pdf, media_type="application/pdf", headers=headers)
+    except Exception as e:
+        logger.error(f"Error en reporte PDF: {e}")
+        raise HTTPException(status_code=500, detail="Error al generar reporte PDF")
 
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), topMargin=20)
-        elements = []
 
-        styles = getSampleStyleSheet()
+# ── TRABAJOS DE REPORTES (asincrónicos) ─────────────────────────────────────
+from fastapi.responses import FileResponse
+from services.reportes_jobs import TIPOS_REPORTE, ContadorFilas, PoolReportes, clave_job, ejecutar_reporte
 
-        # Logo Centrado
-        logo_path = "logo.jpg"
-        if os.path.exists(logo_path):
-            img = Image(logo_path, width=4 * cm, height=4 * cm)
-            img.hAlign = "CENTER"
-            elements.append(img)
-            elements.append(Spacer(1, 10))
+REPORTES_JOBS_WORKERS = int(os.getenv("REPORTES_JOBS_WORKERS", "2"))
+REPORTES_JOBS_MAX_PENDIENTES = int(os.getenv("REPORTES_JOBS_MAX_PENDIENTES", "20"))
+REPORTES_JOBS_VENCIMIENTO_MIN = int(os.getenv("REPORTES_JOBS_VENCIMIENTO_MIN", "30"))
+REPORTES_URL_TTL = int(os.getenv("REPORTES_URL_TTL", "300"))
 
-        # Título
-        elements.append(
-            Paragraph("<b>SOCIEDAD RURAL DEL NORTE DE CORRIENTES</b>", styles["Title"])
-        )
-        elements.append(
-            Paragraph("<b>INFORME ESTATUTARIO DE SOCIOS</b>", styles["Heading2"])
-        )
-        elements.append(Spacer(1, 10))
-        elements.append(
-            Paragraph(
-                f"Fecha de reporte: {datetime.now(TZ_ARGENTINA).strftime('%d/%m/%Y %H:%M')}",
-                styles["Normal"],
-            )
-        )
-        elements.append(Spacer(1, 20))
+pool_reportes = PoolReportes(REPORTES_JOBS_WORKERS, REPORTES_JOBS_MAX_PENDIENTES)
 
-        # Tabla de datos
-        table_data = [
-            ["SOCIO / NOMBRE Y APELLIDO", "DNI", "ESTADO", "TELÉFONO", "MUNICIPIO"]
-        ]
-        for s in data:
-            # Limpieza de datos Nones para evitar "None" en el PDF
-            nombre = s.get("nombre_apellido") or "-"
-            dni = s.get("dni") or "-"
-            estado = s.get("estado") or "-"
-            tel = s.get("telefono") or "-"
-            muni = s.get("municipio") or "No especificado"
-
-            table_data.append([str(nombre), str(dni), str(estado), str(tel), str(muni)])
-
-        # Diseño de la tabla
-        t = Table(table_data, colWidths=[200, 80, 100, 100, 150])
-        t.setStyle(
-            TableStyle(
-                [
-                    (
-                        "BACKGROUND",
-                        (0, 0),
-                        (-1, 0),
-                        colors.Color(0.1, 0.4, 0.2),
-                    ),  # Verde institucional sugerido
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                    ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("FONTSIZE", (0, 0), (-1, 0), 10),
-                    ("BOTTOMPADDING", (0, 0), (-1, 0), 10),
-                    ("TOPPADDING", (0, 0), (-1, 0), 10),
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                    ("FONTSIZE", (0, 1), (-1, -1), 9),
-                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                ]
-            )
-        )
-        elements.append(t)
 
-        # Pie de página
-        elements.append(Spacer(1, 30))
-        elements.append(
-            Paragraph(
-                "Documento emitido por el Sistema de Gestión Digital - Sociedad Rural Del Norte De Corrientes.",
-                styles["Italic"],
-            )
-        )
+class ReporteJobCreate(BaseModel):
+    tipo: str
+    municipio: Optional[str] = None
+    estado: Optional[str] = None
 
-        doc.build(elements)
-        buffer.seek(0)
 
-        return StreamingResponse(
-            buffer,
-            media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=reporte_socios.pdf"},
+def _generar_reporte(tipo: str, parametros: Dict[str, Any], archivo) -> int:
+    """Escribe el reporte en `archivo`. Retorna la cantidad de filas de datos."""
+    filtros = {"municipio": parametros.get("municipio"), "estado": parametros.get("estado")}
+    if tipo == "socios_excel":
+        return escribir_xlsx_socios(_perfiles_socios(COLUMNAS_SOCIOS_EXCEL, **filtros), archivo)
+    if tipo == "contabilidad_csv":
+        perfiles = ContadorFilas(_perfiles_socios(COLUMNAS_CONTABILIDAD, roles=None, **filtros))
+        for bloque in generar_csv_contabilidad(perfiles, datetime.now(TZ_ARGENTINA)):
+            archivo.write(bloque)
+        return perfiles.n
+    if tipo == "socios_pdf":
+        filas = [fila_pdf(s) for s in _perfiles_socios(COLUMNAS_SOCIOS_PDF, **filtros)]
+        futuro = generar_pdf_en_pool(filas, datetime.now(TZ_ARGENTINA).strftime("%d/%m/%Y %H:%M"), os.path.join(BASE_DIR, "logo.jpg"))
+        archivo.write(futuro.result(timeout=REPORTES_PDF_TIMEOUT))
+        return len(filas)
+    raise ValueError(f"Tipo de reporte desconocido: {tipo}")
+
+
+def _procesar_reporte_job(job_id: str, tipo: str, parametros: Dict[str, Any]):
+    extension, content_type = TIPOS_REPORTE[tipo]
+    path = f"jobs/{tipo}/{job_id}.{extension}"
+    # Cualquier falla (también al marcar PROCESANDO o LISTO) deja el trabajo en
+    # ERROR: uno colgado en PENDIENTE absorbería los pedidos iguales hasta vencer.
+    try:
+        supabase.table("reportes_jobs").update({
+            "estado": "PROCESANDO",
+            "iniciado_en": datetime.now(timezone.utc).isoformat(),
+        }).eq("id", job_id).execute()
+        metricas = ejecutar_reporte(
+            lambda archivo: _generar_reporte(tipo, parametros, archivo),
+            almacen_reportes,
+            path,
+            content_type,
+            REPORTES_SPOOL_MAX_BYTES,
         )
+        logger.info(
+            f"[REPORTES] Trabajo {job_id} ({tipo}) listo: {metricas['filas']} filas, "
+            f"{metricas['bytes']} bytes, {metricas['duracion_ms']} ms"
+        )
+        supabase.table("reportes_jobs").update({
+            "estado": "LISTO",
+            "path": path,
+            **metricas,
+            "finalizado_en": datetime.now(timezone.utc).isoformat(),
+        }).eq("id", job_id).execute()
     except Exception as e:
-        logger.error(f"Error en reporte PDF: {e}")
-        raise HTTPException(status_code=500, detail="Error al generar reporte PDF")
+        logger.error(f"[REPORTES] Trabajo {job_id} ({tipo}) falló: {e}")
+        supabase.table("reportes_jobs").update({
+            "estado": "ERROR",
+            "error": str(e)[:500],
+            "finalizado_en": datetime.now(timezone.utc).isoformat(),
+        }).eq("id", job_id).execute()
+
+
+@app.post("/api/admin/reports/jobs", status_code=202)
+def crear_reporte_job(payload: ReporteJobCreate, admin_user=Depends(get_current_admin)):
+    """
+    Encola la generación de un reporte (socios_excel, contabilidad_csv, socios_pdf).
+    Si ya hay un trabajo activo con los mismos parámetros, se devuelve ese.
+    El estado se consulta en GET /api/admin/reports/jobs/{job_id}.
+    """
+    if payload.tipo not in TIPOS_REPORTE:
+        raise HTTPException(status_code=400, detail=f"Tipo de reporte inválido. Opciones: {', '.join(TIPOS_REPORTE)}")
+
+    parametros = {k: v for k, v in {"municipio": payload.municipio, "estado": payload.estado}.items() if v}
+    vencido_antes = datetime.now(timezone.utc) - timedelta(minutes=REPORTES_JOBS_VENCIMIENTO_MIN)
+    try:
+        res = supabase.rpc("encolar_reporte_job", {
+            "p_tipo": payload.tipo,
+            "p_parametros": parametros,
+            "p_clave": clave_job(payload.tipo, parametros),
+            "p_solicitado_por": admin_user.id,
+            "p_vencido_antes": vencido_antes.isoformat(),
+        }).execute()
+        job = res.data[0]
+    except Exception as e:
+        logger.error(f"[REPORTES] Error encolando trabajo: {e}")
+        raise HTTPException(status_code=500, detail="Error al encolar el reporte")
+
+    if job["nuevo"] and not pool_reportes.enviar(_procesar_reporte_job, job["id"], payload.tipo, parametros):
+        supabase.table("reportes_jobs").update({
+            "estado": "ERROR",
+            "error": "cola llena",
+            "finalizado_en": datetime.now(timezone.utc).isoformat(),
+        }).eq("id", job["id"]).execute()
+        raise HTTPException(status_code=503, detail="Hay demasiados reportes en proceso. Intentá en unos minutos.")
+
+    return {"job_id": job["id"], "estado": job["estado"], "nuevo": job["nuevo"]}
+
+
+@app.get("/api/admin/reports/jobs")
+def listar_reportes_jobs(limit: int = Query(20, ge=1, le=100), admin_user=Depends(get_current_admin)):
+    """Últimos trabajos con sus métricas (filas, bytes, duración) y el estado del pool."""
+    res = (
+        supabase.table("reportes_jobs")
+        .select("id, tipo, parametros, estado, filas, bytes, duracion_ms, error, created_at, finalizado_en")
+        .order("created_at", desc=True)
+        .limit(limit)
+        .execute()
+    )
+    return {"jobs": res.data or [], "pool": pool_reportes.stats()}
+
+
+@app.get("/api/admin/reports/jobs/{job_id}")
+def estado_reporte_job(job_id: str, admin_user=Depends(get_current_admin)):
+    """Estado de un trabajo. Si está LISTO incluye una URL de descarga de vida corta."""
+    res = (
+        supabase.table("reportes_jobs")
+        .select("id, tipo, parametros, estado, path, filas, bytes, duracion_ms, error, created_at, iniciado_en, finalizado_en")
+        .eq("id", job_id)
+        .execute()
+    )
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    job = res.data[0]
+    path = job.pop("path")
+    if job["estado"] == "LISTO" and path:
+        job["url"] = almacen_reportes.url_descarga(path, REPORTES_URL_TTL)
+        job["url_expira_en"] = REPORTES_URL_TTL
+    return job
+
+
+@app.get("/api/admin/reports/archivos/{path:path}")
+def descargar_reporte_local(path: str, expira: int, firma: str):
+    """Descarga desde el almacén local (REPORTES_ALMACEN=local). La URL firmada es la autorización."""
+    if almacen_reportes.backend != "local":
+        raise HTTPException(status_code=404, detail="No encontrado")
+    ruta = almacen_reportes.verificar(path, expira, firma)
+    if ruta is None:
+        raise HTTPException(status_code=403, detail="Enlace inválido o vencido")
+    return FileResponse(ruta, filename=os.path.basename(path))
+
+
+@app.on_event("shutdown")
+def cerrar_pool_reportes():
+    pool_reportes.cerrar()
+    cerrar_pool_pdf()
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -6496,9 +7551,117 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
 # ─────────────────────────────────────────────────────────────────────────────
 
 # ─── SISTEMA DE COBRANZA DIGITAL ─────────────────────────────────────────────
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from services.recibos import PlantillaRecibo
+from services.pagos_lote import aprobar_pagos, rechazar_pagos, separar_ids
+
+RECIBOS_BUCKET = "recibos"
+# El logo se decodifica una sola vez; cada recibo se renderiza en memoria
+plantilla_recibo = PlantillaRecibo(os.path.join(BASE_DIR, "logo.jpg"))
+
+# Buckets ya verificados/creados en este proceso (evita un create_bucket por request)
+_buckets_listos: set = set()
+
+
+def _asegurar_bucket(nombre: str, publico: bool = True):
+    if nombre in _buckets_listos:
+        return
+    try:
+        supabase.storage.get_bucket(nombre)
+    except Exception:
+        try:
+            supabase.storage.create_bucket(nombre, options={"public": publico})
+        except Exception:
+            pass  # Si ya existe (lo creó otro proceso), ignoramos.
+    _buckets_listos.add(nombre)
+
+
+def _url_recibo(pago_id: str) -> str:
+    return supabase.storage.from_(RECIBOS_BUCKET).get_public_url(f"recibo_{pago_id}.pdf")
+
+
+def _subir_recibo(pago: Dict[str, Any], socio_profile: Dict[str, Any]) -> Optional[str]:
+    """Renderiza el recibo del pago y lo sube a Storage. Retorna la URL pública (None si falla)."""
+    pago_id = pago["id"]
+    try:
+        pdf_bytes = plantilla_recibo.renderizar({
+            "pago_id": pago_id,
+            "fecha_pago": datetime.now(TZ_ARGENTINA).strftime("%d/%m/%Y"),
+            "nombre_apellido": socio_profile["nombre_apellido"],
+            "dni": socio_profile["dni"],
+            "periodo": pago["fecha_vencimiento"][:7],
+            "monto": pago["monto"],
+        })
+        _asegurar_bucket(RECIBOS_BUCKET)
+        supabase.storage.from_(RECIBOS_BUCKET).upload(
+            file=pdf_bytes,
+            path=f"recibo_{pago_id}.pdf",
+            file_options={"content-type": "application/pdf", "upsert": "true"},
+        )
+        return _url_recibo(pago_id)
+    except Exception as e:
+        logger.error(f"[RECIBOS] Error generando recibo del pago {pago_id}: {e}", exc_info=True)
+        return None
+
+
+def _aviso_recibo(pago: Dict[str, Any], pdf_url: str) -> Dict[str, Any]:
+    """Notificación in-app del recibo (formato de enviar_notificaciones_push_lote)."""
+    return {
+        "usuario_id": pago["socio_id"],
+        "titulo": "Pago validado ✅",
+        "mensaje": f"Validamos tu Cuota Social {pago['fecha_vencimiento'][:7]}. Tu recibo oficial ya está disponible.",
+        "link_url": pdf_url,
+    }
+
+
+def _whatsapp_recibo(pago: Dict[str, Any], socio_profile: Dict[str, Any], pdf_url: str):
+    if socio_profile.get("telefono"):
+        mensaje_wa = (
+            f"¡Hola {socio_profile['nombre_apellido']}! 👋\n"
+            f"Queriamos confirmarte que hemos recibido y validado el pago de tu Cuota Social ({pago['fecha_vencimiento'][:7]}).\n\n"
+            f"Podés descargar tu Recibo Oficial directamente aquí: {pdf_url}\n\n"
+            "Muchas gracias por estar al día. Sociedad Rural Del Norte De Corrientes."
+        )
+        enviar_whatsapp(socio_profile["telefono"], mensaje_wa)
+
+
+def generar_y_enviar_recibo(pago: Dict[str, Any], socio_profile: Dict[str, Any]):
+    """
+    Tarea de fondo tras aprobar un pago: renderiza el recibo, lo sube a Storage
+    y avisa al socio por WhatsApp y con una notificación in-app.
+    """
+    pdf_url = _subir_recibo(pago, socio_profile)
+    if pdf_url is None:
+        return
+    _whatsapp_recibo(pago, socio_profile, pdf_url)
+    enviar_notificacion_push_inapp(**_aviso_recibo(pago, pdf_url))
+
+
+RECIBOS_WORKERS = int(os.getenv("RECIBOS_WORKERS", "4"))
+PAGOS_LOTE_MAX = int(os.getenv("PAGOS_LOTE_MAX", "500"))
+recibos_pool = ThreadPoolExecutor(max_workers=RECIBOS_WORKERS, thread_name_prefix="recibos")
+
+
+def generar_y_enviar_recibos_lote(pagos: List[Dict[str, Any]]):
+    """
+    Tarea de fondo de la aprobación masiva: los recibos se generan en paralelo
+    en `recibos_pool` y los avisos salen juntos al final (un lote de
+    notificaciones in-app/push y los WhatsApp en secuencia).
+    """
+    urls = list(recibos_pool.map(lambda p: _subir_recibo(p, p["profiles"]), pagos))
+    listos = [(p, url) for p, url in zip(pagos, urls) if url]
+    logger.info(f"[RECIBOS] Lote: {len(listos)}/{len(pagos)} recibos generados")
+
+    enviar_notificaciones_push_lote([_aviso_recibo(p, url) for p, url in listos])
+    for p, url in listos:
+        _whatsapp_recibo(p, p["profiles"], url)
+
+
+@app.on_event("shutdown")
+def cerrar_recibos_pool():
+    # Se esperan los recibos en curso: la aprobación ya quedó registrada
+    recibos_pool.shutdown(wait=True)
 
 
 class PagoActionRequest(BaseModel):
@@ -6506,6 +7669,11 @@ class PagoActionRequest(BaseModel):
     motivo: Optional[str] = None
 
 
+class PagosLoteRequest(BaseModel):
+    pago_ids: List[str]
+    motivo: Optional[str] = None
+
+
 @app.get("/api/mis-pagos")
 def get_mis_pagos(current_user=Depends(require_titular)):
     """Retorna los pagos del socio titular. Bloqueado para integrantes FAMILIAR."""
@@ -6547,10 +7715,7 @@ async def subir_comprobante(
         file_ext = file.filename.split(".")[-1]
         filename = f"{current_user.id}_{anio}_{mes}_{uuid4().hex[:6]}.{file_ext}"
 
-        try:
-            supabase.storage.create_bucket(bucket_name, public=True)
-        except Exception:
-            pass  # Si ya existe, ignoramos.
+        _asegurar_bucket(bucket_name)
 
         supabase.storage.from_(bucket_name).upload(
             file=file_bytes,
@@ -6639,71 +7804,14 @@ def validar_pago(
         supabase.table("profiles").update({"estado": "APROBADO", "motivo": None}).eq(
             "id", pago["socio_id"]
         ).execute()
+        _invalidar_directorio()
 
-        # Generar Recibo PDF
-        pdf_bucket = "recibos"
-        try:
-            supabase.storage.create_bucket(pdf_bucket, public=True)
-        except Exception:
-            pass
-
-        filename = f"recibo_{pago_id}.pdf"
-        filepath = os.path.join(tempfile.gettempdir(), filename)
-
-        c = canvas.Canvas(filepath, pagesize=A4)
-        c.setFont("Helvetica-Bold", 20)
-        c.drawString(50, 750, "SOCIEDAD RURAL DEL NORTE DE CORRIENTES")
-        c.setFont("Helvetica", 14)
-        c.drawString(50, 720, "RECIBO OFICIAL DE CUOTA SOCIAL")
-
-        # Probar incluir logo
-        logo_path = os.path.join(BASE_DIR, "logo.jpg")
-        if os.path.exists(logo_path):
-            try:
-                c.drawImage(logo_path, 400, 710, width=100, height=100)
-            except Exception:
-                pass
-
-        c.setFont("Helvetica", 12)
-        c.drawString(50, 680, f"Recibo N°: {pago_id[-8:].upper()}")
-        c.drawString(
-            50, 660, f"Fecha de Pago: {datetime.now(TZ_ARGENTINA).strftime('%d/%m/%Y')}"
-        )
-        c.drawString(50, 640, "-" * 80)
-
-        c.setFont("Helvetica", 14)
-        c.drawString(50, 600, f"Señor/a: {socio_profile['nombre_apellido']}")
-        c.drawString(50, 580, f"DNI/CUIT: {socio_profile['dni']}")
-        c.drawString(50, 560, f"Concepto: Cuota Social {pago['fecha_vencimiento'][:7]}")
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(50, 530, f"Importe Abonado: ${pago['monto']}")
-        c.drawString(50, 510, "Firma digital SRNC: Aprobado por tesorería.")
-
-        c.save()
-
-        with open(filepath, "rb") as f:
-            pdf_bytes = f.read()
-
-        supabase.storage.from_(pdf_bucket).upload(
-            file=pdf_bytes,
-            path=filename,
-            file_options={"content-type": "application/pdf"},
-        )
-        pdf_url = supabase.storage.from_(pdf_bucket).get_public_url(filename)
+        # El recibo se genera y se envía en segundo plano; la aprobación ya quedó registrada
+        background_tasks.add_task(generar_y_enviar_recibo, pago, socio_profile)
 
-        # Enviar WhatsApp al socio
-        if socio_profile.get("telefono"):
-            mensaje_wa = (
-                f"¡Hola {socio_profile['nombre_apellido']}! 👋\n"
-                f"Queriamos confirmarte que hemos recibido y validado el pago de tu Cuota Social ({pago['fecha_vencimiento'][:7]}).\n\n"
-                f"Podés descargar tu Recibo Oficial directamente aquí: {pdf_url}\n\n"
-                "Muchas gracias por estar al día. Sociedad Rural Del Norte De Corrientes."
-            )
-            background_tasks.add_task(
-                enviar_whatsapp, socio_profile["telefono"], mensaje_wa
-            )
-
-        return {"status": "success", "pdf_url": pdf_url}
+        return {"status": "success", "pdf_url": _url_recibo(pago_id), "recibo": "en_proceso"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("[/api/admin/pagos/aprobar] Error al validar pago:")
         raise HTTPException(status_code=500, detail="Error al procesar el pago.")
@@ -6724,6 +7832,68 @@ def rechazar_pago(req: PagoActionRequest, current_admin=Depends(get_current_admi
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 
+def _ids_lote(pago_ids: List[str]) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+    """(ids del pedido en orden, resultados ya resueltos: los que no son UUID)."""
+    ids, invalidos = separar_ids(pago_ids)
+    if not ids:
+        raise HTTPException(status_code=400, detail="No se indicaron pagos.")
+    if len(ids) > PAGOS_LOTE_MAX:
+        raise HTTPException(status_code=400, detail=f"Se pueden procesar hasta {PAGOS_LOTE_MAX} pagos por vez.")
+    return ids, {pago_id: {"ok": False, "resultado": "id_invalido"} for pago_id in invalidos}
+
+
+@app.post("/api/admin/pagos/aprobar-lote")
+def validar_pagos_lote(
+    req: PagosLoteRequest,
+    background_tasks: BackgroundTasks,
+    current_admin=Depends(get_current_admin),
+):
+    """
+    Aprueba varios pagos en PENDIENTE_VALIDACION de una vez. Los updates de
+    pagos_cuotas y profiles se hacen por tramos (un UPDATE ... IN por tramo);
+    los recibos y avisos se generan en segundo plano. Resultado por pago
+    (ver services/pagos_lote).
+    """
+    ids, resultados = _ids_lote(req.pago_ids)
+    procesados, aprobados = aprobar_pagos(
+        supabase,
+        [pago_id for pago_id in ids if pago_id not in resultados],
+        current_admin.id,
+        "id, socio_id, monto, fecha_vencimiento, estado_pago, profiles!inner(nombre_apellido, dni, telefono)",
+    )
+    resultados.update(procesados)
+    for p in aprobados:
+        resultados[p["id"]]["pdf_url"] = _url_recibo(p["id"])
+
+    if aprobados:
+        _invalidar_directorio()
+        background_tasks.add_task(generar_y_enviar_recibos_lote, aprobados)
+
+    return {
+        "status": "success",
+        "aprobados": len(aprobados),
+        "total": len(ids),
+        "resultados": [{"pago_id": pago_id, **resultados[pago_id]} for pago_id in ids],
+    }
+
+
+@app.post("/api/admin/pagos/rechazar-lote")
+def rechazar_pagos_lote(req: PagosLoteRequest, current_admin=Depends(get_current_admin)):
+    """Rechaza varios pagos en PENDIENTE_VALIDACION con un mismo motivo. Resultado por pago."""
+    ids, resultados = _ids_lote(req.pago_ids)
+    motivo = req.motivo or "Sin motivo especificado"
+    procesados, rechazados = rechazar_pagos(supabase, [pago_id for pago_id in ids if pago_id not in resultados], motivo)
+    resultados.update(procesados)
+
+    return {
+        "status": "success",
+        "motivo": motivo,
+        "rechazados": rechazados,
+        "total": len(ids),
+        "resultados": [{"pago_id": pago_id, **resultados[pago_id]} for pago_id in ids],
+    }
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # GESTIÓN DINÁMICA DE CUOTAS
 # ─────────────────────────────────────────────────────────────────────────────
@@ -6738,8 +7908,7 @@ class CuotasUpdateRequest(BaseModel):
 @app.get("/api/cuotas/valores")
 def get_cuotas_valores():
     try:
-        response = supabase.table("configuracion_cuotas").select("*").execute()
-        return {"cuotas": response.data}
+        return {"cuotas": referencias.filas("configuracion_cuotas")}
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
@@ -6759,6 +7928,7 @@ def update_cuotas_valores(req: CuotasUpdateRequest, current_admin=Depends(get_cu
                     "monto": cuota.monto,
                     "ultima_actualizacion": "now()"
                 }).execute()
+        referencias.invalidar("configuracion_cuotas")
         return {"status": "success"}
     except Exception as e:
         logger.error(f"[PUT /api/admin/cuotas/valores] Error: {e}", exc_info=True)
@@ -6787,8 +7957,7 @@ def calcular_cuota_dinamica_internal(user_id: str):
     descuento_profesional_habilitado = (registration_source == "admin")
 
     # Traer valores base
-    cuotas_res = supabase.table("configuracion_cuotas").select("*").execute()
-    cuotas_map = {str(c["rol"]).upper(): float(c["monto"]) for c in cuotas_res.data}
+    cuotas_map = {str(c["rol"]).upper(): float(c["monto"]) for c in referencias.filas("configuracion_cuotas")}
     
     comercio_nombre = None
     descuento_pct_aplicado = 0
@@ -7251,9 +8420,12 @@ def cron_verificar_bloqueos(request: Request):
     try:
         hoy = datetime.now(TZ_ARGENTINA).date()
         
-        # Consultamos cuotas en mora (PENDIENTE o VENCIDO)
-        cuotas_res = supabase.table("pagos_cuotas").select("id, socio_id, fecha_vencimiento, estado_pago").in_("estado_pago", ["PENDIENTE", "VENCIDO"]).execute()
-        cuotas = cuotas_res.data or []
+        # Consultamos cuotas en mora (PENDIENTE o VENCIDO), por páginas de id:
+        # marcar VENCIDO una cuota ya leída no altera el recorrido
+        cuotas = _leer_todo(
+            lambda: supabase.table("pagos_cuotas").select("id, socio_id, fecha_vencimiento, estado_pago").in_("estado_pago", ["PENDIENTE", "VENCIDO"]),
+            "verificar_bloqueos.cuotas",
+        )
         
         marcados = 0
         bloqueos = 0
@@ -7293,6 +8465,7 @@ def cron_verificar_bloqueos(request: Request):
                                 "estado": "SUSPENDIDO",
                                 "motivo": f"Suspendido por mora de {dias_habiles} días hábiles (cuota {v_str})"
                             }).eq("id", socio_id).execute()
+                            _invalidar_directorio()
                             
                             # Loguear en auditoría
                             supabase.table("auditoria_logs").insert({
@@ -7343,8 +8516,10 @@ def cron_notificar_mora(request: Request):
         hoy = datetime.now(TZ_ARGENTINA).date()
         mes_actual_str = f"{hoy.year}-{hoy.month:02d}"
         
-        cuotas_res = supabase.table("pagos_cuotas").select("id, socio_id, fecha_vencimiento").eq("estado_pago", "VENCIDO").execute()
-        cuotas = cuotas_res.data or []
+        cuotas = _leer_todo(
+            lambda: supabase.table("pagos_cuotas").select("id, socio_id, fecha_vencimiento").eq("estado_pago", "VENCIDO"),
+            "notificar_mora.cuotas",
+        )
         
         enviados = 0
         errores = 0
@@ -7481,19 +8656,19 @@ def _detectar_socios_sin_pago() -> list[dict]:
         ).isoformat()
 
         # Socios Y empleados comerciales activos registrados hace al menos 29 días
-        perfiles_res = (
-            supabase.table("profiles")
+        perfiles_todos = _leer_todo(
+            lambda: supabase.table("profiles")
             .select("id, nombre_apellido, telefono, email, estado, created_at, rol, es_empleado_comercial, activo_empleado")
             .in_("estado", ["APROBADO", "PENDIENTE"])
-            .lt("created_at", fecha_limite)
-            .execute()
+            .lt("created_at", fecha_limite),
+            "recordatorios.socios_sin_pago",
         )
         # Filtrar: SOCIOs normales + EMPLEADOS COMERCIALES activos
-        perfiles = [
-            p for p in (perfiles_res.data or [])
+        perfiles = (
+            p for p in perfiles_todos
             if p.get("rol") == "SOCIO"
             or (p.get("es_empleado_comercial") and p.get("activo_empleado", True))
-        ]
+        )
 
         socios_sin_pago = []
         now_utc = datetime.now(timezone.utc)
@@ -8259,8 +9434,13 @@ def create_oferta(oferta: OfertaCreate, request: Request, background_tasks: Back
             "facebook_url": oferta.facebook_url,
             "activo": True
         }
+        coords = _coordenadas(data_insert)
+        if coords:
+            data_insert["latitud"], data_insert["longitud"] = coords[0], coords[1]
         res = supabase.table("promociones").insert(data_insert).execute()
-        
+        _invalidar_ofertas()
+        _indexar_oferta(res.data[0] if res.data else None)
+
         # Enviar notificación push a todos los socios aprobados en segundo plano
         # F0: Corregido de nombre_fantasia → nombre_comercio
         nombre_comercio = comercio_check.data[0].get("nombre_comercio", "Un comercio")
@@ -8294,6 +9474,8 @@ def update_oferta_status(oferta_id: str, update_data: OfertaUpdateActivo, reques
             raise HTTPException(status_code=403, detail="No tienes permiso para modificar esta oferta.")
 
         res = supabase.table("promociones").update({"activo": update_data.activo}).eq("id", oferta_id).execute()
+        _invalidar_ofertas()
+        _indexar_oferta(res.data[0] if res.data else None)
         return res.data[0]
     except Exception as e:
         logger.error(f"[OFERTAS] Error al actualizar oferta: {e}")
@@ -8308,7 +9490,12 @@ def update_oferta(oferta_id: str, update_data: OfertaUpdate, request: Request):
 
     try:
         # Verificar que la oferta pertenezca al comercio
-        check = supabase.table("promociones").select("comercio_id").eq("id", oferta_id).execute()
+        check = (
+            supabase.table("promociones")
+            .select("comercio_id, ubicacion, direccion, localidad")
+            .eq("id", oferta_id)
+            .execute()
+        )
         if not check.data or check.data[0]["comercio_id"] != user_id:
             raise HTTPException(status_code=403, detail="No tienes permiso para modificar esta oferta.")
 
@@ -8317,9 +9504,16 @@ def update_oferta(oferta_id: str, update_data: OfertaUpdate, request: Request):
         if not update_dict:
             return {"message": "No hay datos para actualizar"}
 
+        # Re-geocodificar si cambió algún dato de ubicación
+        if {"ubicacion", "direccion", "localidad"} & update_dict.keys():
+            coords = _coordenadas({**check.data[0], **update_dict})
+            update_dict["latitud"], update_dict["longitud"] = (coords[0], coords[1]) if coords else (None, None)
+
         res = supabase.table("promociones").update(update_dict).eq("id", oferta_id).execute()
+        _invalidar_ofertas()
         if not res.data:
             raise HTTPException(status_code=404, detail="Oferta no encontrada.")
+        _indexar_oferta(res.data[0])
         return res.data[0]
     except HTTPException:
         raise
@@ -8340,6 +9534,9 @@ def delete_oferta(oferta_id: str, request: Request):
             raise HTTPException(status_code=403, detail="No tienes permiso para eliminar esta oferta.")
 
         supabase.table("promociones").delete().eq("id", oferta_id).execute()
+        _invalidar_ofertas()
+        buscador.eliminar("oferta", oferta_id)
+        geo_ofertas.eliminar(oferta_id)
         return {"message": "Oferta eliminada correctamente."}
     except Exception as e:
         logger.error(f"[OFERTAS] Error al eliminar oferta: {e}")
@@ -8381,55 +9578,112 @@ class AnalyticsEvent(BaseModel):
     tipo_evento: str
     comercio_id: str
 
-# ── Rate limiting suave para analytics (in-memory, anti-spam) ──────────────────
-# Estructura: { "ip:promo_id:tipo_evento": last_timestamp }
-_analytics_rate_limit: dict = {}
-_ANALYTICS_COOLDOWN_SECONDS = 30  # Mismo evento del mismo IP por la misma promo: 30s cooldown
+# ── Deduplicación de analytics (anti-spam) ───────────────────────────────────
+# Mismo IP + promo + tipo de evento: views 300 s, clicks/shares 30 s.
+# Backend compartido entre workers con ANALYTICS_DEDUP_BACKEND=redis.
+from services.analytics_dedup import crear_dedup_store
+
+analytics_dedup = crear_dedup_store()
+ALLOWED_ANALYTICS_EVENTS = {"view", "whatsapp_click", "instagram_click", "maps_click", "share", "share_whatsapp", "share_facebook", "favorito"}
+
 
 def _analytics_allowed(ip: str, promo_id: str, tipo_evento: str) -> bool:
-    import time
-    # Clicks (whatsapp, instagram, maps, share) tienen cooldown corto
-    # Views tienen cooldown largo (5 min) para evitar spam de recargas
-    cooldown = 300 if tipo_evento == "view" else _ANALYTICS_COOLDOWN_SECONDS
-    key = f"{ip}:{promo_id}:{tipo_evento}"
-    now = time.time()
-    last = _analytics_rate_limit.get(key, 0)
-    if now - last < cooldown:
-        return False
-    _analytics_rate_limit[key] = now
-    # Limpieza periódica para no crecer indefinidamente (cada 1000 keys)
-    if len(_analytics_rate_limit) > 1000:
-        cutoff = now - 600
-        keys_to_delete = [k for k, v in _analytics_rate_limit.items() if v < cutoff]
-        for k in keys_to_delete:
-            del _analytics_rate_limit[k]
-    return True
+    return analytics_dedup.permitir(f"{ip}:{promo_id}:{tipo_evento}", tipo_evento)
+
+
+# ── Ingesta de analytics por lotes ────────────────────────────────────────────
+# El endpoint solo encola; un hilo escribe INSERT masivos cada N eventos o T ms.
+# created_at lo pone la base al insertar (la marca de agua del ranking de
+# popularidad depende de eso).
+from postgrest.exceptions import APIError
+from services.analytics_buffer import BufferedBatchWriter, es_error_sqlstate_de_datos
+
+analytics_buffer = BufferedBatchWriter(
+    lambda filas: supabase.table("promociones_analytics").insert(filas).execute(),
+    tam_lote=int(os.getenv("ANALYTICS_LOTE", "500")),
+    intervalo_ms=int(os.getenv("ANALYTICS_FLUSH_MS", "1000")),
+    max_cola=int(os.getenv("ANALYTICS_MAX_COLA", "20000")),
+    es_error_de_datos=lambda e: isinstance(e, APIError) and es_error_sqlstate_de_datos(e),
+    nombre="analytics",
+)
+
+
+@app.on_event("startup")
+def iniciar_analytics_buffer():
+    analytics_buffer.iniciar()
+
+
+@app.on_event("shutdown")
+def cerrar_analytics_buffer():
+    analytics_buffer.cerrar()
 
 @app.post("/api/ofertas/{oferta_id}/analytics")
 def registrar_oferta_analytics(oferta_id: str, payload: AnalyticsEvent, request: Request):
     user_id = _get_user_from_bearer(request.headers.get("Authorization"))
     client_ip = request.client.host if request.client else "unknown"
 
+    # Validar tipo_evento permitido (antes de registrarlo en el dedup)
+    if payload.tipo_evento not in ALLOWED_ANALYTICS_EVENTS:
+        return {"ok": False, "error": "invalid_event"}
+
     # Rate limiting anti-spam
     if not _analytics_allowed(client_ip, oferta_id, payload.tipo_evento):
         return {"ok": True, "rate_limited": True}
 
-    # Validar tipo_evento permitido
-    ALLOWED_EVENTS = {"view", "whatsapp_click", "instagram_click", "maps_click", "share", "share_whatsapp", "share_facebook", "favorito"}
-    if payload.tipo_evento not in ALLOWED_EVENTS:
-        return {"ok": False, "error": "invalid_event"}
+    analytics_buffer.agregar({
+        "promocion_id": oferta_id,
+        "comercio_id": payload.comercio_id,
+        "tipo_evento": payload.tipo_evento,
+        "usuario_id": user_id
+    })
+    return {"ok": True}
+
 
+@app.get("/api/admin/analytics/stats")
+def get_analytics_stats(admin_user=Depends(get_current_admin)):
+    """Métricas de la ingesta de analytics: deduplicador (hits = duplicados descartados) y buffer de escritura."""
+    return {"dedup": analytics_dedup.stats(), "buffer": analytics_buffer.stats()}
+
+
+METRICAS_DIAS = 30
+ANALYTICS_RETENCION_CRUDOS_DIAS = int(os.getenv("ANALYTICS_RETENCION_CRUDOS_DIAS", "90"))
+ANALYTICS_PURGA_LOTE = int(os.getenv("ANALYTICS_PURGA_LOTE", "5000"))
+
+
+def purgar_analytics_crudos(max_lotes: int = 200) -> int:
+    """Borra en lotes los eventos crudos más viejos que la retención. Solo toca
+    eventos ya acumulados en promociones_analytics_diario (anteriores a la marca)."""
+    antes = (datetime.now(timezone.utc) - timedelta(days=ANALYTICS_RETENCION_CRUDOS_DIAS)).isoformat()
+    total = 0
     try:
-        supabase.table("promociones_analytics").insert({
-            "promocion_id": oferta_id,
-            "comercio_id": payload.comercio_id,
-            "tipo_evento": payload.tipo_evento,
-            "usuario_id": user_id
-        }).execute()
-        return {"ok": True}
+        acumular_analytics_diario()
+        for _ in range(max_lotes):
+            res = supabase.rpc(
+                "purgar_analytics_crudos", {"p_antes": antes, "p_lote": ANALYTICS_PURGA_LOTE}
+            ).execute()
+            borrados = res.data or 0
+            total += borrados
+            if borrados < ANALYTICS_PURGA_LOTE:
+                break
+            time.sleep(0.2)  # no monopolizar la base
+        logger.info(f"[ANALYTICS] Purga de eventos crudos: {total} borrados")
     except Exception as e:
-        logger.warning(f"[ANALYTICS] Error registrando evento (non-critical): {e}")
-        return {"ok": False}
+        logger.error(f"[ANALYTICS] Error purgando eventos crudos ({total} borrados): {e}")
+    return total
+
+
+scheduler.add_job(
+    purgar_analytics_crudos, CronTrigger(hour=4, minute=30, timezone=TZ_ARGENTINA),
+    id="purgar_analytics_crudos", max_instances=1, replace_existing=True, misfire_grace_time=3600,
+)
+
+
+def _comercio_id_de_usuario(user_id: str) -> Optional[str]:
+    comercio_res = supabase.table("comercios").select("id").eq("id", user_id).execute()
+    if not comercio_res.data:
+        # Intentar también por user_id (algunos comercios usan ese campo)
+        comercio_res = supabase.table("comercios").select("id").eq("user_id", user_id).execute()
+    return comercio_res.data[0]["id"] if comercio_res.data else None
 
 
 @app.get("/api/ofertas/analytics/mis-metricas")
@@ -8443,24 +9697,15 @@ def mis_metricas_comercio(request: Request):
         raise HTTPException(status_code=401, detail="No autorizado")
 
     try:
-        # Buscar comercio_id del usuario
-        comercio_res = supabase.table("comercios").select("id").eq("id", user_id).execute()
-        if not comercio_res.data:
-            # Intentar también por user_id (algunos comercios usan ese campo)
-            comercio_res = supabase.table("comercios").select("id").eq("user_id", user_id).execute()
-        if not comercio_res.data:
+        comercio_id = _comercio_id_de_usuario(user_id)
+        if not comercio_id:
             return {"metricas": [], "totales": {}}
 
-        comercio_id = comercio_res.data[0]["id"]
-
-        # Obtener analytics de los últimos 30 días
-        desde = (datetime.utcnow() - timedelta(days=30)).isoformat()
-
-        analytics_res = supabase.table("promociones_analytics")\
-            .select("promocion_id, tipo_evento")\
-            .eq("comercio_id", comercio_id)\
-            .gte("created_at", desde)\
-            .execute()
+        # Últimos 30 días (hoy incluido): agregados diarios + eventos aún no acumulados
+        desde = (datetime.now(TZ_ARGENTINA).date() - timedelta(days=METRICAS_DIAS - 1)).isoformat()
+        analytics_res = supabase.rpc(
+            "metricas_comercio", {"p_comercio_id": comercio_id, "p_desde": desde}
+        ).execute()
 
         # Obtener nombres de promociones del comercio
         promos_res = supabase.table("promociones")\
@@ -8495,8 +9740,8 @@ def mis_metricas_comercio(request: Request):
             promo_id = row["promocion_id"]
             key = event_map.get(row["tipo_evento"])
             if key:
-                metricas_por_promo[promo_id][key] += 1
-                totales[key] += 1
+                metricas_por_promo[promo_id][key] += row["cantidad"]
+                totales[key] += row["cantidad"]
 
         # Construir respuesta con info de promoción
         metricas_list = []
@@ -8515,38 +9760,201 @@ def mis_metricas_comercio(request: Request):
         # Ordenar por total de interacciones desc
         metricas_list.sort(key=lambda x: x["total_interacciones"], reverse=True)
 
-        return {"metricas": metricas_list, "totales": totales, "dias": 30}
+        return {"metricas": metricas_list, "totales": totales, "dias": METRICAS_DIAS}
 
     except Exception as e:
         logger.error(f"[ANALYTICS] Error en mis-metricas: {e}")
         return {"metricas": [], "totales": {}}
 
 
+# ── Series temporales de analytics para el comercio ─────────────────────────
+import pandas as pd
+from services.analytics_series import (
+    armar_serie, contar_eventos, diarios_a_conteos, parse_marca, ZONA_ARGENTINA,
+)
+
+SERIE_MAX_DIAS = 365
+SERIE_HORARIA_MAX_DIAS = 7
+series_cache = VersionedResponseCache(
+    ttl_seconds=float(os.getenv("SERIES_CACHE_TTL", "300")),
+    max_entries=int(os.getenv("SERIES_CACHE_MAX", "1024")),
+)
+
+
+def _marca_analytics() -> Optional[str]:
+    res = supabase.table("jobs_watermarks").select("marca").eq("job", "analytics_diario").execute()
+    return res.data[0]["marca"] if res.data else None
+
+
+def _eventos_crudos(comercio_id: str, promocion_id: Optional[str], posteriores_a):
+    # El comercio se toma de la promoción: el comercio_id del evento lo manda el cliente
+    def construir_query():
+        query = (
+            supabase.table("promociones_analytics")
+            .select("id, created_at, tipo_evento, promociones!inner(comercio_id)")
+            .eq("promociones.comercio_id", comercio_id)
+            .gt("created_at", posteriores_a.isoformat())
+        )
+        if promocion_id:
+            query = query.eq("promocion_id", promocion_id)
+        return query
+    return list(recorrer_keyset(construir_query, [("created_at", False), ("id", False)], tamano_pagina=1000))
+
+
+def _conteos_diarios(comercio_id: str, promocion_id: Optional[str], desde: date):
+    """Agregados diarios + eventos crudos posteriores a la marca de agua. Si el
+    job de acumulación avanza la marca mientras se lee, se vuelve a leer para
+    no contar dos veces los mismos eventos."""
+    inicio_utc = pd.Timestamp(desde).tz_localize(ZONA_ARGENTINA).tz_convert("UTC")
+
+    def construir_query():
+        query = (
+            supabase.table("promociones_analytics_diario")
+            .select("promocion_id, fecha, tipo_evento, cantidad")
+            .eq("comercio_id", comercio_id)
+            .gte("fecha", desde.isoformat())
+        )
+        if promocion_id:
+            query = query.eq("promocion_id", promocion_id)
+        return query
+
+    for _ in range(3):
+        marca = _marca_analytics()
+        diarios = recorrer_keyset(
+            construir_query, [("fecha", False), ("promocion_id", False), ("tipo_evento", False)], tamano_pagina=1000
+        )
+        marca_ts = parse_marca(marca)
+        desde_crudos = max(inicio_utc, marca_ts) if marca_ts is not None else inicio_utc
+        conteos = [diarios_a_conteos(diarios), contar_eventos(_eventos_crudos(comercio_id, promocion_id, desde_crudos), "dia")]
+        if _marca_analytics() == marca:
+            break
+    return conteos
+
+
+@app.get("/api/ofertas/analytics/serie")
+def serie_metricas_comercio(
+    request: Request,
+    dias: int = Query(default=30, ge=1, le=SERIE_MAX_DIAS),
+    granularidad: str = Query(default="dia", description="dia | hora"),
+    promocion_id: Optional[str] = None,
+):
+    """
+    Serie temporal (por día o por hora) de vistas, clicks, shares y favoritos
+    del comercio autenticado, opcionalmente de una sola promoción.
+    Por día: agregados diarios + eventos aún no acumulados. Por hora (hasta 7
+    días): eventos crudos. Cacheado por (comercio, rango, granularidad, promoción).
+    """
+    user_id = _get_user_from_bearer(request.headers.get("Authorization"))
+    if not user_id:
+        raise HTTPException(status_code=401, detail="No autorizado")
+    if granularidad not in ("dia", "hora"):
+        raise HTTPException(status_code=400, detail="Granularidad inválida. Valores permitidos: dia, hora")
+    if granularidad == "hora" and dias > SERIE_HORARIA_MAX_DIAS:
+        raise HTTPException(status_code=400, detail=f"La serie por hora admite hasta {SERIE_HORARIA_MAX_DIAS} días.")
+
+    try:
+        comercio_id = _comercio_id_de_usuario(user_id)
+        if not comercio_id:
+            raise HTTPException(status_code=404, detail="Comercio no encontrado.")
+
+        def cargar():
+            ahora = datetime.now(TZ_ARGENTINA).replace(tzinfo=None)
+            if granularidad == "dia":
+                desde = ahora.date() - timedelta(days=dias - 1)
+                conteos = _conteos_diarios(comercio_id, promocion_id, desde)
+                serie = armar_serie(conteos, desde, ahora.date(), "dia")
+            else:
+                inicio = pd.Timestamp(ahora).floor("h") - pd.Timedelta(hours=dias * 24 - 1)
+                inicio_utc = inicio.tz_localize(ZONA_ARGENTINA).tz_convert("UTC") - pd.Timedelta(microseconds=1)
+                eventos = _eventos_crudos(comercio_id, promocion_id, inicio_utc)
+                serie = armar_serie([contar_eventos(eventos, "hora")], inicio, ahora, "hora")
+            return {"dias": dias, "promocion_id": promocion_id, **serie}
+
+        clave = f"{comercio_id}:{granularidad}:{dias}:{promocion_id or '*'}"
+        return _respuesta_cacheada(series_cache.get_or_load(clave, cargar), request, privado=True)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[ANALYTICS] Error armando serie: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener la serie de métricas.")
+
+
+# ── Favoritos ─────────────────────────────────────────────────────────────────
+from services.favoritos_cache import FavoritosCache
+from services.response_cache import calcular_etag
+
+favoritos_cache = FavoritosCache(
+    max_usuarios=int(os.getenv("FAVORITOS_CACHE_MAX_USUARIOS", "5000")),
+    ttl_seconds=float(os.getenv("FAVORITOS_CACHE_TTL", "600")),
+)
+
+
+def _favoritos_de(user_id: str) -> List[str]:
+    """Ids de promociones favoritas del usuario (más reciente primero), desde caché."""
+    ids = favoritos_cache.get(user_id)
+    if ids is None:
+        filas = recorrer_keyset(
+            lambda: supabase.table("favoritos")
+            .select("id, promocion_id, created_at")
+            .eq("usuario_id", user_id),
+            [("created_at", True), ("id", True)],
+        )
+        ids = [f["promocion_id"] for f in filas]
+        favoritos_cache.cargar(user_id, ids)
+    return ids
+
+
 @app.post("/api/ofertas/{oferta_id}/favoritos")
 def toggle_favorito(oferta_id: str, request: Request):
     user_id = _get_user_from_bearer(request.headers.get("Authorization"))
     if not user_id:
         raise HTTPException(status_code=401, detail="Debes iniciar sesión para agregar a favoritos.")
     try:
-        check = supabase.table("favoritos").select("id").eq("usuario_id", user_id).eq("promocion_id", oferta_id).execute()
-        if check.data:
-            supabase.table("favoritos").delete().eq("id", check.data[0]["id"]).execute()
-            return {"es_favorito": False}
+        # Una sola llamada atómica (DELETE o INSERT ON CONFLICT en la base)
+        res = supabase.rpc("toggle_favorito", {"p_usuario_id": user_id, "p_promocion_id": oferta_id}).execute()
+        es_favorito = bool(res.data)
+        if es_favorito:
+            favoritos_cache.agregar(user_id, oferta_id)
         else:
-            supabase.table("favoritos").insert({"usuario_id": user_id, "promocion_id": oferta_id}).execute()
-            return {"es_favorito": True}
+            favoritos_cache.quitar(user_id, oferta_id)
+        return {"es_favorito": es_favorito}
     except Exception as e:
+        favoritos_cache.invalidar(user_id)
         logger.error(f"[FAVORITOS] Error: {e}")
         raise HTTPException(status_code=500, detail="Error al gestionar favorito")
 
+
+@app.get("/api/ofertas/favoritos")
+def mis_favoritos_hidratados(request: Request):
+    """
+    Tarjetas de las promociones favoritas del usuario (activas, más reciente
+    primero) en un solo request, armadas desde los cachés de favoritos y de
+    ofertas. Responde 304 si el ETag del cliente coincide.
+    """
+    user_id = _get_user_from_bearer(request.headers.get("Authorization"))
+    if not user_id:
+        raise HTTPException(status_code=401, detail="No autorizado")
+    try:
+        tarjetas = _tarjetas_ofertas(_favoritos_de(user_id))
+        # Las tarjetas ya están serializadas: se concatenan sin volver a codificar
+        body = b'{"favoritos":[' + b",".join(tarjetas) + b"]}"
+        etag = calcular_etag(body)
+        headers = {"ETag": etag, "Cache-Control": "private, max-age=0, must-revalidate"}
+        if etag_coincide(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except Exception as e:
+        logger.error(f"[FAVORITOS] Error hidratando favoritos: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener favoritos")
+
+
 @app.get("/api/ofertas/favoritos/lista")
 def mis_favoritos(request: Request):
     user_id = _get_user_from_bearer(request.headers.get("Authorization"))
     if not user_id:
         raise HTTPException(status_code=401, detail="No autorizado")
     try:
-        res = supabase.table("favoritos").select("promocion_id").eq("usuario_id", user_id).execute()
-        return {"favoritos": [f["promocion_id"] for f in res.data or []]}
+        return {"favoritos": _favoritos_de(user_id)}
     except Exception:
         return {"favoritos": []}
 
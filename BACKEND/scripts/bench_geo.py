@@ -0,0 +1,81 @@
+"""
+Benchmark del índice espacial (GridIndex) contra un recorrido lineal.
+
+Genera N puntos al azar en una zona de ~200 x 200 km alrededor de Corrientes y
+mide el tiempo promedio de "los K más cercanos dentro de R km". Con la grilla
+el costo depende de los puntos en las celdas visitadas, no del total; el
+recorrido lineal crece con N.
+
+Uso:
+    python scripts/bench_geo.py [--k 20] [--radio 20] [--consultas 200]
+"""
+
+import os
+import sys
+import time
+import heapq
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.geo_index import GridIndex, haversine_km
+
+CENTRO = (-27.47, -58.83)
+EXTENSION_GRADOS = 1.8
+
+
+def punto_al_azar(rnd: random.Random):
+    return (
+        CENTRO[0] + rnd.uniform(-EXTENSION_GRADOS / 2, EXTENSION_GRADOS / 2),
+        CENTRO[1] + rnd.uniform(-EXTENSION_GRADOS / 2, EXTENSION_GRADOS / 2),
+    )
+
+
+def lineal(puntos, lat, lon, radio, k):
+    candidatos = ((haversine_km(lat, lon, plat, plon), key) for key, plat, plon in puntos)
+    return heapq.nsmallest(k, (c for c in candidatos if c[0] <= radio))
+
+
+def medir(n: int, k: int, radio: float, consultas: int):
+    rnd = random.Random(n)
+    puntos = [(f"o{i}", *punto_al_azar(rnd)) for i in range(n)]
+    indice = GridIndex()
+    indice.reemplazar([(key, lat, lon, {}) for key, lat, lon in puntos])
+    queries = [punto_al_azar(rnd) for _ in range(consultas)]
+
+    inicio = time.perf_counter()
+    for lat, lon in queries:
+        indice.cercanos(lat, lon, radio, limit=k)
+    t_grilla = (time.perf_counter() - inicio) / consultas * 1000
+
+    inicio = time.perf_counter()
+    for lat, lon in queries[: max(1, consultas // 10)]:
+        lineal(puntos, lat, lon, radio, k)
+    t_lineal = (time.perf_counter() - inicio) / max(1, consultas // 10) * 1000
+
+    # Verificación: mismos resultados que el recorrido lineal
+    lat, lon = queries[0]
+    esperados = [key for _, key in lineal(puntos, lat, lon, radio, k)]
+    obtenidos = [r["id"] for r in indice.cercanos(lat, lon, radio, limit=k)]
+    assert esperados == obtenidos, "el índice no coincide con el recorrido lineal"
+
+    return t_grilla, t_lineal, indice.stats()["evaluados_promedio"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de GridIndex")
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--radio", type=float, default=20.0)
+    parser.add_argument("--consultas", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"K={args.k} radio={args.radio} km")
+    print(f"{'N':>8} {'grilla ms':>10} {'lineal ms':>10} {'evaluados':>10}")
+    for n in (1_000, 10_000, 100_000):
+        t_grilla, t_lineal, evaluados = medir(n, args.k, args.radio, args.consultas)
+        print(f"{n:>8} {t_grilla:>10.3f} {t_lineal:>10.3f} {evaluados:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark del reporte Excel de socios: pandas + ExcelWriter (implementación
+anterior) contra openpyxl write-only alimentado por un iterador.
+
+Cada caso corre en un proceso nuevo para que el pico de memoria (ru_maxrss)
+sea solo el del caso medido. Los perfiles se generan al vuelo; en la versión
+anterior se materializan en una lista, como hacía el `.execute()` sin paginar.
+
+Uso:
+    python scripts/bench_reportes_excel.py [--filas 10000 50000 200000]
+"""
+
+import os
+import io
+import sys
+import time
+import random
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.reportes import escribir_xlsx_socios
+
+MUNICIPIOS = ["Corrientes", "Ituzaingó", "Santo Tomé", "Saladas", "Empedrado", None]
+ESTADOS = ["APROBADO", "PENDIENTE", "RECHAZADO", "SUSPENDIDO"]
+
+
+def perfiles(n: int):
+    rnd = random.Random(n)
+    for i in range(n):
+        yield {
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "nombre_apellido": f"Socio {i} " + "x" * rnd.randint(5, 25),
+            "dni": str(20_000_000 + i),
+            "email": f"socio{i}@ejemplo.com",
+            "telefono": f"379{rnd.randint(4000000, 4999999)}",
+            "estado": rnd.choice(ESTADOS),
+            "municipio": rnd.choice(MUNICIPIOS),
+            "created_at": f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}T12:00:00+00:00",
+            "rol": "SOCIO",
+        }
+
+
+def anterior(n: int) -> int:
+    import pandas as pd
+
+    df = pd.DataFrame(list(perfiles(n)))
+    cols_map = {
+        "nombre_apellido": "Nombre y Apellido",
+        "dni": "DNI",
+        "email": "Email",
+        "telefono": "Teléfono",
+        "estado": "Estado",
+        "municipio": "Municipio",
+        "created_at": "Fecha de Alta",
+    }
+    df = df[list(cols_map.keys())].rename(columns=cols_map)
+    df["Fecha de Alta"] = pd.to_datetime(df["Fecha de Alta"]).dt.strftime("%d/%m/%Y")
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False, sheet_name="Socios")
+        worksheet = writer.sheets["Socios"]
+        for i, col in enumerate(df.columns):
+            column_len = max(df[col].astype(str).str.len().max(), len(col)) + 2
+            worksheet.column_dimensions[chr(65 + i)].width = min(column_len, 50)
+    return output.getbuffer().nbytes
+
+
+def streaming(n: int) -> int:
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as archivo:
+        escribir_xlsx_socios(perfiles(n), archivo)
+        return archivo.tell()
+
+
+def _caso(nombre: str, n: int, cola):
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    tamano = globals()[nombre](n)
+    segundos = time.perf_counter() - inicio
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB en Linux
+    cola.put((segundos, (pico - base) / 1024, pico / 1024, tamano))
+
+
+def medir(nombre: str, n: int):
+    ctx = multiprocessing.get_context("spawn")
+    cola = ctx.Queue()
+    proceso = ctx.Process(target=_caso, args=(nombre, n, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del reporte Excel de socios")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    args = parser.parse_args()
+
+    print(f"{'filas':>8} {'versión':>10} {'seg':>8} {'Δ MB':>8} {'pico MB':>8} {'xlsx KB':>9}")
+    for n in args.filas:
+        for nombre in ("anterior", "streaming"):
+            segundos, delta, pico, tamano = medir(nombre, n)
+            print(f"{n:>8} {nombre:>10} {segundos:>8.2f} {delta:>8.1f} {pico:>8.1f} {tamano / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Servidor LLM falso para probar el limitador de concurrencia de SapucAI.
+
+Implementa POST /v1/chat/completions con el formato de OpenAI (con y sin
+stream) y simula:
+  - Latencia con distribución log-normal (mediana y dispersión configurables).
+  - Capacidad máxima de requests simultáneos: por encima responde 429.
+  - Una probabilidad adicional de 429 aleatorio.
+
+Uso:
+    # Solo el servidor
+    python scripts/fake_llm_server.py --puerto 8765 --capacidad 6
+
+    # Servidor + carga concurrente a través de ChatService (usa el limitador real)
+    python scripts/fake_llm_server.py --capacidad 6 --carga 60 --usuarios 10
+
+Para apuntar el backend al servidor falso:
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8765/v1 uvicorn main:app
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SimuladorLLM:
+    def __init__(self, capacidad: int, latencia_mediana: float, sigma: float, prob_429: float):
+        self.capacidad = capacidad
+        self.latencia_mediana = latencia_mediana
+        self.sigma = sigma
+        self.prob_429 = prob_429
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+        self.total = 0
+        self.rechazados = 0
+        self._lock = threading.Lock()
+
+    def entrar(self) -> bool:
+        with self._lock:
+            self.total += 1
+            if self.en_vuelo >= self.capacidad or random.random() < self.prob_429:
+                self.rechazados += 1
+                return False
+            self.en_vuelo += 1
+            self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+            return True
+
+    def salir(self):
+        with self._lock:
+            self.en_vuelo -= 1
+
+    def latencia(self) -> float:
+        return random.lognormvariate(0, self.sigma) * self.latencia_mediana
+
+
+def crear_handler(sim: SimuladorLLM):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                return self._json(404, {"error": {"message": "not found"}})
+            largo = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(largo) or b"{}")
+
+            if not sim.entrar():
+                return self._json(429, {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error"}})
+            try:
+                texto = "Respuesta simulada de SapucAI para pruebas de carga."
+                base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": req.get("model", "fake")}
+                if req.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    palabras = texto.split(" ")
+                    pausa = sim.latencia() / len(palabras)
+                    for i, palabra in enumerate(palabras):
+                        time.sleep(pausa)
+                        chunk = dict(base, object="chat.completion.chunk", choices=[{
+                            "index": 0,
+                            "delta": {"content": palabra + (" " if i < len(palabras) - 1 else "")},
+                            "finish_reason": None,
+                        }])
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                else:
+                    time.sleep(sim.latencia())
+                    self._json(200, dict(base, object="chat.completion", choices=[{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": texto},
+                        "finish_reason": "stop",
+                    }], usage={"prompt_tokens": 100, "completion_tokens": 12, "total_tokens": 112}))
+            finally:
+                sim.salir()
+
+    return Handler
+
+
+async def correr_carga(cantidad: int, usuarios: int):
+    from chat_service import chat_service
+
+    latencias, errores = [], 0
+
+    async def una_consulta(i: int):
+        nonlocal errores
+        inicio = time.monotonic()
+        try:
+            await chat_service.get_response(
+                history=[], user_message=f"consulta de carga {i} {random.random()}", user_id=f"u{i % usuarios}"
+            )
+            latencias.append(time.monotonic() - inicio)
+        except RuntimeError:
+            errores += 1
+
+    await asyncio.gather(*(una_consulta(i) for i in range(cantidad)))
+    await chat_service.aclose()
+    return latencias, errores, chat_service.limiter.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor LLM falso con rate limits")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--capacidad", type=int, default=6, help="Requests simultáneos antes de responder 429")
+    parser.add_argument("--latencia", type=float, default=1.0, help="Latencia mediana en segundos")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Dispersión de la log-normal")
+    parser.add_argument("--prob-429", type=float, default=0.0)
+    parser.add_argument("--carga", type=int, default=0, help="Consultas concurrentes a lanzar vía ChatService")
+    parser.add_argument("--usuarios", type=int, default=10)
+    args = parser.parse_args()
+
+    sim = SimuladorLLM(args.capacidad, args.latencia, args.sigma, args.prob_429)
+    server = ThreadingHTTPServer(("127.0.0.1", args.puerto), crear_handler(sim))
+    print(f"Servidor LLM falso en http://127.0.0.1:{args.puerto}/v1 (capacidad={args.capacidad})")
+
+    if not args.carga:
+        server.serve_forever()
+        return
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.puerto}/v1"
+    latencias, errores, stats = asyncio.run(correr_carga(args.carga, args.usuarios))
+    server.shutdown()
+
+    print(f"Consultas OK: {len(latencias)}  errores: {errores}")
+    if latencias:
+        ordenadas = sorted(latencias)
+        print(f"Latencia p50={statistics.median(ordenadas):.2f}s p95={ordenadas[int(0.95 * (len(ordenadas) - 1))]:.2f}s")
+    print(f"Servidor: total={sim.total} 429={sim.rechazados} max_simultaneos={sim.max_en_vuelo}")
+    print(f"Limitador: {json.dumps(stats, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
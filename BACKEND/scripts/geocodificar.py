@@ -0,0 +1,92 @@
+"""
+Backfill de coordenadas (latitud/longitud) para promociones y comercios.
+
+Geocodificación offline con services.geo_index.geocodificar: coordenadas
+escritas en `ubicacion`/`direccion` o, si no hay, el centroide del municipio.
+Solo completa filas sin coordenadas; no llama a servicios externos.
+
+Uso:
+    python scripts/geocodificar.py [--dry-run]
+"""
+
+import os
+import sys
+import logging
+import argparse
+
+# Configurar path para importar módulos de la app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+from supabase import create_client, Client
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+from services.geo_index import geocodificar
+from services.paginacion import recorrer_keyset
+from services.reference_data import normalizar_nombre
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def cargar_centroides():
+    res = supabase.table("municipios").select("nombre, latitud, longitud").execute()
+    centroides = {
+        normalizar_nombre(m["nombre"]): (float(m["latitud"]), float(m["longitud"]))
+        for m in (res.data or [])
+        if m.get("latitud") is not None and m.get("longitud") is not None
+    }
+    return lambda nombre: centroides.get(normalizar_nombre(nombre)) if nombre else None
+
+
+def backfill_promociones(centroide, dry_run: bool):
+    actualizadas = sin_datos = 0
+    for o in recorrer_keyset(
+        lambda: supabase.table("promociones")
+        .select("id, ubicacion, direccion, localidad, comercio:comercios(perfil:profiles(municipio))")
+        .is_("latitud", "null"),
+        [("id", False)],
+    ):
+        perfil = ((o.pop("comercio", None) or {}).get("perfil")) or {}
+        o["municipio"] = perfil.get("municipio") if isinstance(perfil, dict) else None
+        coords = geocodificar(o, centroide)
+        if not coords:
+            sin_datos += 1
+            continue
+        if not dry_run:
+            supabase.table("promociones").update({"latitud": coords[0], "longitud": coords[1]}).eq("id", o["id"]).execute()
+        actualizadas += 1
+    logger.info(f"promociones: {actualizadas} geocodificadas ({'dry-run' if dry_run else 'guardadas'}), {sin_datos} sin datos de ubicación")
+
+
+def backfill_comercios(centroide, dry_run: bool):
+    actualizados = sin_datos = 0
+    for c in recorrer_keyset(
+        lambda: supabase.table("comercios")
+        .select("id, direccion, perfil:profiles(municipio)")
+        .is_("latitud", "null"),
+        [("id", False)],
+    ):
+        perfil = c.pop("perfil", None) or {}
+        c["municipio"] = perfil.get("municipio") if isinstance(perfil, dict) else None
+        coords = geocodificar(c, centroide)
+        if not coords:
+            sin_datos += 1
+            continue
+        if not dry_run:
+            supabase.table("comercios").update({"latitud": coords[0], "longitud": coords[1]}).eq("id", c["id"]).execute()
+        actualizados += 1
+    logger.info(f"comercios: {actualizados} geocodificados ({'dry-run' if dry_run else 'guardados'}), {sin_datos} sin datos de ubicación")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Completa latitud/longitud de promociones y comercios")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    centroide = cargar_centroides()
+    backfill_promociones(centroide, args.dry_run)
+    backfill_comercios(centroide, args.dry_run)
@@ -0,0 +1,129 @@
+"""
+Almacén de Archivos de Reportes
+-------------------------------
+Dónde quedan los reportes generados (trabajos asincrónicos y el PDF de socios
+cacheado por contenido) y cómo se descargan.
+
+- `AlmacenSupabase`: bucket privado de Supabase Storage; la descarga es una
+  URL firmada de vida corta. La existencia del bucket se verifica una sola vez.
+- `AlmacenLocal`: carpeta local para desarrollo o despliegues sin Storage; la
+  URL apunta a un endpoint del backend y lleva vencimiento y firma HMAC.
+- `crear_almacen()` elige según REPORTES_ALMACEN (supabase | local).
+
+Interfaz común: guardar(path, archivo, content_type), leer(path) → bytes|None,
+url_descarga(path, segundos) → str.
+"""
+
+import os
+import hmac
+import time
+import shutil
+import hashlib
+import logging
+import secrets
+import tempfile
+from typing import IO, Optional
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+
+class AlmacenSupabase:
+    backend = "supabase"
+
+    def __init__(self, cliente, bucket: str):
+        self.cliente = cliente
+        self.bucket = bucket
+        self._bucket_listo = False
+
+    def _storage(self):
+        if not self._bucket_listo:
+            try:
+                self.cliente.storage.get_bucket(self.bucket)
+            except Exception:
+                try:
+                    self.cliente.storage.create_bucket(self.bucket, options={"public": False})
+                except Exception:
+                    pass  # Si otro proceso lo creó en el medio, ignoramos.
+            self._bucket_listo = True
+        return self.cliente.storage.from_(self.bucket)
+
+    def guardar(self, path: str, archivo: IO[bytes], content_type: str):
+        archivo.seek(0)
+        self._storage().upload(
+            path=path,
+            file=archivo.read(),
+            file_options={"content-type": content_type, "upsert": "true"},
+        )
+
+    def leer(self, path: str) -> Optional[bytes]:
+        try:
+            return self._storage().download(path)
+        except Exception:
+            return None
+
+    def url_descarga(self, path: str, segundos: int) -> str:
+        res = self._storage().create_signed_url(path, segundos)
+        return res.get("signedURL") or res.get("signedUrl")
+
+
+class AlmacenLocal:
+    """Stand-in de Storage sobre el sistema de archivos."""
+    backend = "local"
+
+    def __init__(self, directorio: str, url_base: str, secreto: Optional[str] = None):
+        self.directorio = os.path.abspath(directorio)
+        self.url_base = url_base.rstrip("/")
+        self.secreto = (secreto or secrets.token_hex(32)).encode("utf-8")
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, path: str) -> str:
+        ruta = os.path.abspath(os.path.join(self.directorio, path))
+        if os.path.commonpath([ruta, self.directorio]) != self.directorio:
+            raise ValueError("Ruta fuera del almacén")
+        return ruta
+
+    def guardar(self, path: str, archivo: IO[bytes], content_type: str):
+        ruta = self._ruta(path)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        archivo.seek(0)
+        parcial = f"{ruta}.{secrets.token_hex(4)}.tmp"
+        with open(parcial, "wb") as f:
+            shutil.copyfileobj(archivo, f)
+        os.replace(parcial, ruta)
+
+    def leer(self, path: str) -> Optional[bytes]:
+        try:
+            with open(self._ruta(path), "rb") as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def _firma(self, path: str, expira: int) -> str:
+        return hmac.new(self.secreto, f"{path}|{expira}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def url_descarga(self, path: str, segundos: int) -> str:
+        expira = int(time.time()) + segundos
+        return f"{self.url_base}/{quote(path)}?expira={expira}&firma={self._firma(path, expira)}"
+
+    def verificar(self, path: str, expira: int, firma: str) -> Optional[str]:
+        """Ruta local del archivo si la firma es válida y no venció; None si no."""
+        if expira < time.time() or not hmac.compare_digest(firma, self._firma(path, expira)):
+            return None
+        try:
+            ruta = self._ruta(path)
+        except ValueError:
+            return None
+        return ruta if os.path.isfile(ruta) else None
+
+
+def crear_almacen(cliente, bucket: str):
+    """Construye el almacén según REPORTES_ALMACEN (por defecto, Supabase Storage)."""
+    backend = os.getenv("REPORTES_ALMACEN", "supabase").lower()
+    if backend == "local":
+        directorio = os.getenv("REPORTES_DIR_LOCAL") or os.path.join(tempfile.gettempdir(), "reportes")
+        secreto = os.getenv("REPORTES_URL_SECRETO")
+        if not secreto:
+            logger.warning("[REPORTES] REPORTES_URL_SECRETO no configurado: las URLs de descarga valen solo en este proceso.")
+        return AlmacenLocal(directorio, "/api/admin/reports/archivos", secreto)
+    return AlmacenSupabase(cliente, bucket)
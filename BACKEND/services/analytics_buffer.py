@@ -0,0 +1,201 @@
+"""
+Buffer de Escritura por Lotes
+-----------------------------
+Acumula eventos (p.ej. vistas y clicks de promociones_analytics) en una cola
+en memoria y los escribe como INSERT masivos desde un hilo de fondo, en lugar
+de un INSERT sincrónico por request.
+
+- Se escribe cuando la cola junta `tam_lote` eventos o cada `intervalo_ms`,
+  lo que ocurra primero.
+- Contrapresión: la cola tiene tope; si se llena se descarta el evento más
+  viejo y se cuenta en `descartados_cola`. El request nunca espera a la base.
+- Si un lote falla por un error de datos (p.ej. una FK inválida en un solo
+  evento) se parte a la mitad hasta aislar las filas culpables, que se
+  descartan. Si falla por otra causa (base caída, timeout) el lote vuelve al
+  frente de la cola y se reintenta en el próximo ciclo.
+  `es_error_sqlstate_de_datos` hace esa distinción para errores de Postgres.
+- `cerrar()` detiene el hilo y escribe lo pendiente (apagado ordenado).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Clases SQLSTATE atribuibles a las filas: 22 (dato inválido) y 23 (restricción
+# de integridad: FK, NOT NULL, CHECK, UNIQUE). Timeouts (57014), conexión,
+# permisos o JWT vencido no se arreglan partiendo el lote.
+CLASES_SQLSTATE_DE_DATOS = ("22", "23")
+
+
+def es_error_sqlstate_de_datos(e: Exception) -> bool:
+    """True si el código SQLSTATE de `e` (atributo `code`) es de una clase de datos."""
+    return str(getattr(e, "code", "") or "")[:2] in CLASES_SQLSTATE_DE_DATOS
+
+
+class _LoteNoEscrito(Exception):
+    """Falla no atribuible a los datos; `pendientes` son las filas aún sin escribir."""
+
+    def __init__(self, pendientes: List[Dict[str, Any]], causa: Exception):
+        super().__init__(str(causa))
+        self.pendientes = pendientes
+
+
+class BufferedBatchWriter:
+
+    def __init__(
+        self,
+        escribir: Callable[[List[Dict[str, Any]]], Any],
+        tam_lote: int = 500,
+        intervalo_ms: int = 1000,
+        max_cola: int = 20_000,
+        es_error_de_datos: Optional[Callable[[Exception], bool]] = None,
+        nombre: str = "buffer",
+    ):
+        self.escribir = escribir
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo_ms / 1000
+        self.max_cola = max_cola
+        self.es_error_de_datos = es_error_de_datos or (lambda e: False)
+        self.nombre = nombre
+        self._cola: Deque[Dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+        self._escritura = threading.Lock()  # un solo flush a la vez
+        self._hilo: Optional[threading.Thread] = None
+        self._cerrando = False
+        self.recibidos = 0
+        self.escritos = 0
+        self.lotes = 0
+        self.descartados_cola = 0
+        self.descartados_error = 0
+        self.reintentos = 0
+        self.ultimo_flush_ms = 0.0
+
+    # ── productor ────────────────────────────────────────────────────────────
+    def agregar(self, evento: Dict[str, Any]):
+        """Encola un evento. O(1); nunca bloquea por la base."""
+        with self._cond:
+            if len(self._cola) >= self.max_cola:
+                self._cola.popleft()
+                self.descartados_cola += 1
+            self._cola.append(evento)
+            self.recibidos += 1
+            if len(self._cola) >= self.tam_lote:
+                self._cond.notify()
+
+    def __len__(self):
+        return len(self._cola)
+
+    # ── consumidor ───────────────────────────────────────────────────────────
+    def iniciar(self):
+        with self._cond:
+            if self._hilo is not None:
+                return
+            self._cerrando = False
+            self._hilo = threading.Thread(target=self._bucle, name=f"{self.nombre}-writer", daemon=True)
+            self._hilo.start()
+
+    def cerrar(self, timeout: float = 10.0):
+        """Detiene el hilo y escribe lo que quede en la cola."""
+        with self._cond:
+            self._cerrando = True
+            self._cond.notify()
+            hilo, self._hilo = self._hilo, None
+        if hilo is not None:
+            hilo.join(timeout)
+        self.flush()
+        if self._cola:
+            logger.warning(f"[{self.nombre.upper()}] {len(self._cola)} eventos sin escribir al cerrar")
+
+    def flush(self) -> int:
+        """Escribe la cola en lotes de `tam_lote`. Retorna la cantidad escrita."""
+        escritos = 0
+        with self._escritura:
+            inicio = time.monotonic()
+            while True:
+                with self._cond:
+                    if not self._cola:
+                        break
+                    n = min(self.tam_lote, len(self._cola))
+                    lote = [self._cola.popleft() for _ in range(n)]
+                try:
+                    escritos += self._escribir_lote(lote)
+                except _LoteNoEscrito as falla:
+                    logger.warning(
+                        f"[{self.nombre.upper()}] Error escribiendo lote, "
+                        f"{len(falla.pendientes)} eventos vuelven a la cola: {falla}"
+                    )
+                    self._devolver(falla.pendientes)
+                    break
+            if escritos:
+                self.ultimo_flush_ms = round((time.monotonic() - inicio) * 1000, 2)
+        return escritos
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "en_cola": len(self._cola),
+                "max_cola": self.max_cola,
+                "tam_lote": self.tam_lote,
+                "intervalo_ms": int(self.intervalo * 1000),
+                "recibidos": self.recibidos,
+                "escritos": self.escritos,
+                "lotes": self.lotes,
+                "descartados_cola": self.descartados_cola,
+                "descartados_error": self.descartados_error,
+                "reintentos": self.reintentos,
+                "ultimo_flush_ms": self.ultimo_flush_ms,
+            }
+
+    # ── internos ─────────────────────────────────────────────────────────────
+    def _bucle(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._cerrando or len(self._cola) >= self.tam_lote,
+                    timeout=self.intervalo,
+                )
+                if self._cerrando:
+                    return
+            reintentos = self.reintentos
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[{self.nombre.upper()}] Error inesperado en flush: {e}")
+            if self.reintentos != reintentos:
+                # La base falló: esperar un intervalo completo aunque la cola esté llena
+                with self._cond:
+                    self._cond.wait_for(lambda: self._cerrando, timeout=self.intervalo)
+
+    def _escribir_lote(self, lote: List[Dict[str, Any]]) -> int:
+        try:
+            self.escribir(lote)
+        except Exception as e:
+            if not self.es_error_de_datos(e):
+                raise _LoteNoEscrito(lote, e)
+            if len(lote) == 1:
+                self.descartados_error += 1
+                logger.warning(f"[{self.nombre.upper()}] Evento descartado por error de datos: {e}")
+                return 0
+            mitad = len(lote) // 2
+            try:
+                escritos = self._escribir_lote(lote[:mitad])
+            except _LoteNoEscrito as falla:
+                falla.pendientes = falla.pendientes + lote[mitad:]
+                raise
+            return escritos + self._escribir_lote(lote[mitad:])
+        self.lotes += 1
+        self.escritos += len(lote)
+        return len(lote)
+
+    def _devolver(self, lote: List[Dict[str, Any]]):
+        with self._cond:
+            self.reintentos += 1
+            self._cola.extendleft(reversed(lote))
+            # Mantener el tope: lo que sobra es lo más viejo
+            while len(self._cola) > self.max_cola:
+                self._cola.popleft()
+                self.descartados_cola += 1
@@ -0,0 +1,189 @@
+"""
+Deduplicación de Eventos de Analytics
+-------------------------------------
+Evita contar dos veces la misma vista o click (mismo IP, misma oferta, mismo
+tipo de evento) dentro de un período de enfriamiento: 300 s para vistas y
+30 s para clicks y shares.
+
+- InMemoryDedupStore: por cada duración de enfriamiento mantiene un anillo de
+  conjuntos, uno por tramo de tiempo (ventana / n_tramos). Insertar y
+  consultar es O(1) (se miran a lo sumo n_tramos + 1 conjuntos) y la
+  expiración descarta un tramo entero, sin recorrer claves. Se conserva un
+  tramo extra, así el enfriamiento efectivo nunca es menor al configurado
+  (queda entre la ventana y la ventana + un tramo).
+  Tope duro de claves: al superarlo se descartan los tramos más viejos.
+- RedisDedupStore: `SET clave 1 NX EX ventana`, atómico y compartido entre
+  workers; la expiración la hace Redis.
+
+Se elige con ANALYTICS_DEDUP_BACKEND ("memory" | "redis"). Ante una falla de
+Redis el evento se permite: es preferible contar de más que perder datos.
+"""
+
+import os
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+COOLDOWNS_POR_EVENTO = {"view": 300}
+COOLDOWN_DEFECTO = 30
+
+
+class _Anillo:
+    """Tramos consecutivos de `ancho` segundos; cada uno es un set de hashes."""
+
+    def __init__(self, ventana: float, n_tramos: int):
+        self.ancho = ventana / n_tramos
+        self.retenidos = n_tramos + 1
+        self.tramos: Deque[Tuple[int, Set[int]]] = deque()
+
+    def avanzar(self, ahora: float) -> int:
+        """Descarta los tramos vencidos; retorna cuántas claves se liberaron."""
+        actual = int(ahora // self.ancho)
+        liberadas = 0
+        while self.tramos and self.tramos[0][0] <= actual - self.retenidos:
+            liberadas += len(self.tramos.popleft()[1])
+        if not self.tramos or self.tramos[-1][0] != actual:
+            self.tramos.append((actual, set()))
+        return liberadas
+
+    def contiene(self, h: int) -> bool:
+        return any(h in claves for _, claves in self.tramos)
+
+    def fin_del_mas_viejo(self) -> float:
+        return (self.tramos[0][0] + 1) * self.ancho if self.tramos else float("inf")
+
+
+class InMemoryDedupStore:
+
+    def __init__(
+        self,
+        cooldowns: Optional[Dict[str, int]] = None,
+        cooldown_defecto: int = COOLDOWN_DEFECTO,
+        n_tramos: int = 10,
+        max_claves: int = 200_000,
+        reloj: Callable[[], float] = time.monotonic,
+    ):
+        self.cooldowns = dict(COOLDOWNS_POR_EVENTO if cooldowns is None else cooldowns)
+        self.cooldown_defecto = cooldown_defecto
+        self.n_tramos = n_tramos
+        self.max_claves = max_claves
+        self._reloj = reloj
+        self._anillos: Dict[int, _Anillo] = {}
+        self._claves = 0
+        self._lock = threading.Lock()
+        self.hits = 0      # eventos duplicados (descartados)
+        self.misses = 0    # eventos nuevos (permitidos)
+        self.evictions = 0
+
+    def permitir(self, clave: str, tipo_evento: str) -> bool:
+        """True si `clave` no se vio dentro del enfriamiento de `tipo_evento`
+        (y la registra); False si es un duplicado."""
+        ventana = self.cooldowns.get(tipo_evento, self.cooldown_defecto)
+        h = hash(clave)
+        with self._lock:
+            anillo = self._anillos.get(ventana)
+            if anillo is None:
+                anillo = self._anillos[ventana] = _Anillo(ventana, self.n_tramos)
+            self._claves -= anillo.avanzar(self._reloj())
+            if anillo.contiene(h):
+                self.hits += 1
+                return False
+            anillo.tramos[-1][1].add(h)
+            self._claves += 1
+            self.misses += 1
+            if self._claves > self.max_claves:
+                self._aplicar_tope()
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "claves": self._claves,
+                "max_claves": self.max_claves,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _aplicar_tope(self):
+        # Descarta el tramo que vence primero entre todos los anillos (incluido
+        # el actual como último recurso) hasta volver bajo el tope.
+        while self._claves > self.max_claves:
+            anillo = min(self._anillos.values(), key=_Anillo.fin_del_mas_viejo)
+            if not anillo.tramos:
+                break
+            _, claves = anillo.tramos.popleft()
+            self._claves -= len(claves)
+            self.evictions += len(claves)
+
+
+class RedisDedupStore:
+    """Misma interfaz que InMemoryDedupStore, compartida entre workers.
+    El tope de memoria lo aplica Redis (maxmemory + volatile-ttl)."""
+
+    def __init__(
+        self,
+        redis_client,
+        cooldowns: Optional[Dict[str, int]] = None,
+        cooldown_defecto: int = COOLDOWN_DEFECTO,
+        prefijo: str = "analytics:dedup:",
+    ):
+        self.redis = redis_client
+        self.cooldowns = dict(COOLDOWNS_POR_EVENTO if cooldowns is None else cooldowns)
+        self.cooldown_defecto = cooldown_defecto
+        self.prefijo = prefijo
+        self.hits = 0
+        self.misses = 0
+        self.errores = 0
+
+    def permitir(self, clave: str, tipo_evento: str) -> bool:
+        ventana = self.cooldowns.get(tipo_evento, self.cooldown_defecto)
+        try:
+            nuevo = self.redis.set(f"{self.prefijo}{clave}", 1, nx=True, ex=ventana)
+        except Exception as e:
+            logger.warning(f"[ANALYTICS DEDUP] Redis no disponible: {e}")
+            self.errores += 1
+            return True
+        if nuevo:
+            self.misses += 1
+            return True
+        self.hits += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "errores": self.errores,
+        }
+
+
+def crear_dedup_store():
+    """Construye el store según ANALYTICS_DEDUP_BACKEND / REDIS_URL.
+    Si Redis no está configurado o no responde, cae al backend en memoria."""
+    backend = os.getenv("ANALYTICS_DEDUP_BACKEND", "memory").lower()
+    if backend == "redis":
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            try:
+                import redis
+                client = redis.Redis.from_url(redis_url, socket_timeout=0.2)
+                client.ping()
+                logger.info("[ANALYTICS DEDUP] Usando backend Redis.")
+                return RedisDedupStore(client)
+            except Exception as e:
+                logger.warning(f"[ANALYTICS DEDUP] No se pudo conectar a Redis ({e}). Usando memoria.")
+        else:
+            logger.warning("[ANALYTICS DEDUP] ANALYTICS_DEDUP_BACKEND=redis sin REDIS_URL. Usando memoria.")
+
+    return InMemoryDedupStore(max_claves=int(os.getenv("ANALYTICS_DEDUP_MAX_CLAVES", "200000")))
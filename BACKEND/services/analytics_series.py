@@ -0,0 +1,106 @@
+"""
+Series Temporales de Analytics
+------------------------------
+Arma series por día o por hora de vistas, clicks, shares y favoritos para el
+panel del comercio, con operaciones vectorizadas de pandas (sin bucles por
+evento en Python).
+
+- `contar_eventos`: eventos crudos (created_at, tipo_evento) → conteos por
+  período en hora argentina.
+- `armar_serie`: conteos por (período, tipo_evento) → series alineadas a un
+  rango completo (los períodos sin eventos quedan en 0), en formato columnar:
+  {"periodos": [...], "series": {"vistas": [...], ...}, "totales": {...}}.
+
+Los rangos largos se arman desde los agregados diarios y solo la cola todavía
+no acumulada viene de eventos crudos; los rangos cortos por hora salen
+directamente de los eventos crudos.
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+import pandas as pd
+
+ZONA_ARGENTINA = "America/Argentina/Buenos_Aires"
+
+METRICA_POR_EVENTO = {
+    "view": "vistas",
+    "whatsapp_click": "clicks",
+    "instagram_click": "clicks",
+    "maps_click": "clicks",
+    "share": "shares",
+    "share_whatsapp": "shares",
+    "share_facebook": "shares",
+    "favorito": "favoritos",
+}
+METRICAS = ("vistas", "clicks", "shares", "favoritos")
+
+# granularidad → (frecuencia de pandas, formato de la etiqueta del período)
+GRANULARIDADES = {
+    "dia": ("D", "%Y-%m-%d"),
+    "hora": ("h", "%Y-%m-%dT%H:00"),
+}
+
+_COLUMNAS = ["periodo", "tipo_evento", "cantidad"]
+
+
+def contar_eventos(eventos: Iterable[Dict[str, Any]], granularidad: str, zona: str = ZONA_ARGENTINA) -> pd.DataFrame:
+    """Eventos crudos [{created_at, tipo_evento}] → DataFrame (periodo, tipo_evento, cantidad)."""
+    df = pd.DataFrame(list(eventos), columns=["created_at", "tipo_evento"])
+    if df.empty:
+        return pd.DataFrame(columns=_COLUMNAS)
+    frecuencia = GRANULARIDADES[granularidad][0]
+    df["periodo"] = (
+        pd.to_datetime(df["created_at"], utc=True, format="ISO8601")
+        .dt.tz_convert(zona)
+        .dt.tz_localize(None)
+        .dt.floor(frecuencia)
+    )
+    return df.groupby(["periodo", "tipo_evento"]).size().reset_index(name="cantidad")
+
+
+def diarios_a_conteos(filas: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """Filas de promociones_analytics_diario [{fecha, tipo_evento, cantidad}] → (periodo, tipo_evento, cantidad)."""
+    df = pd.DataFrame(list(filas), columns=["fecha", "tipo_evento", "cantidad"])
+    if df.empty:
+        return pd.DataFrame(columns=_COLUMNAS)
+    df["periodo"] = pd.to_datetime(df["fecha"])
+    return df[_COLUMNAS]
+
+
+def armar_serie(
+    conteos: Iterable[pd.DataFrame],
+    inicio,
+    fin,
+    granularidad: str,
+) -> Dict[str, Any]:
+    """Suma los conteos por (período, métrica) y los alinea al rango [inicio, fin]."""
+    frecuencia, formato = GRANULARIDADES[granularidad]
+    periodos = pd.date_range(pd.Timestamp(inicio).floor(frecuencia), pd.Timestamp(fin).floor(frecuencia), freq=frecuencia)
+
+    partes = [c for c in conteos if not c.empty]
+    if partes:
+        df = pd.concat(partes, ignore_index=True)
+        df["metrica"] = df["tipo_evento"].map(METRICA_POR_EVENTO)
+        tabla = (
+            df.dropna(subset=["metrica"])
+            .astype({"cantidad": "int64"})
+            .groupby(["periodo", "metrica"])["cantidad"].sum()
+            .unstack("metrica")
+        )
+    else:
+        tabla = pd.DataFrame()
+    tabla = tabla.reindex(index=periodos, columns=list(METRICAS), fill_value=0).fillna(0).astype("int64")
+
+    return {
+        "granularidad": granularidad,
+        "periodos": periodos.strftime(formato).tolist(),
+        "series": {m: tabla[m].tolist() for m in METRICAS},
+        "totales": {m: int(tabla[m].sum()) for m in METRICAS},
+    }
+
+
+def parse_marca(valor: Optional[str]) -> Optional[pd.Timestamp]:
+    """Marca de agua de jobs_watermarks → Timestamp UTC (None si no hay o es -infinity)."""
+    if not valor or "infinity" in str(valor):
+        return None
+    return pd.Timestamp(valor).tz_convert("UTC")
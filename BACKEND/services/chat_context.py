@@ -0,0 +1,176 @@
+"""
+Construcción de Contexto para SapucAI
+-------------------------------------
+Arma el prompt que se envía a OpenAI respetando un presupuesto de tokens:
+
+- El historial ya resumido se reemplaza por un "resumen rodante" (un registro
+  de chat_history con role='system' y metadata.tipo='resumen').
+- Los mensajes sin resumir se incluyen del más reciente al más antiguo hasta
+  agotar el presupuesto; los que no entran (y los que exceden el máximo de
+  mensajes sin resumir) se devuelven en `a_resumir` para compactarlos en
+  segundo plano.
+- Las imágenes del historial ya fueron analizadas por el asistente: se
+  reemplazan por una marca de texto. Solo el turno actual que trae imagen
+  necesita el modelo con visión.
+
+Funciones puras: no llaman a OpenAI ni a la base de datos.
+"""
+
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Costo aproximado de una imagen en el turno actual (detalle alto, 1 tile 512px)
+TOKENS_POR_IMAGEN = 765
+# Con detail="low" OpenAI cobra un costo fijo
+TOKENS_POR_IMAGEN_LOW = 85
+# Overhead por mensaje del formato chat (role, separadores)
+TOKENS_POR_MENSAJE = 4
+
+MARCA_IMAGEN_PREVIA = "[El usuario adjuntó una imagen que ya fue analizada en la conversación]"
+
+
+def estimar_tokens(texto: Optional[str]) -> int:
+    """Estimación rápida sin tokenizer: ~4 caracteres por token."""
+    if not texto:
+        return 0
+    return math.ceil(len(texto) / 4)
+
+
+def estimar_tokens_mensaje(msg: Dict[str, Any]) -> int:
+    content = msg.get("content")
+    total = TOKENS_POR_MENSAJE
+    if isinstance(content, list):
+        for parte in content:
+            if parte.get("type") == "image_url":
+                low = parte.get("image_url", {}).get("detail") == "low"
+                total += TOKENS_POR_IMAGEN_LOW if low else TOKENS_POR_IMAGEN
+            else:
+                total += estimar_tokens(parte.get("text"))
+    else:
+        total += estimar_tokens(content)
+    return total
+
+
+def es_resumen(msg: Dict[str, Any]) -> bool:
+    meta = msg.get("metadata")
+    return isinstance(meta, dict) and meta.get("tipo") == "resumen"
+
+
+def parse_timestamp(valor: Optional[str]) -> Optional[datetime]:
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(str(valor).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def separar_resumen(history: List[Dict[str, Any]]):
+    """Retorna (resumen_vigente | None, mensajes posteriores al resumen)."""
+    resumen = None
+    for msg in history:
+        if es_resumen(msg):
+            resumen = msg
+
+    mensajes = [m for m in history if not es_resumen(m)]
+    if resumen is None:
+        return None, mensajes
+
+    hasta = parse_timestamp(resumen["metadata"].get("resumen_hasta"))
+    if hasta is None:
+        return resumen, mensajes
+
+    pendientes = []
+    for m in mensajes:
+        ts = parse_timestamp(m.get("created_at"))
+        if ts is None or ts > hasta:
+            pendientes.append(m)
+    return resumen, pendientes
+
+
+def _mensaje_historial(msg: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte un registro de chat_history al formato de OpenAI, sin imágenes."""
+    content = msg.get("content", "") or ""
+    meta = msg.get("metadata")
+    if isinstance(meta, dict) and meta.get("image_url"):
+        content = f"{MARCA_IMAGEN_PREVIA}\n{content}" if content else MARCA_IMAGEN_PREVIA
+    return {"role": msg.get("role", "user"), "content": content}
+
+
+def construir_contexto(
+    system_prompt: str,
+    history: List[Dict[str, Any]],
+    user_message: str,
+    image_url: Optional[str] = None,
+    presupuesto_tokens: int = 4000,
+    max_sin_resumir: int = 12,
+    conservar_recientes: int = 6,
+    image_detail: str = "auto",
+) -> Dict[str, Any]:
+    """
+    Arma los mensajes para OpenAI dentro de `presupuesto_tokens`.
+    `image_detail` ("low" | "high" | "auto") se envía en la parte image_url del turno actual.
+
+    Returns:
+        Dict con:
+          - messages: lista lista para chat.completions.
+          - requiere_vision: True solo si el turno actual trae imagen.
+          - a_resumir: mensajes (prefijo más antiguo) a compactar en el resumen.
+          - resumen_previo: texto del resumen vigente (o None).
+          - tokens_estimados: tamaño estimado del prompt.
+    """
+    resumen, pendientes = separar_resumen(history)
+    resumen_previo = resumen.get("content") if resumen else None
+
+    sistema = {"role": "system", "content": system_prompt}
+    if image_url:
+        actual = {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": user_message},
+                {"type": "image_url", "image_url": {"url": image_url, "detail": image_detail}},
+            ],
+        }
+    else:
+        actual = {"role": "user", "content": user_message}
+
+    usados = estimar_tokens_mensaje(sistema) + estimar_tokens_mensaje(actual)
+    msg_resumen = None
+    if resumen_previo:
+        msg_resumen = {
+            "role": "system",
+            "content": f"Resumen de la conversación previa con este usuario:\n{resumen_previo}",
+        }
+        usados += estimar_tokens_mensaje(msg_resumen)
+
+    # Incluir mensajes pendientes del más reciente al más antiguo mientras entren
+    incluidos: List[Dict[str, Any]] = []
+    for msg in reversed(pendientes):
+        convertido = _mensaje_historial(msg)
+        costo = estimar_tokens_mensaje(convertido)
+        if usados + costo > presupuesto_tokens:
+            break
+        incluidos.append(convertido)
+        usados += costo
+    incluidos.reverse()
+
+    n_fuera = len(pendientes) - len(incluidos)
+    n_resumir = n_fuera
+    if len(pendientes) > max_sin_resumir:
+        n_resumir = max(n_resumir, len(pendientes) - conservar_recientes)
+    a_resumir = pendientes[:n_resumir]
+
+    messages = [sistema]
+    if msg_resumen:
+        messages.append(msg_resumen)
+    messages.extend(incluidos)
+    messages.append(actual)
+
+    return {
+        "messages": messages,
+        "requiere_vision": image_url is not None,
+        "a_resumir": a_resumir,
+        "resumen_previo": resumen_previo,
+        "tokens_estimados": usados,
+    }
@@ -0,0 +1,224 @@
+"""
+Caché de Historial de Chat (SapucAI)
+------------------------------------
+Mantiene en memoria los últimos N mensajes de cada conversación para que
+/api/chat no tenga que leer `chat_history` de la base en cada turno.
+
+- Cada usuario tiene un ring buffer (deque con maxlen) de sus últimos mensajes.
+- Los usuarios se ordenan por uso (LRU): al superar el máximo de usuarios o el
+  tope de memoria estimada, se descartan las conversaciones menos recientes.
+- El primer acceso de un usuario es un "miss": el llamador lee la base y
+  precarga el buffer con `warm()`. Los turnos siguientes se sirven desde memoria.
+
+Con varios workers de uvicorn, cada proceso tendría su propia copia; para ese
+caso existe `RedisChatHistoryCache`, que comparte el buffer entre procesos.
+Se elige con la variable de entorno CHAT_CACHE_BACKEND ("memory" | "redis").
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TURNS = 20
+
+
+def _estimar_bytes(msg: Dict[str, Any]) -> int:
+    """Tamaño aproximado de un mensaje serializado (suficiente para aplicar topes)."""
+    return len(json.dumps(msg, ensure_ascii=False, default=str))
+
+
+class InMemoryChatHistoryCache:
+    """Ring buffer por usuario con desalojo LRU y tope de memoria."""
+
+    def __init__(
+        self,
+        max_turns: int = DEFAULT_MAX_TURNS,
+        max_users: int = 2000,
+        max_bytes: int = 32 * 1024 * 1024,
+    ):
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self._buffers: "OrderedDict[str, deque]" = OrderedDict()
+        self._bytes_por_usuario: Dict[str, int] = {}
+        self._bytes_total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Retorna el historial en orden cronológico, o None si no está cacheado."""
+        with self._lock:
+            buf = self._buffers.get(user_id)
+            if buf is None:
+                self.misses += 1
+                return None
+            self._buffers.move_to_end(user_id)
+            self.hits += 1
+            return list(buf)
+
+    def warm(self, user_id: str, messages: List[Dict[str, Any]]):
+        """Carga el historial leído de la base (orden cronológico)."""
+        with self._lock:
+            self._descartar(user_id)
+            self._buffers[user_id] = deque(messages[-self.max_turns:], maxlen=self.max_turns)
+            self._recalcular_bytes(user_id)
+            self._aplicar_topes()
+
+    def append(self, user_id: str, messages: List[Dict[str, Any]]):
+        """Agrega mensajes nuevos al buffer. Si el usuario no está cacheado no hace
+        nada: el próximo `get` será un miss y se precargará desde la base."""
+        with self._lock:
+            buf = self._buffers.get(user_id)
+            if buf is None:
+                return
+            buf.extend(messages)
+            self._buffers.move_to_end(user_id)
+            self._recalcular_bytes(user_id)
+            self._aplicar_topes()
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._descartar(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "usuarios": len(self._buffers),
+                "bytes_estimados": self._bytes_total,
+                "max_usuarios": self.max_users,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+    # ── internos (requieren el lock tomado) ──────────────────────────────────
+    def _recalcular_bytes(self, user_id: str):
+        nuevo = sum(_estimar_bytes(m) for m in self._buffers[user_id])
+        self._bytes_total += nuevo - self._bytes_por_usuario.get(user_id, 0)
+        self._bytes_por_usuario[user_id] = nuevo
+
+    def _descartar(self, user_id: str):
+        if self._buffers.pop(user_id, None) is not None:
+            self._bytes_total -= self._bytes_por_usuario.pop(user_id, 0)
+
+    def _aplicar_topes(self):
+        # Siempre se conserva al menos la conversación más reciente
+        while len(self._buffers) > 1 and (
+            len(self._buffers) > self.max_users or self._bytes_total > self.max_bytes
+        ):
+            user_id, _ = self._buffers.popitem(last=False)
+            self._bytes_total -= self._bytes_por_usuario.pop(user_id, 0)
+            self.evictions += 1
+
+
+class RedisChatHistoryCache:
+    """Misma interfaz que InMemoryChatHistoryCache, compartida entre workers.
+
+    Cada conversación es una lista Redis recortada a `max_turns` con TTL; el
+    tope de memoria global lo aplica Redis (maxmemory + allkeys-lru)."""
+
+    def __init__(self, redis_client, max_turns: int = DEFAULT_MAX_TURNS, ttl_seconds: int = 6 * 3600):
+        self.redis = redis_client
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, user_id: str) -> str:
+        return f"chat:hist:{user_id}"
+
+    def get(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            raw = self.redis.lrange(self._key(user_id), 0, -1)
+        except Exception as e:
+            logger.warning(f"[CHAT CACHE] Redis no disponible en get: {e}")
+            self.misses += 1
+            return None
+        if not raw:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.redis.expire(self._key(user_id), self.ttl_seconds)
+        return [json.loads(r) for r in raw]
+
+    def warm(self, user_id: str, messages: List[Dict[str, Any]]):
+        key = self._key(user_id)
+        try:
+            pipe = self.redis.pipeline()
+            pipe.delete(key)
+            if messages:
+                pipe.rpush(key, *[json.dumps(m, ensure_ascii=False, default=str) for m in messages[-self.max_turns:]])
+                pipe.expire(key, self.ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[CHAT CACHE] Redis no disponible en warm: {e}")
+
+    def append(self, user_id: str, messages: List[Dict[str, Any]]):
+        key = self._key(user_id)
+        try:
+            if not self.redis.exists(key):
+                return
+            pipe = self.redis.pipeline()
+            pipe.rpush(key, *[json.dumps(m, ensure_ascii=False, default=str) for m in messages])
+            pipe.ltrim(key, -self.max_turns, -1)
+            pipe.expire(key, self.ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[CHAT CACHE] Redis no disponible en append: {e}")
+
+    def invalidate(self, user_id: str):
+        try:
+            self.redis.delete(self._key(user_id))
+        except Exception as e:
+            logger.warning(f"[CHAT CACHE] Redis no disponible en invalidate: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        evictions = None
+        try:
+            evictions = self.redis.info("stats").get("evicted_keys")
+        except Exception:
+            pass
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": evictions,
+        }
+
+
+def crear_chat_history_cache(max_turns: int = DEFAULT_MAX_TURNS):
+    """Construye el caché según CHAT_CACHE_BACKEND / REDIS_URL.
+    Si Redis no está configurado o no responde, cae al backend en memoria."""
+    backend = os.getenv("CHAT_CACHE_BACKEND", "memory").lower()
+    if backend == "redis":
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            try:
+                import redis
+                client = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+                client.ping()
+                logger.info("[CHAT CACHE] Usando backend Redis.")
+                return RedisChatHistoryCache(client, max_turns=max_turns)
+            except Exception as e:
+                logger.warning(f"[CHAT CACHE] No se pudo conectar a Redis ({e}). Usando memoria.")
+        else:
+            logger.warning("[CHAT CACHE] CHAT_CACHE_BACKEND=redis sin REDIS_URL. Usando memoria.")
+
+    return InMemoryChatHistoryCache(
+        max_turns=max_turns,
+        max_users=int(os.getenv("CHAT_CACHE_MAX_USERS", "2000")),
+        max_bytes=int(os.getenv("CHAT_CACHE_MAX_MB", "32")) * 1024 * 1024,
+    )
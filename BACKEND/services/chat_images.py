@@ -0,0 +1,149 @@
+"""
+Procesamiento de Imágenes del Chat (visión)
+-------------------------------------------
+Las fotos que los usuarios envían a SapucAI suelen venir directo de la cámara
+del celular (varios MB, 4000px, con EXIF/GPS). OpenAI no aprovecha más de
+~2048px (y con detail="low" usa 512px), así que se normalizan antes de subirlas:
+
+1. Lectura por bloques con tope de tamaño (no se carga un archivo gigante).
+2. Decodificación con Pillow y corrección de orientación según EXIF.
+3. Eliminación de metadatos (EXIF, GPS, perfiles) al re-encodear.
+4. Redimensionado al lado máximo útil para el modelo de visión.
+5. Re-encode a JPEG o WebP comprimido.
+
+El trabajo de CPU (pasos 2-5) corre en un ProcessPoolExecutor para no
+bloquear el event loop ni competir por el GIL con los requests.
+"""
+
+import io
+import os
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHAT_IMAGE_MAX_BYTES = int(os.getenv("CHAT_IMAGE_MAX_MB", "10")) * 1024 * 1024
+CHAT_IMAGE_MAX_LADO = int(os.getenv("CHAT_IMAGE_MAX_LADO", "1024"))
+CHAT_IMAGE_FORMATO = os.getenv("CHAT_IMAGE_FORMATO", "JPEG").upper()  # JPEG | WEBP
+CHAT_IMAGE_CALIDAD = int(os.getenv("CHAT_IMAGE_CALIDAD", "80"))
+CHAT_IMAGE_WORKERS = int(os.getenv("CHAT_IMAGE_WORKERS", "2"))
+
+# Nivel de detalle que se envía a OpenAI en la parte image_url
+DETALLES_VALIDOS = frozenset({"low", "high", "auto"})
+CHAT_IMAGE_DETAIL = os.getenv("CHAT_IMAGE_DETAIL", "auto").lower()
+
+# Tope de píxeles decodificados (protección contra "decompression bombs")
+MAX_PIXELES = 40_000_000
+
+_CONTENT_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+_EXTENSIONES = {"JPEG": "jpg", "WEBP": "webp"}
+
+
+class ImagenInvalidaError(ValueError):
+    """El archivo no es una imagen decodificable o excede los límites."""
+
+
+class ImagenDemasiadoGrandeError(ValueError):
+    """El archivo supera CHAT_IMAGE_MAX_BYTES."""
+
+
+def resolver_detalle(detalle: Optional[str]) -> str:
+    """Valida el nivel de detalle pedido; si no es válido usa el configurado."""
+    if detalle and detalle.lower() in DETALLES_VALIDOS:
+        return detalle.lower()
+    return CHAT_IMAGE_DETAIL if CHAT_IMAGE_DETAIL in DETALLES_VALIDOS else "auto"
+
+
+async def leer_con_limite(upload, max_bytes: int = CHAT_IMAGE_MAX_BYTES, chunk_size: int = 64 * 1024) -> bytes:
+    """Lee un UploadFile por bloques cortando apenas se supera `max_bytes`."""
+    buffer = io.BytesIO()
+    leidos = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        leidos += len(chunk)
+        if leidos > max_bytes:
+            raise ImagenDemasiadoGrandeError(
+                f"La imagen supera el máximo permitido de {max_bytes // (1024 * 1024)} MB."
+            )
+        buffer.write(chunk)
+    return buffer.getvalue()
+
+
+def normalizar_imagen(
+    data: bytes,
+    max_lado: int = CHAT_IMAGE_MAX_LADO,
+    formato: str = CHAT_IMAGE_FORMATO,
+    calidad: int = CHAT_IMAGE_CALIDAD,
+) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Decodifica, orienta, quita metadatos, redimensiona y re-encodea una imagen.
+    Función pura y picklable: se ejecuta dentro del pool de procesos.
+
+    Returns:
+        (bytes_procesados, info) con content_type, extension, dimensiones y tamaños.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELES
+    formato = formato if formato in _CONTENT_TYPES else "JPEG"
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except Exception as e:
+        raise ImagenInvalidaError(f"No se pudo leer la imagen: {e}")
+
+    original = img.size
+    # Aplica la rotación indicada por EXIF antes de descartar los metadatos
+    img = ImageOps.exif_transpose(img)
+
+    if img.mode not in ("RGB", "L"):
+        # Aplanar transparencia sobre fondo blanco (JPEG no soporta alpha)
+        fondo = Image.new("RGB", img.size, (255, 255, 255))
+        rgba = img.convert("RGBA")
+        fondo.paste(rgba, mask=rgba.split()[-1])
+        img = fondo
+
+    img.thumbnail((max_lado, max_lado), Image.Resampling.LANCZOS)
+
+    salida = io.BytesIO()
+    # No se pasa exif= ni icc_profile=: el archivo resultante queda sin metadatos
+    if formato == "WEBP":
+        img.save(salida, format="WEBP", quality=calidad, method=4)
+    else:
+        img.save(salida, format="JPEG", quality=calidad, optimize=True, progressive=True)
+
+    procesada = salida.getvalue()
+    return procesada, {
+        "content_type": _CONTENT_TYPES[formato],
+        "extension": _EXTENSIONES[formato],
+        "original": {"ancho": original[0], "alto": original[1], "bytes": len(data)},
+        "procesada": {"ancho": img.size[0], "alto": img.size[1], "bytes": len(procesada)},
+    }
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=CHAT_IMAGE_WORKERS)
+    return _pool
+
+
+async def procesar_imagen_async(data: bytes) -> Tuple[bytes, Dict[str, Any]]:
+    """Ejecuta normalizar_imagen en el pool de procesos."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), normalizar_imagen, data)
+
+
+def cerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,248 @@
+"""
+Caché de Respuestas Frecuentes (FAQ) para SapucAI
+-------------------------------------------------
+Muchas consultas son casi idénticas ("cómo pago la cuota", dudas estacionales
+de cultivos y animales). Este módulo guarda respuestas previas del asistente y
+las reutiliza cuando llega una pregunta similar, sin pasar por OpenAI.
+
+- Normalización: minúsculas, sin acentos ni signos, sin stopwords en español.
+- Similitud: TF-IDF + coseno sobre un índice invertido local (sin servicios
+  externos de embeddings). Solo se sirve una respuesta si la similitud supera
+  el umbral de confianza.
+- Solo se sirven entradas APROBADAS (por un admin o con auto-aprobación).
+- Expiración por TTL y desalojo LRU al superar el máximo de entradas.
+
+Pensado solo para primeros turnos de texto sin contexto previo; la decisión
+de cuándo consultar el caché la toma ChatService.
+"""
+
+import math
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+STOPWORDS_ES = frozenset("""
+a al algo alguna alguno algunos ante antes aqui asi aun bien cada como con contra cual cuales
+cuando de del desde donde dos e el ella ellas ellos en entre era es esa ese eso esta estan este
+esto estos fue ha hay hola la las le les lo los mas me mi mis muy nada ni no nos o otra otro para
+pero poco por porque puede puedo que quien se sea segun ser si sin sobre solo son su sus tal tambien
+te tengo ti tiene tu tus un una uno unos usted y ya yo buenas buenos dias tardes noches gracias favor
+quiero quisiera necesito saber consulta pregunta
+""".split())
+
+_NO_ALFANUM = re.compile(r"[^a-z0-9\s]")
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas, sin acentos y sin signos de puntuación."""
+    texto = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    texto = _NO_ALFANUM.sub(" ", texto.lower())
+    return " ".join(texto.split())
+
+
+def tokenizar(texto: str) -> List[str]:
+    return [t for t in normalizar_texto(texto).split() if t not in STOPWORDS_ES and len(t) > 1]
+
+
+class FAQCache:
+    """Índice TF-IDF en memoria de preguntas → respuestas aprobadas."""
+
+    def __init__(
+        self,
+        umbral: float = 0.85,
+        ttl_seconds: int = 7 * 24 * 3600,
+        max_entries: int = 500,
+        auto_aprobar: bool = False,
+        max_largo_pregunta: int = 300,
+    ):
+        self.umbral = umbral
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.auto_aprobar = auto_aprobar
+        self.max_largo_pregunta = max_largo_pregunta
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._indice: Dict[str, set] = {}  # token -> ids de entradas
+        self._lock = threading.Lock()
+        self._ultima_purga = 0.0
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _id(tokens: List[str]) -> str:
+        return hashlib.sha1(" ".join(sorted(set(tokens))).encode()).hexdigest()[:12]
+
+    def es_cacheable(self, pregunta: str) -> bool:
+        return bool(pregunta) and len(pregunta) <= self.max_largo_pregunta and bool(tokenizar(pregunta))
+
+    # ── lectura ──────────────────────────────────────────────────────────────
+    def buscar(self, pregunta: str) -> Optional[Dict[str, Any]]:
+        """Retorna {"id", "respuesta", "similitud"} si hay una respuesta aprobada
+        suficientemente similar, o None."""
+        tokens = tokenizar(pregunta)
+        with self._lock:
+            self.lookups += 1
+            if not tokens:
+                return None
+            self._purgar_expiradas()
+
+            candidatos = set()
+            for t in set(tokens):
+                candidatos |= self._indice.get(t, set())
+
+            mejor_id, mejor_sim = None, 0.0
+            consulta = self._vector(Counter(tokens))
+            for entry_id in candidatos:
+                entry = self._entries[entry_id]
+                if not entry["aprobada"]:
+                    continue
+                sim = self._coseno(consulta, self._vector(entry["tf"]))
+                if sim > mejor_sim:
+                    mejor_id, mejor_sim = entry_id, sim
+
+            if mejor_id is None or mejor_sim < self.umbral:
+                return None
+
+            entry = self._entries[mejor_id]
+            entry["hits"] += 1
+            entry["ultimo_uso"] = time.time()
+            self._entries.move_to_end(mejor_id)
+            self.hits += 1
+            return {"id": mejor_id, "respuesta": entry["respuesta"], "similitud": round(mejor_sim, 4)}
+
+    # ── escritura ────────────────────────────────────────────────────────────
+    def guardar(self, pregunta: str, respuesta: str) -> Optional[str]:
+        """Registra una respuesta del asistente. Queda pendiente de aprobación
+        salvo que auto_aprobar esté activo. Retorna el id de la entrada."""
+        if not respuesta or not self.es_cacheable(pregunta):
+            return None
+        tokens = tokenizar(pregunta)
+        entry_id = self._id(tokens)
+        ahora = time.time()
+        with self._lock:
+            existente = self._entries.get(entry_id)
+            if existente is not None:
+                # Una entrada aprobada no se pisa: la respuesta ya fue revisada
+                if not existente["aprobada"]:
+                    existente["respuesta"] = respuesta
+                    existente["pregunta"] = pregunta
+                existente["veces_preguntada"] += 1
+                self._entries.move_to_end(entry_id)
+                return entry_id
+
+            self._entries[entry_id] = {
+                "pregunta": pregunta,
+                "respuesta": respuesta,
+                "tf": Counter(tokens),
+                "aprobada": self.auto_aprobar,
+                "creada": ahora,
+                "ultimo_uso": ahora,
+                "hits": 0,
+                "veces_preguntada": 1,
+            }
+            for t in set(tokens):
+                self._indice.setdefault(t, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                viejo_id, _ = next(iter(self._entries.items()))
+                self._eliminar(viejo_id)
+                self.evictions += 1
+            return entry_id
+
+    def aprobar(self, entry_id: str, respuesta: Optional[str] = None) -> bool:
+        """Marca una entrada como verificada (opcionalmente corrigiendo la respuesta)."""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                return False
+            entry["aprobada"] = True
+            if respuesta:
+                entry["respuesta"] = respuesta
+            return True
+
+    def eliminar(self, entry_id: str) -> bool:
+        with self._lock:
+            if entry_id not in self._entries:
+                return False
+            self._eliminar(entry_id)
+            return True
+
+    def purgar(self) -> int:
+        with self._lock:
+            cantidad = len(self._entries)
+            self._entries.clear()
+            self._indice.clear()
+            return cantidad
+
+    # ── observabilidad ───────────────────────────────────────────────────────
+    def listar(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "id": entry_id,
+                    "pregunta": e["pregunta"],
+                    "respuesta": e["respuesta"],
+                    "aprobada": e["aprobada"],
+                    "hits": e["hits"],
+                    "veces_preguntada": e["veces_preguntada"],
+                    "creada": e["creada"],
+                    "ultimo_uso": e["ultimo_uso"],
+                }
+                for entry_id, e in reversed(self._entries.items())
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entradas": len(self._entries),
+                "aprobadas": sum(1 for e in self._entries.values() if e["aprobada"]),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "umbral": self.umbral,
+            }
+
+    # ── internos (requieren el lock tomado) ──────────────────────────────────
+    def _idf(self, token: str) -> float:
+        n = len(self._entries)
+        df = len(self._indice.get(token, ()))
+        return math.log((1 + n) / (1 + df)) + 1.0
+
+    def _vector(self, tf: Counter) -> Dict[str, float]:
+        return {t: c * self._idf(t) for t, c in tf.items()}
+
+    @staticmethod
+    def _coseno(a: Dict[str, float], b: Dict[str, float]) -> float:
+        dot = sum(v * b.get(t, 0.0) for t, v in a.items())
+        if not dot:
+            return 0.0
+        norma = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+        return dot / norma if norma else 0.0
+
+    def _eliminar(self, entry_id: str):
+        entry = self._entries.pop(entry_id)
+        for t in entry["tf"]:
+            ids = self._indice.get(t)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._indice[t]
+
+    def _purgar_expiradas(self):
+        # Barrido completo como mucho una vez por minuto
+        ahora = time.time()
+        if ahora - self._ultima_purga < 60:
+            return
+        self._ultima_purga = ahora
+        limite = ahora - self.ttl_seconds
+        vencidas = [eid for eid, e in self._entries.items() if e["creada"] < limite]
+        for eid in vencidas:
+            self._eliminar(eid)
+            self.expirations += 1
@@ -0,0 +1,81 @@
+"""
+Caché de Favoritos por Usuario
+------------------------------
+Guarda en memoria los ids de las promociones favoritas de cada usuario (más
+reciente primero) para que la pantalla de favoritos y el toggle no lean la
+tabla `favoritos` en cada request.
+
+- El primer acceso es un miss: el llamador lee la base y precarga con `cargar()`.
+- `agregar` / `quitar` mantienen el conjunto al día tras un toggle; si el
+  usuario no está cacheado no hacen nada (el próximo `get` recarga).
+- LRU por cantidad de usuarios y TTL: con varios workers cada proceso tiene su
+  copia, así que un cambio hecho en otro worker se ve a lo sumo en `ttl_seconds`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class FavoritosCache:
+
+    def __init__(self, max_usuarios: int = 5000, ttl_seconds: float = 600):
+        self.max_usuarios = max_usuarios
+        self.ttl_seconds = ttl_seconds
+        self._usuarios: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str) -> Optional[List[str]]:
+        with self._lock:
+            entrada = self._usuarios.get(user_id)
+            if entrada is None or time.monotonic() - entrada[0] >= self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._usuarios.move_to_end(user_id)
+            self.hits += 1
+            return list(entrada[1])
+
+    def cargar(self, user_id: str, promocion_ids: List[str]):
+        """Precarga con los ids leídos de la base (más reciente primero)."""
+        with self._lock:
+            self._usuarios[user_id] = (time.monotonic(), list(dict.fromkeys(promocion_ids)))
+            self._usuarios.move_to_end(user_id)
+            while len(self._usuarios) > self.max_usuarios:
+                self._usuarios.popitem(last=False)
+                self.evictions += 1
+
+    def agregar(self, user_id: str, promocion_id: str):
+        with self._lock:
+            entrada = self._usuarios.get(user_id)
+            if entrada is None:
+                return
+            ids = [p for p in entrada[1] if p != promocion_id]
+            ids.insert(0, promocion_id)
+            self._usuarios[user_id] = (entrada[0], ids)
+
+    def quitar(self, user_id: str, promocion_id: str):
+        with self._lock:
+            entrada = self._usuarios.get(user_id)
+            if entrada is None:
+                return
+            self._usuarios[user_id] = (entrada[0], [p for p in entrada[1] if p != promocion_id])
+
+    def invalidar(self, user_id: str):
+        with self._lock:
+            self._usuarios.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "usuarios": len(self._usuarios),
+                "max_usuarios": self.max_usuarios,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
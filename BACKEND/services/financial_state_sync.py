@@ -3,6 +3,8 @@ import sys
 import logging
 from datetime import datetime, date
 
+from services.paginacion import LectorKeyset
+
 logger = logging.getLogger(__name__)
 
 def sync_financial_states(supabase_client, financial_engine) -> dict:
@@ -16,14 +18,20 @@ def sync_financial_states(supabase_client, financial_engine) -> dict:
     try:
         hoy = datetime.now()
         
-        # Traer todos los perfiles relevantes
-        response = supabase_client.table("profiles").select("id, estado, estado_financiero, nombre_apellido, gracia_extendida_hasta").in_("estado", ["APROBADO", "RESTRINGIDO", "SUSPENDIDO"]).execute()
-        perfiles = response.data or []
+        # Traer todos los perfiles relevantes (por páginas: un solo execute() se trunca en max-rows)
+        perfiles = LectorKeyset(
+            lambda: supabase_client.table("profiles").select("id, estado, estado_financiero, nombre_apellido, gracia_extendida_hasta").in_("estado", ["APROBADO", "RESTRINGIDO", "SUSPENDIDO"]),
+            tamano_pagina=int(os.getenv("LECTURA_MASIVA_TAM_PAGINA", "1000")),
+            prefetch=True,
+            nombre="sync_financial_states.perfiles",
+        )
         
         inconsistencias = []
         actualizados = 0
+        evaluados = 0
         
         for p in perfiles:
+            evaluados += 1
             socio_id = p["id"]
             estado_actual = p["estado"]
             estado_fin_actual_db = p.get("estado_financiero")
@@ -74,7 +82,7 @@ def sync_financial_states(supabase_client, financial_engine) -> dict:
                 
         return {
             "status": "success",
-            "evaluados": len(perfiles),
+            "evaluados": evaluados,
             "actualizados": actualizados,
             "inconsistencias": inconsistencias
         }
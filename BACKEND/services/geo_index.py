@@ -0,0 +1,194 @@
+"""
+Geolocalización e Índice Espacial
+---------------------------------
+Búsqueda "cerca mío" de ofertas y comercios sin consultar la base por request.
+
+- Geocodificación offline (sin APIs externas), en este orden:
+  1. Coordenadas ya guardadas (latitud/longitud).
+  2. Coordenadas escritas en `ubicacion`/`direccion`: "-27.47, -58.83" o un
+     link de Google Maps (@lat,lon · q=lat,lon · !3dlat!4dlon).
+  3. Centroide del municipio/localidad (tabla municipios).
+  El resultado indica la precisión: "exacta" o "municipio".
+- GridIndex: grilla regular de celdas en grados. Una consulta recorre anillos de
+  celdas alrededor del punto y corta apenas los anillos restantes no pueden
+  contener nada más cerca, así el costo depende de la densidad local y no del
+  total de puntos.
+"""
+
+import re
+import math
+import heapq
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO = 111.195
+
+_PAR = r"(-?\d{1,2}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)"
+_PATRONES = (
+    re.compile(r"!3d(-?\d+(?:\.\d+)?)!4d(-?\d+(?:\.\d+)?)"),
+    re.compile(r"@" + _PAR),
+    re.compile(r"[?&](?:q|query|ll|destination)=" + _PAR),
+    re.compile(r"^\s*" + _PAR + r"\s*$"),
+)
+
+
+def parse_coordenadas(texto: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Extrae (lat, lon) de un texto con coordenadas o de un link de mapas."""
+    if not texto:
+        return None
+    texto = texto.replace("%2C", ",").replace("%2c", ",")
+    for patron in _PATRONES:
+        m = patron.search(texto)
+        if m:
+            lat, lon = float(m.group(1)), float(m.group(2))
+            if -90 <= lat <= 90 and -180 <= lon <= 180 and (lat, lon) != (0.0, 0.0):
+                return lat, lon
+    return None
+
+
+def geocodificar(
+    fila: Dict[str, Any],
+    centroide_municipio: Callable[[Optional[str]], Optional[Tuple[float, float]]],
+) -> Optional[Tuple[float, float, str]]:
+    """(lat, lon, precision) para una oferta o comercio, o None si no hay datos."""
+    lat, lon = fila.get("latitud"), fila.get("longitud")
+    if lat is not None and lon is not None:
+        return float(lat), float(lon), "exacta"
+    for campo in ("ubicacion", "direccion"):
+        coords = parse_coordenadas(fila.get(campo))
+        if coords:
+            return coords[0], coords[1], "exacta"
+    for campo in ("localidad", "municipio"):
+        coords = centroide_municipio(fila.get(campo))
+        if coords:
+            return coords[0], coords[1], "municipio"
+    return None
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat, dlon = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+
+    def __init__(self, celda_grados: float = 0.05):
+        self.celda = celda_grados
+        self._celdas: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = {}
+        self._puntos: Dict[Hashable, Tuple[float, float, Tuple[int, int], Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+        self.consultas = 0
+        self.evaluados = 0
+
+    def __len__(self):
+        return len(self._puntos)
+
+    def _celda_de(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.celda)), int(math.floor(lon / self.celda))
+
+    # ── escritura ────────────────────────────────────────────────────────────
+    def upsert(self, key: Hashable, lat: float, lon: float, datos: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._quitar(key)
+            celda = self._celda_de(lat, lon)
+            self._celdas.setdefault(celda, {})[key] = (lat, lon)
+            self._puntos[key] = (lat, lon, celda, datos or {})
+
+    def eliminar(self, key: Hashable):
+        with self._lock:
+            self._quitar(key)
+
+    def reemplazar(self, puntos: List[Tuple[Hashable, float, float, Dict[str, Any]]]):
+        """Reemplaza todo el contenido (reconstrucción completa)."""
+        celdas: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = {}
+        registro = {}
+        for key, lat, lon, datos in puntos:
+            celda = self._celda_de(lat, lon)
+            celdas.setdefault(celda, {})[key] = (lat, lon)
+            registro[key] = (lat, lon, celda, datos)
+        with self._lock:
+            self._celdas, self._puntos = celdas, registro
+
+    # ── lectura ──────────────────────────────────────────────────────────────
+    def cercanos(
+        self,
+        lat: float,
+        lon: float,
+        radio_km: float,
+        limit: int = 20,
+        offset: int = 0,
+        filtro: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Los `offset + limit` puntos más cercanos dentro de `radio_km`, ordenados
+        por distancia; retorna la página [offset:offset+limit]."""
+        necesarios = offset + limit
+        ci, cj = self._celda_de(lat, lon)
+        # Ancho mínimo de una celda en km (la longitud se achica con la latitud)
+        lat_max = min(89.9, abs(lat) + radio_km / KM_POR_GRADO)
+        celda_km = self.celda * KM_POR_GRADO * max(0.01, math.cos(math.radians(lat_max)))
+        max_anillo = int(math.ceil(radio_km / celda_km)) + 1
+
+        mejores: List[Tuple[float, Hashable]] = []  # max-heap por distancia (negada)
+        with self._lock:
+            self.consultas += 1
+            for r in range(max_anillo + 1):
+                for celda in self._anillo(ci, cj, r):
+                    puntos = self._celdas.get(celda)
+                    if not puntos:
+                        continue
+                    for key, (plat, plon) in puntos.items():
+                        self.evaluados += 1
+                        d = haversine_km(lat, lon, plat, plon)
+                        if d > radio_km:
+                            continue
+                        if filtro is not None and not filtro(self._puntos[key][3]):
+                            continue
+                        if len(mejores) < necesarios:
+                            heapq.heappush(mejores, (-d, key))
+                        elif d < -mejores[0][0]:
+                            heapq.heapreplace(mejores, (-d, key))
+                # Todo punto fuera del anillo r está a más de r * celda_km
+                if len(mejores) >= necesarios and -mejores[0][0] <= r * celda_km:
+                    break
+
+            ordenados = sorted((-nd, key) for nd, key in mejores)[offset:]
+            return [
+                {"id": key, "distancia_km": round(d, 3), **self._puntos[key][3]}
+                for d, key in ordenados
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "puntos": len(self._puntos),
+                "celdas": len(self._celdas),
+                "consultas": self.consultas,
+                "evaluados_promedio": round(self.evaluados / self.consultas, 1) if self.consultas else 0.0,
+            }
+
+    # ── internos ─────────────────────────────────────────────────────────────
+    @staticmethod
+    def _anillo(ci: int, cj: int, r: int):
+        if r == 0:
+            yield ci, cj
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield ci - r, j
+            yield ci + r, j
+        for i in range(ci - r + 1, ci + r):
+            yield i, cj - r
+            yield i, cj + r
+
+    def _quitar(self, key: Hashable):
+        previo = self._puntos.pop(key, None)
+        if previo is None:
+            return
+        celda = previo[2]
+        puntos = self._celdas.get(celda)
+        if puntos is not None:
+            puntos.pop(key, None)
+            if not puntos:
+                del self._celdas[celda]
@@ -0,0 +1,219 @@
+"""
+Limitador Adaptativo de Concurrencia para llamadas al LLM
+---------------------------------------------------------
+Controla cuántas llamadas a OpenAI corren en simultáneo desde este proceso:
+
+- AIMD: el límite crece de a poco con cada respuesta exitosa (+1/límite, es
+  decir ~+1 por "ventana") y se reduce a la mitad ante un 429 (RateLimitError).
+  Solo reducen el límite los 429 de llamadas iniciadas después de la última
+  reducción: una ráfaga de 429 de la misma "ventana" cuenta una sola vez.
+- Cola justa por usuario: dentro de cada prioridad se atiende a los usuarios
+  por turnos (round-robin), así un usuario con muchos mensajes no acapara los
+  slots.
+- Prioridades: los flujos de soporte pasan antes que el chat casual, y las
+  tareas de fondo (resúmenes) van al final.
+- Métricas: profundidad de cola, en vuelo, límite actual y tiempos de espera.
+
+Uso:
+    async with limiter.slot(user_id, prioridad=PRIORIDAD_NORMAL) as slot:
+        try:
+            ...llamada...
+        except RateLimitError:
+            slot.rate_limited()
+            raise
+
+Un bloque que termina sin excepción cuenta como éxito; cualquier otra
+excepción libera el slot sin modificar el límite.
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORIDAD_ALTA = 0     # soporte
+PRIORIDAD_NORMAL = 1   # chat
+PRIORIDAD_BAJA = 2     # tareas de fondo (resúmenes)
+
+
+class LimiterSaturadoError(RuntimeError):
+    """La cola está llena o se agotó el tiempo de espera por un slot."""
+
+
+class _Slot:
+    def __init__(self):
+        self.resultado = "ok"
+        self.inicio = time.monotonic()
+
+    def rate_limited(self):
+        self.resultado = "rate_limited"
+
+
+class AdaptiveConcurrencyLimiter:
+
+    def __init__(
+        self,
+        limite_inicial: float = 4,
+        limite_min: float = 1,
+        limite_max: float = 32,
+        factor_reduccion: float = 0.5,
+        max_cola: int = 200,
+        timeout_espera: float = 30.0,
+    ):
+        self.limite = float(limite_inicial)
+        self.limite_min = float(limite_min)
+        self.limite_max = float(limite_max)
+        self.factor_reduccion = factor_reduccion
+        self.max_cola = max_cola
+        self.timeout_espera = timeout_espera
+
+        self.en_vuelo = 0
+        # prioridad -> (user_id -> futures en espera), en orden de llegada de usuarios
+        self._colas: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {}
+        self._en_cola = 0
+        self._ultima_reduccion = float("-inf")
+
+        self.exitos = 0
+        self.rate_limits = 0
+        self.rechazos = 0
+        self.timeouts = 0
+        self._esperas_total = 0.0
+        self._esperas_n = 0
+        self._espera_max = 0.0
+
+    # ── API pública ─────────────────────────────────────────────────────────
+    @asynccontextmanager
+    async def slot(self, user_id: str, prioridad: int = PRIORIDAD_NORMAL):
+        await self.acquire(user_id, prioridad)
+        slot = _Slot()
+        try:
+            yield slot
+        except BaseException:
+            # Otros errores (conexión, 5xx, cancelación) no ajustan el límite
+            if slot.resultado == "ok":
+                slot.resultado = "error"
+            raise
+        finally:
+            self.release(slot.resultado, inicio=slot.inicio)
+
+    async def acquire(self, user_id: str, prioridad: int = PRIORIDAD_NORMAL):
+        inicio = time.monotonic()
+        if self._en_cola == 0 and self.en_vuelo < self._capacidad():
+            self.en_vuelo += 1
+            self._registrar_espera(0.0)
+            return
+
+        if self._en_cola >= self.max_cola:
+            self.rechazos += 1
+            raise LimiterSaturadoError("Hay demasiadas consultas en espera. Intente nuevamente en unos instantes.")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._colas.setdefault(prioridad, OrderedDict()).setdefault(user_id, deque()).append(fut)
+        self._en_cola += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.timeout_espera)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # El slot se otorgó justo cuando expiraba la espera: devolverlo
+                self.release()
+            else:
+                fut.cancel()
+                self._quitar(prioridad, user_id, fut)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise LimiterSaturadoError("El servicio de IA está muy demandado. Intente nuevamente en unos instantes.")
+            raise
+        self._registrar_espera(time.monotonic() - inicio)
+
+    def release(self, resultado: str = "error", inicio: Optional[float] = None):
+        """Libera un slot. `resultado`: "ok" (crece el límite), "rate_limited"
+        (se reduce) o "error" (neutro). `inicio` es el time.monotonic() en que
+        se otorgó el slot."""
+        self.en_vuelo = max(0, self.en_vuelo - 1)
+        if resultado == "ok":
+            self._on_exito()
+        elif resultado == "rate_limited":
+            self._on_rate_limit(inicio)
+        self._despachar()
+
+    def stats(self) -> Dict[str, Any]:
+        por_prioridad = {
+            str(p): sum(len(q) for q in usuarios.values())
+            for p, usuarios in sorted(self._colas.items())
+        }
+        return {
+            "limite": round(self.limite, 2),
+            "en_vuelo": self.en_vuelo,
+            "en_cola": self._en_cola,
+            "en_cola_por_prioridad": por_prioridad,
+            "usuarios_en_cola": sum(len(u) for u in self._colas.values()),
+            "espera_promedio_ms": round(1000 * self._esperas_total / self._esperas_n, 1) if self._esperas_n else 0.0,
+            "espera_max_ms": round(1000 * self._espera_max, 1),
+            "exitos": self.exitos,
+            "rate_limits": self.rate_limits,
+            "rechazos": self.rechazos,
+            "timeouts": self.timeouts,
+        }
+
+    # ── internos ─────────────────────────────────────────────────────────────
+    def _capacidad(self) -> int:
+        return max(1, int(self.limite))
+
+    def _on_exito(self):
+        self.exitos += 1
+        self.limite = min(self.limite_max, self.limite + 1.0 / self.limite)
+
+    def _on_rate_limit(self, inicio: Optional[float] = None):
+        self.rate_limits += 1
+        if inicio is not None and inicio < self._ultima_reduccion:
+            # La llamada salió con el límite anterior: ya se reaccionó a esta ventana
+            return
+        self._ultima_reduccion = time.monotonic()
+        anterior = self.limite
+        self.limite = max(self.limite_min, self.limite * self.factor_reduccion)
+        logger.warning(f"[LLM LIMITER] 429 recibido: límite {anterior:.2f} → {self.limite:.2f}")
+
+    def _despachar(self):
+        while self._en_cola and self.en_vuelo < self._capacidad():
+            fut = self._siguiente()
+            if fut is None:
+                return
+            if fut.done():
+                continue
+            self.en_vuelo += 1
+            fut.set_result(True)
+
+    def _siguiente(self) -> Optional[asyncio.Future]:
+        for prioridad in sorted(self._colas):
+            usuarios = self._colas[prioridad]
+            if not usuarios:
+                continue
+            # Round-robin: se atiende al primer usuario y pasa al final de la fila
+            user_id, pendientes = next(iter(usuarios.items()))
+            fut = pendientes.popleft()
+            if pendientes:
+                usuarios.move_to_end(user_id)
+            else:
+                del usuarios[user_id]
+            self._en_cola -= 1
+            return fut
+        return None
+
+    def _quitar(self, prioridad: int, user_id: str, fut: asyncio.Future):
+        usuarios = self._colas.get(prioridad)
+        pendientes = usuarios.get(user_id) if usuarios else None
+        if pendientes is None or fut not in pendientes:
+            return
+        pendientes.remove(fut)
+        self._en_cola -= 1
+        if not pendientes:
+            del usuarios[user_id]
+
+    def _registrar_espera(self, segundos: float):
+        self._esperas_total += segundos
+        self._esperas_n += 1
+        self._espera_max = max(self._espera_max, segundos)
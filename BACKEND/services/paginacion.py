@@ -0,0 +1,241 @@
+"""
+Paginación por Cursor (keyset) sobre PostgREST
+----------------------------------------------
+Los listados públicos crecían con el catálogo y el tope de filas de PostgREST
+(max-rows) los truncaba sin avisar. En lugar de OFFSET se pagina por "keyset":
+se ordena por claves estables que terminan en `id` (único) y cada página pide
+las filas posteriores a la última vista.
+
+- El cursor es opaco para el cliente: base64url de los valores de orden de la
+  última fila.
+- `filtro_keyset` arma el filtro `or=(...)` equivalente a la comparación
+  lexicográfica (k1, k2, ..., id) > (v1, v2, ..., vid), respetando el orden por
+  defecto de Postgres para nulos (ASC → nulos al final, DESC → nulos primero).
+- `pagina_keyset` devuelve una página y el `next_cursor` (None si no hay más).
+- `recorrer_keyset` itera todas las filas página por página; se usa para el
+  formato legacy sin paginar y para los jobs que leen tablas enteras (mora,
+  bloqueos, reportes, difusiones) sin quedar truncado por max-rows.
+- `LectorKeyset` es el iterador detrás de `recorrer_keyset`: entrega las filas
+  de a una (memoria acotada a una o dos páginas), puede pedir la página
+  siguiente en un hilo mientras se procesa la actual (`prefetch`) y registra
+  páginas, filas y latencia; `metricas_lecturas()` devuelve las últimas por nombre.
+"""
+
+import json
+import time
+import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (columna, descendente)
+Orden = Sequence[Tuple[str, bool]]
+
+
+class CursorInvalidoError(ValueError):
+    """El cursor recibido no se pudo decodificar o no corresponde al listado."""
+
+
+def codificar_cursor(valores: Sequence[Any]) -> str:
+    raw = json.dumps(list(valores), separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str, n_claves: int) -> List[Any]:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except Exception:
+        raise CursorInvalidoError("Cursor de paginación inválido.")
+    if not isinstance(valores, list) or len(valores) != n_claves:
+        raise CursorInvalidoError("Cursor de paginación inválido.")
+    return valores
+
+
+def _valor(v: Any) -> str:
+    """Cita un valor para los filtros lógicos de PostgREST (comas, paréntesis)."""
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    texto = str(v).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{texto}"'
+
+
+def _igual(col: str, v: Any) -> str:
+    return f"{col}.is.null" if v is None else f"{col}.eq.{_valor(v)}"
+
+
+def _posterior(col: str, v: Any, desc: bool, no_nulo: bool = False) -> Optional[str]:
+    if no_nulo:
+        return f"{col}.{'lt' if desc else 'gt'}.{_valor(v)}"
+    if desc:
+        # DESC: los nulos van primero, así que después de un nulo vienen los no nulos
+        return f"{col}.not.is.null" if v is None else f"{col}.lt.{_valor(v)}"
+    # ASC: los nulos van al final; nada es posterior a un nulo en esta columna
+    if v is None:
+        return None
+    return f"or({col}.gt.{_valor(v)},{col}.is.null)"
+
+
+def filtro_keyset(orden: Orden, valores: Sequence[Any]) -> str:
+    """Filtro para `.or_()` que selecciona las filas posteriores a `valores`.
+    La última clave (el desempate, normalmente `id`) se asume única y no nula."""
+    disyunciones = []
+    for i, (col, desc) in enumerate(orden):
+        posterior = _posterior(col, valores[i], desc, no_nulo=i == len(orden) - 1)
+        if posterior is None:
+            continue
+        condiciones = [_igual(c, valores[j]) for j, (c, _) in enumerate(orden[:i])] + [posterior]
+        disyunciones.append(condiciones[0] if len(condiciones) == 1 else f"and({','.join(condiciones)})")
+    return ",".join(disyunciones)
+
+
+def pagina_keyset(
+    construir_query: Callable[[], Any],
+    orden: Orden,
+    limite: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Ejecuta una página. `construir_query()` debe devolver un query builder nuevo
+    con select y filtros aplicados (sin order ni limit).
+
+    Returns:
+        (filas, next_cursor)
+    """
+    query = construir_query()
+    if cursor:
+        valores = decodificar_cursor(cursor, len(orden))
+        filtro = filtro_keyset(orden, valores)
+        if not filtro:
+            return [], None
+        query = query.or_(filtro)
+    for col, desc in orden:
+        query = query.order(col, desc=desc)
+
+    # Se pide una fila de más para saber si hay página siguiente
+    filas = query.limit(limite + 1).execute().data or []
+    if len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    ultima = filas[-1]
+    return filas, codificar_cursor([ultima.get(col) for col, _ in orden])
+
+
+_metricas: Dict[str, Dict[str, Any]] = {}
+_metricas_lock = threading.Lock()
+
+
+def metricas_lecturas() -> Dict[str, Dict[str, Any]]:
+    """Métricas de la última lectura completa de cada LectorKeyset con nombre."""
+    with _metricas_lock:
+        return {nombre: dict(m) for nombre, m in _metricas.items()}
+
+
+class LectorKeyset:
+    """
+    Recorre un listado completo por keyset. `construir_query()` igual que en
+    `pagina_keyset`; el select debe incluir las columnas de `orden`.
+    Cada iteración vuelve a leer desde el principio.
+    """
+
+    def __init__(
+        self,
+        construir_query: Callable[[], Any],
+        orden: Orden = (("id", False),),
+        tamano_pagina: int = 500,
+        prefetch: bool = False,
+        nombre: Optional[str] = None,
+    ):
+        self.construir_query = construir_query
+        self.orden = list(orden)
+        self.tamano_pagina = tamano_pagina
+        self.prefetch = prefetch
+        self.nombre = nombre
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self.paginas = 0
+        self.filas = 0
+        self.latencia_ms = 0.0
+        self.latencia_max_ms = 0.0
+        self.espera_ms = 0.0  # tiempo que el consumidor esperó páginas
+
+    def _pagina(self, cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        inicio = time.monotonic()
+        filas, siguiente = pagina_keyset(self.construir_query, self.orden, self.tamano_pagina, cursor)
+        ms = (time.monotonic() - inicio) * 1000
+        self.paginas += 1
+        self.latencia_ms += ms
+        self.latencia_max_ms = max(self.latencia_max_ms, ms)
+        return filas, siguiente
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self._reiniciar()
+        if self.prefetch:
+            yield from self._iterar_con_prefetch()
+        else:
+            cursor = None
+            while True:
+                inicio = time.monotonic()
+                filas, cursor = self._pagina(cursor)
+                self.espera_ms += (time.monotonic() - inicio) * 1000
+                self.filas += len(filas)
+                yield from filas
+                if cursor is None:
+                    break
+        self._registrar()
+
+    def _iterar_con_prefetch(self) -> Iterator[Dict[str, Any]]:
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"lector-{self.nombre or 'keyset'}")
+        try:
+            futuro = executor.submit(self._pagina, None)
+            while True:
+                inicio = time.monotonic()
+                filas, cursor = futuro.result()
+                self.espera_ms += (time.monotonic() - inicio) * 1000
+                # La página siguiente se pide mientras el consumidor procesa esta
+                futuro = executor.submit(self._pagina, cursor) if cursor is not None else None
+                self.filas += len(filas)
+                yield from filas
+                if futuro is None:
+                    return
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "paginas": self.paginas,
+            "filas": self.filas,
+            "tamano_pagina": self.tamano_pagina,
+            "prefetch": self.prefetch,
+            "latencia_ms_total": round(self.latencia_ms, 2),
+            "latencia_ms_promedio": round(self.latencia_ms / self.paginas, 2) if self.paginas else 0.0,
+            "latencia_ms_max": round(self.latencia_max_ms, 2),
+            "espera_ms": round(self.espera_ms, 2),
+        }
+
+    def _registrar(self):
+        if not self.nombre:
+            return
+        stats = self.stats()
+        stats["finalizado"] = time.time()
+        with _metricas_lock:
+            _metricas[self.nombre] = stats
+        logger.info(
+            f"[PAGINACION] {self.nombre}: {stats['filas']} filas en {stats['paginas']} páginas, "
+            f"{stats['latencia_ms_total']} ms en la base (espera {stats['espera_ms']} ms)"
+        )
+
+
+def recorrer_keyset(
+    construir_query: Callable[[], Any],
+    orden: Orden,
+    tamano_pagina: int = 500,
+    prefetch: bool = False,
+    nombre: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Itera todas las filas del listado pidiendo páginas de `tamano_pagina`."""
+    return iter(LectorKeyset(construir_query, orden, tamano_pagina, prefetch, nombre))
@@ -0,0 +1,168 @@
+"""
+Aprobación y Rechazo de Pagos por Lotes
+---------------------------------------
+Lógica por tramos de /api/admin/pagos/aprobar-lote y /rechazar-lote, con un
+resultado verdadero por pago:
+
+- `separar_ids`: normaliza los ids a UUID canónico; los que no son UUID se
+  informan como `id_invalido` sin llegar a la base (un id mal formado haría
+  fallar el `in_("id", ...)` de todo el tramo).
+- Cada pago se da por aprobado/rechazado apenas vuelve el UPDATE de
+  pagos_cuotas (filtrado por estado, así lo que otro admin procesó en el medio
+  queda como `estado_invalido`).
+- Si después falla el UPDATE de profiles, el pago sigue aprobado (y tiene
+  recibo); se reintenta socio por socio y los que no se pudieron actualizar
+  llevan `perfil_no_actualizado`.
+"""
+
+import uuid
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PAGOS_LOTE_CHUNK = 100
+ESTADO_EN_VALIDACION = "PENDIENTE_VALIDACION"
+
+Resultados = Dict[str, Dict[str, Any]]
+
+
+def separar_ids(pago_ids: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """(ids en orden y sin repetir, inválidos). Los válidos quedan en forma canónica."""
+    ids, invalidos = [], []
+    for pago_id in pago_ids:
+        if not pago_id:
+            continue
+        try:
+            ids.append(str(uuid.UUID(str(pago_id))))
+        except ValueError:
+            ids.append(str(pago_id))
+            invalidos.append(str(pago_id))
+    return list(dict.fromkeys(ids)), invalidos
+
+
+def _tramos(ids: List[str], tam_tramo: int):
+    for i in range(0, len(ids), tam_tramo):
+        yield i // tam_tramo, ids[i:i + tam_tramo]
+
+
+def _pagos_en_validacion(cliente, ids: List[str], columnas: str, resultados: Resultados) -> List[Dict[str, Any]]:
+    """Lee los pagos del tramo y deja en `resultados` los que no se pueden procesar."""
+    encontrados = {p["id"]: p for p in cliente.table("pagos_cuotas").select(columnas).in_("id", ids).execute().data or []}
+    validos = []
+    for pago_id in ids:
+        pago = encontrados.get(pago_id)
+        if pago is None:
+            resultados[pago_id] = {"ok": False, "resultado": "no_encontrado"}
+        elif pago["estado_pago"] != ESTADO_EN_VALIDACION:
+            resultados[pago_id] = {"ok": False, "resultado": "estado_invalido", "estado_pago": pago["estado_pago"]}
+        else:
+            validos.append(pago)
+    return validos
+
+
+def _actualizar_en_validacion(cliente, ids: List[str], datos: Dict[str, Any]) -> set:
+    # El filtro por estado evita procesar dos veces si otro admin lo hizo en el medio
+    actualizados = (
+        cliente.table("pagos_cuotas")
+        .update(datos)
+        .in_("id", ids)
+        .eq("estado_pago", ESTADO_EN_VALIDACION)
+        .execute()
+    ).data or []
+    return {p["id"] for p in actualizados}
+
+
+def _aprobar_perfiles(cliente, socio_ids: List[str]) -> set:
+    """Pasa los socios a APROBADO y borra la mora. Retorna los que no se pudieron actualizar."""
+    try:
+        cliente.table("profiles").update({"estado": "APROBADO", "motivo": None}).in_("id", socio_ids).execute()
+        return set()
+    except Exception as e:
+        logger.warning(f"[PAGOS LOTE] Falló el update de {len(socio_ids)} perfiles, se reintenta uno por uno: {e}")
+    fallidos = set()
+    for socio_id in socio_ids:
+        try:
+            cliente.table("profiles").update({"estado": "APROBADO", "motivo": None}).eq("id", socio_id).execute()
+        except Exception as e:
+            logger.error(f"[PAGOS LOTE] Perfil {socio_id} no actualizado tras aprobar su pago: {e}")
+            fallidos.add(socio_id)
+    return fallidos
+
+
+def _marcar_error(tramo: List[str], resultados: Resultados):
+    for pago_id in tramo:
+        resultados.setdefault(pago_id, {"ok": False, "resultado": "error"})
+
+
+def aprobar_pagos(
+    cliente, ids: List[str], admin_id: str, columnas: str, tam_tramo: int = PAGOS_LOTE_CHUNK
+) -> Tuple[Resultados, List[Dict[str, Any]]]:
+    """
+    Aprueba los pagos `ids` (ya validados con separar_ids) por tramos.
+    Retorna (resultado por pago, pagos aprobados con las `columnas` leídas).
+    """
+    resultados: Resultados = {}
+    aprobados: List[Dict[str, Any]] = []
+    for n, tramo in _tramos(ids, tam_tramo):
+        try:
+            pagos = _pagos_en_validacion(cliente, tramo, columnas, resultados)
+            if not pagos:
+                continue
+            ids_actualizados = _actualizar_en_validacion(
+                cliente,
+                [p["id"] for p in pagos],
+                {
+                    "estado_pago": "PAGADO",
+                    "fecha_validacion": datetime.now().isoformat(),
+                    "admin_validador_id": admin_id,
+                },
+            )
+        except Exception as e:
+            logger.error(f"[PAGOS LOTE] Error aprobando el tramo {n}: {e}", exc_info=True)
+            _marcar_error(tramo, resultados)
+            continue
+
+        tramo_aprobados = []
+        for p in pagos:
+            if p["id"] in ids_actualizados:
+                resultados[p["id"]] = {"ok": True, "resultado": "aprobado"}
+                tramo_aprobados.append(p)
+            else:
+                resultados[p["id"]] = {"ok": False, "resultado": "estado_invalido"}
+        aprobados.extend(tramo_aprobados)
+
+        if tramo_aprobados:
+            sin_perfil = _aprobar_perfiles(cliente, list(dict.fromkeys(p["socio_id"] for p in tramo_aprobados)))
+            for p in tramo_aprobados:
+                if p["socio_id"] in sin_perfil:
+                    resultados[p["id"]]["perfil_no_actualizado"] = True
+    return resultados, aprobados
+
+
+def rechazar_pagos(
+    cliente, ids: List[str], motivo: str, tam_tramo: int = PAGOS_LOTE_CHUNK
+) -> Tuple[Resultados, int]:
+    """Rechaza los pagos `ids` por tramos. Retorna (resultado por pago, cantidad rechazada)."""
+    resultados: Resultados = {}
+    rechazados = 0
+    for n, tramo in _tramos(ids, tam_tramo):
+        try:
+            pagos = _pagos_en_validacion(cliente, tramo, "id, estado_pago", resultados)
+            if not pagos:
+                continue
+            ids_actualizados = _actualizar_en_validacion(
+                cliente, [p["id"] for p in pagos], {"estado_pago": "RECHAZADO", "motivo_rechazo": motivo}
+            )
+        except Exception as e:
+            logger.error(f"[PAGOS LOTE] Error rechazando el tramo {n}: {e}", exc_info=True)
+            _marcar_error(tramo, resultados)
+            continue
+        for p in pagos:
+            if p["id"] in ids_actualizados:
+                resultados[p["id"]] = {"ok": True, "resultado": "rechazado"}
+                rechazados += 1
+            else:
+                resultados[p["id"]] = {"ok": False, "resultado": "estado_invalido"}
+    return resultados, rechazados
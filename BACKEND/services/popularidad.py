@@ -0,0 +1,186 @@
+"""
+Ranking de Popularidad de Ofertas
+---------------------------------
+Puntaje precalculado para ordenar el feed público por "populares" sin leer
+los eventos crudos de promociones_analytics en cada request.
+
+- Los eventos crudos se acumulan por (oferta, día, tipo) en la base
+  (promociones_analytics_diario) y una marca de agua recuerda hasta dónde se
+  procesó, así cada corrida del job solo suma los eventos nuevos.
+- `calcular_scores` pondera cada tipo de evento y aplica decaimiento temporal
+  exponencial por día (vida media configurable): lo de hoy pesa 1, lo de hace
+  `vida_media_dias` pesa 0.5.
+- Las ofertas destacadas reciben un multiplicador: score = (base + 1) · factor,
+  así una destacada sin tráfico igual queda sobre las no destacadas sin tráfico.
+- `RankingPopularidad` guarda los puntajes en memoria y ordena/pagina un
+  listado de ofertas por (score, created_at, id) descendente.
+- `listado` guarda el listado ya ordenado por clave (p.ej. municipio) hasta
+  que cambie el ranking o la versión de las ofertas: las páginas siguientes
+  se cortan de esa lista en lugar de volver a leer todo el catálogo.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.paginacion import codificar_cursor, decodificar_cursor
+
+PESOS_EVENTO = {
+    "view": 1.0,
+    "whatsapp_click": 4.0,
+    "instagram_click": 3.0,
+    "maps_click": 3.0,
+    "share": 5.0,
+    "share_whatsapp": 5.0,
+    "share_facebook": 5.0,
+    "favorito": 6.0,
+}
+
+
+def _fecha(valor: Any) -> date:
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+def calcular_scores(
+    filas: Iterable[Dict[str, Any]],
+    hoy: date,
+    vida_media_dias: float = 7.0,
+    destacadas: Optional[Iterable[str]] = None,
+    factor_destacada: float = 1.5,
+    pesos: Optional[Dict[str, float]] = None,
+) -> Dict[str, float]:
+    """
+    Puntaje por oferta a partir de agregados diarios.
+
+    Args:
+        filas: [{promocion_id, fecha, tipo_evento, cantidad}, ...]
+        hoy: día de referencia para el decaimiento.
+        destacadas: ids de ofertas con destacada = true.
+    """
+    pesos = pesos or PESOS_EVENTO
+    base: Dict[str, float] = {}
+    for fila in filas:
+        peso = pesos.get(fila.get("tipo_evento"))
+        if not peso:
+            continue
+        edad = max(0, (hoy - _fecha(fila["fecha"])).days)
+        aporte = peso * float(fila.get("cantidad") or 0) * 0.5 ** (edad / vida_media_dias)
+        promo = str(fila["promocion_id"])
+        base[promo] = base.get(promo, 0.0) + aporte
+
+    scores = {promo: valor + 1.0 for promo, valor in base.items()}
+    for promo in destacadas or ():
+        promo = str(promo)
+        scores[promo] = scores.get(promo, 1.0) * factor_destacada
+    return scores
+
+
+class RankingPopularidad:
+
+    def __init__(self, max_listados: int = 64):
+        self._scores: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.actualizado: Optional[datetime] = None
+        self.max_listados = max_listados
+        # clave → ((versión del ranking, versión de ofertas), creado, ordenadas)
+        self._listados: "OrderedDict[str, Tuple[Tuple[int, int], float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._cargando: Dict[str, threading.Lock] = {}
+        self.listados_hits = 0
+        self.listados_misses = 0
+
+    def reemplazar(self, scores: Dict[str, float]):
+        with self._lock:
+            self._scores = dict(scores)
+            self.version += 1
+            self.actualizado = datetime.utcnow()
+            # Los listados ordenados con los puntajes viejos ya no se sirven
+            self._listados.clear()
+
+    def score(self, promocion_id: str) -> float:
+        # Sin eventos ni destacada: el mínimo, 0 (por debajo del piso de 1.0)
+        return self._scores.get(str(promocion_id), 0.0)
+
+    def ordenar(self, ofertas: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Agrega `popularidad` a cada oferta y las ordena por (score, created_at, id) DESC."""
+        scores = self._scores
+        resultado = []
+        for o in ofertas:
+            o["popularidad"] = round(scores.get(str(o["id"]), 0.0), 4)
+            resultado.append(o)
+        resultado.sort(key=_clave, reverse=True)
+        return resultado
+
+    def listado(
+        self,
+        clave: str,
+        cargar: Callable[[], Iterable[Dict[str, Any]]],
+        version_ofertas: int = 0,
+        ttl_seconds: float = 60,
+    ) -> List[Dict[str, Any]]:
+        """
+        Ofertas de `cargar()` ordenadas con `ordenar`, guardadas por `clave`
+        mientras no cambien el ranking ni `version_ofertas` y no pase el TTL.
+        Una sola carga por clave aunque haya requests concurrentes.
+        La lista es compartida: el llamador no debe modificarla.
+        """
+        with self._lock:
+            lock_clave = self._cargando.setdefault(clave, threading.Lock())
+        with lock_clave:
+            with self._lock:
+                vigente = (self.version, version_ofertas)
+                entrada = self._listados.get(clave)
+                if entrada is not None and entrada[0] == vigente and time.monotonic() - entrada[1] < ttl_seconds:
+                    self._listados.move_to_end(clave)
+                    self.listados_hits += 1
+                    return entrada[2]
+                self.listados_misses += 1
+            try:
+                # Se guarda con las versiones leídas ANTES de cargar: si cambiaron
+                # durante la carga, el listado ya nace vencido.
+                ordenadas = self.ordenar(cargar())
+                with self._lock:
+                    self._listados[clave] = (vigente, time.monotonic(), ordenadas)
+                    self._listados.move_to_end(clave)
+                    while len(self._listados) > self.max_listados:
+                        self._listados.popitem(last=False)
+                return ordenadas
+            finally:
+                with self._lock:
+                    self._cargando.pop(clave, None)
+
+    @staticmethod
+    def pagina(
+        ordenadas: Sequence[Dict[str, Any]], limite: int, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Página por keyset sobre una lista ya ordenada con `ordenar`.
+        Lanza CursorInvalidoError si el cursor no es válido."""
+        inicio = 0
+        if cursor:
+            ultima = tuple(decodificar_cursor(cursor, 3))
+            inicio = next((i for i, o in enumerate(ordenadas) if _clave(o) < ultima), len(ordenadas))
+        filas = list(ordenadas[inicio:inicio + limite])
+        hay_mas = inicio + limite < len(ordenadas)
+        next_cursor = codificar_cursor(_clave(filas[-1])) if filas and hay_mas else None
+        return filas, next_cursor
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ofertas_con_score": len(self._scores),
+                "version": self.version,
+                "listados": len(self._listados),
+                "listados_hits": self.listados_hits,
+                "listados_misses": self.listados_misses,
+                "actualizado": self.actualizado.isoformat() if self.actualizado else None,
+            }
+
+
+def _clave(o: Dict[str, Any]) -> Tuple[float, str, str]:
+    return (o.get("popularidad") or 0.0, o.get("created_at") or "", str(o["id"]))
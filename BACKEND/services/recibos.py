@@ -0,0 +1,71 @@
+"""
+Recibos de Cuota Social (PDF)
+-----------------------------
+Renderiza el recibo oficial en memoria (BytesIO), sin archivo temporal.
+
+- `PlantillaRecibo` se construye una sola vez al iniciar: decodifica el logo
+  (ImageReader) y guarda la parte fija de la página (títulos, separador,
+  firma). Cada recibo solo dibuja encima los datos del pago.
+- Renderizar no toca la base ni Storage: el llamador decide dónde subirlo.
+"""
+
+import io
+import os
+import logging
+from typing import Any, Dict, Optional
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+
+class PlantillaRecibo:
+
+    def __init__(self, logo_path: Optional[str] = None):
+        self.logo: Optional[ImageReader] = None
+        if logo_path and os.path.exists(logo_path):
+            try:
+                self.logo = ImageReader(logo_path)
+                self.logo.getRGBData()  # decodificar ahora y no en el primer recibo
+            except Exception as e:
+                logger.warning(f"[RECIBOS] No se pudo cargar el logo {logo_path}: {e}")
+                self.logo = None
+        # Parte fija: (fuente, tamaño, x, y, texto)
+        self.textos_fijos = [
+            ("Helvetica-Bold", 20, 50, 750, "SOCIEDAD RURAL DEL NORTE DE CORRIENTES"),
+            ("Helvetica", 14, 50, 720, "RECIBO OFICIAL DE CUOTA SOCIAL"),
+            ("Helvetica", 12, 50, 640, "-" * 80),
+            ("Helvetica-Bold", 14, 50, 510, "Firma digital SRNC: Aprobado por tesorería."),
+        ]
+
+    def _dibujar_fijo(self, c: canvas.Canvas):
+        for fuente, tamano, x, y, texto in self.textos_fijos:
+            c.setFont(fuente, tamano)
+            c.drawString(x, y, texto)
+        if self.logo is not None:
+            c.drawImage(self.logo, 400, 710, width=100, height=100)
+
+    def renderizar(self, datos: Dict[str, Any]) -> bytes:
+        """
+        datos: pago_id, fecha_pago (dd/mm/aaaa), nombre_apellido, dni,
+        periodo (aaaa-mm) y monto.
+        """
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=A4)
+        self._dibujar_fijo(c)
+
+        c.setFont("Helvetica", 12)
+        c.drawString(50, 680, f"Recibo N°: {str(datos['pago_id'])[-8:].upper()}")
+        c.drawString(50, 660, f"Fecha de Pago: {datos['fecha_pago']}")
+
+        c.setFont("Helvetica", 14)
+        c.drawString(50, 600, f"Señor/a: {datos['nombre_apellido']}")
+        c.drawString(50, 580, f"DNI/CUIT: {datos['dni']}")
+        c.drawString(50, 560, f"Concepto: Cuota Social {datos['periodo']}")
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(50, 530, f"Importe Abonado: ${datos['monto']}")
+
+        c.save()
+        return buffer.getvalue()
@@ -0,0 +1,159 @@
+"""
+Caché de Datos de Referencia
+----------------------------
+Tablas chicas que casi nunca cambian (municipios, roles, configuracion_cuotas)
+se consultaban en cada request. Este módulo las mantiene en memoria:
+
+- Cada tabla se registra con un `loader` (la consulta a Supabase) y, si hace
+  falta, índices por columna con una función de normalización
+  (p.ej. nombre de municipio sin acentos ni mayúsculas → fila).
+- Se recargan solas al vencer el TTL (en el primer acceso posterior) o a
+  demanda con `refrescar()` / `invalidar()`.
+- Si una recarga falla se siguen sirviendo los datos anteriores.
+
+Las filas devueltas son compartidas: tratarlas como solo lectura.
+"""
+
+import time
+import logging
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar_nombre(valor: Optional[str]) -> str:
+    """'  Paso de la  Patria ' y 'paso de la patria' → misma clave."""
+    valor = unicodedata.normalize("NFKD", valor or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(valor.casefold().split())
+
+
+class _Tabla:
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], ttl_seconds: float, indices: Dict[str, Callable]):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.indices = indices
+        self.filas: List[Dict[str, Any]] = []
+        self.por_indice: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+        self.cargada_en: Optional[float] = None
+        self.cargas = 0
+        self.errores = 0
+        self.lock = threading.Lock()
+
+    def vencida(self) -> bool:
+        return self.cargada_en is None or time.monotonic() - self.cargada_en >= self.ttl_seconds
+
+
+class ReferenceDataCache:
+
+    def __init__(self, ttl_seconds: float = 6 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self._tablas: Dict[str, _Tabla] = {}
+
+    def registrar(
+        self,
+        nombre: str,
+        loader: Callable[[], List[Dict[str, Any]]],
+        indices: Optional[Dict[str, Callable[[Any], Any]]] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        """
+        Registra una tabla de referencia.
+
+        Args:
+            loader: retorna la lista completa de filas.
+            indices: columna → función de normalización de la clave. Se usa la
+                misma función al buscar, así "Itatí" encuentra "itati".
+        """
+        self._tablas[nombre] = _Tabla(
+            loader,
+            self.ttl_seconds if ttl_seconds is None else ttl_seconds,
+            indices or {},
+        )
+
+    # ── lectura ──────────────────────────────────────────────────────────────
+    def filas(self, nombre: str) -> List[Dict[str, Any]]:
+        return list(self._vigente(nombre).filas)
+
+    def buscar(self, nombre: str, columna: str, valor: Any) -> Optional[Dict[str, Any]]:
+        tabla = self._vigente(nombre)
+        normalizar = tabla.indices[columna]
+        return tabla.por_indice.get(columna, {}).get(normalizar(valor))
+
+    # ── recarga ──────────────────────────────────────────────────────────────
+    def refrescar(self, nombre: Optional[str] = None) -> Dict[str, int]:
+        """Recarga una tabla (o todas). Retorna {tabla: cantidad de filas}."""
+        nombres = [nombre] if nombre else list(self._tablas)
+        resultado = {}
+        for n in nombres:
+            tabla = self._tablas[n]
+            with tabla.lock:
+                self._cargar(n, tabla)
+            resultado[n] = len(tabla.filas)
+        return resultado
+
+    def invalidar(self, nombre: str):
+        """Marca la tabla como vencida: se recarga en el próximo acceso."""
+        self._tablas[nombre].cargada_en = None
+
+    def precargar(self):
+        """Carga todas las tablas registradas (al iniciar la app). No lanza."""
+        for nombre, tabla in self._tablas.items():
+            with tabla.lock:
+                try:
+                    self._cargar(nombre, tabla)
+                except Exception as e:
+                    logger.error(f"[REFERENCIAS] No se pudo precargar '{nombre}': {e}")
+
+    # ── observabilidad ───────────────────────────────────────────────────────
+    def stats(self) -> Dict[str, Any]:
+        ahora = time.monotonic()
+        return {
+            nombre: {
+                "filas": len(t.filas),
+                "cargas": t.cargas,
+                "errores": t.errores,
+                "edad_s": round(ahora - t.cargada_en, 1) if t.cargada_en is not None else None,
+                "ttl_s": t.ttl_seconds,
+            }
+            for nombre, t in self._tablas.items()
+        }
+
+    # ── internos ─────────────────────────────────────────────────────────────
+    def _vigente(self, nombre: str) -> _Tabla:
+        tabla = self._tablas[nombre]
+        if not tabla.vencida():
+            return tabla
+        with tabla.lock:
+            # Otro thread pudo recargarla mientras esperábamos el lock
+            if tabla.vencida():
+                try:
+                    self._cargar(nombre, tabla)
+                except Exception as e:
+                    if tabla.cargada_en is None and not tabla.filas:
+                        raise
+                    # Se siguen sirviendo los datos anteriores; se reintenta en el próximo TTL
+                    tabla.cargada_en = time.monotonic()
+                    logger.error(f"[REFERENCIAS] Falló la recarga de '{nombre}', se usan datos previos: {e}")
+        return tabla
+
+    @staticmethod
+    def _cargar(nombre: str, tabla: _Tabla):
+        try:
+            filas = tabla.loader() or []
+        except Exception:
+            tabla.errores += 1
+            raise
+        por_indice = {}
+        for columna, normalizar in tabla.indices.items():
+            indice = {}
+            for fila in filas:
+                # Ante claves repetidas gana la primera fila (orden del loader)
+                indice.setdefault(normalizar(fila.get(columna)), fila)
+            por_indice[columna] = indice
+        # Se reemplazan las referencias de una vez: los lectores nunca ven un estado a medias
+        tabla.filas, tabla.por_indice = filas, por_indice
+        tabla.cargada_en = time.monotonic()
+        tabla.cargas += 1
+        logger.info(f"[REFERENCIAS] '{nombre}' cargada: {len(filas)} filas")
@@ -0,0 +1,139 @@
+"""
+Informe Estatutario de Socios (PDF)
+-----------------------------------
+Con una sola `Table` de reportlab para todo el padrón el armado de páginas
+crece más que linealmente con la cantidad de filas (la tabla entera se mide y
+se parte página por página). Acá el detalle se arma en tablas de tamaño fijo
+(`filas_por_tabla`) que repiten el encabezado al cortarse de página, así el
+costo queda proporcional a la cantidad de socios.
+
+- `generar_pdf_socios` es CPU puro y recibe solo datos serializables, para
+  correr en un ProcessPoolExecutor sin competir por el GIL con los requests.
+- `hash_contenido` identifica el informe por sus datos (y el día): si el
+  padrón no cambió, el PDF ya generado se sirve desde storage.
+"""
+
+import io
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+REPORTES_PDF_WORKERS = int(os.getenv("REPORTES_PDF_WORKERS", "1"))
+REPORTES_PDF_FILAS_POR_TABLA = int(os.getenv("REPORTES_PDF_FILAS_POR_TABLA", "250"))
+
+# Cambiar si cambia el diseño del PDF: invalida los informes ya guardados
+VERSION_DISENO = "1"
+
+ENCABEZADOS = ["SOCIO / NOMBRE Y APELLIDO", "DNI", "ESTADO", "TELÉFONO", "MUNICIPIO"]
+ANCHOS = [200, 80, 100, 100, 150]
+
+
+def fila_pdf(s: dict) -> List[str]:
+    # Limpieza de datos Nones para evitar "None" en el PDF
+    return [
+        str(s.get("nombre_apellido") or "-"),
+        str(s.get("dni") or "-"),
+        str(s.get("estado") or "-"),
+        str(s.get("telefono") or "-"),
+        str(s.get("municipio") or "No especificado"),
+    ]
+
+
+def hash_contenido(filas: Sequence[Sequence[str]], dia: str) -> str:
+    h = hashlib.sha256(f"{VERSION_DISENO}|{dia}|".encode("utf-8"))
+    for fila in filas:
+        h.update(json.dumps(fila, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def generar_pdf_socios(
+    filas: Sequence[Sequence[str]],
+    fecha_reporte: str,
+    logo_path: Optional[str] = None,
+    filas_por_tabla: int = REPORTES_PDF_FILAS_POR_TABLA,
+) -> bytes:
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), topMargin=20)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Logo Centrado
+    if logo_path and os.path.exists(logo_path):
+        img = Image(logo_path, width=4 * cm, height=4 * cm)
+        img.hAlign = "CENTER"
+        elements.append(img)
+        elements.append(Spacer(1, 10))
+
+    # Título
+    elements.append(Paragraph("<b>SOCIEDAD RURAL DEL NORTE DE CORRIENTES</b>", styles["Title"]))
+    elements.append(Paragraph("<b>INFORME ESTATUTARIO DE SOCIOS</b>", styles["Heading2"]))
+    elements.append(Spacer(1, 10))
+    elements.append(Paragraph(f"Fecha de reporte: {fecha_reporte}", styles["Normal"]))
+    elements.append(Spacer(1, 20))
+
+    estilo = TableStyle(
+        [
+            ("BACKGROUND", (0, 0), (-1, 0), colors.Color(0.1, 0.4, 0.2)),  # Verde institucional
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 10),
+            ("TOPPADDING", (0, 0), (-1, 0), 10),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+            ("FONTSIZE", (0, 1), (-1, -1), 9),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ]
+    )
+    # Tabla de datos en tramos; repeatRows repite el encabezado en cada página
+    for inicio in range(0, max(len(filas), 1), filas_por_tabla):
+        tramo = [ENCABEZADOS] + [list(f) for f in filas[inicio:inicio + filas_por_tabla]]
+        t = Table(tramo, colWidths=ANCHOS, repeatRows=1)
+        t.setStyle(estilo)
+        elements.append(t)
+
+    # Pie de página
+    elements.append(Spacer(1, 30))
+    elements.append(
+        Paragraph(
+            "Documento emitido por el Sistema de Gestión Digital - Sociedad Rural Del Norte De Corrientes.",
+            styles["Italic"],
+        )
+    )
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=REPORTES_PDF_WORKERS)
+    return _pool
+
+
+def generar_pdf_en_pool(filas: Sequence[Sequence[str]], fecha_reporte: str, logo_path: Optional[str] = None) -> "Future[bytes]":
+    """Encola generar_pdf_socios en el pool de procesos."""
+    return _get_pool().submit(generar_pdf_socios, [list(f) for f in filas], fecha_reporte, logo_path)
+
+
+def cerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,195 @@
+"""
+Reportes Administrativos
+------------------------
+Generación de los reportes de socios/contabilidad a partir de un iterador de
+perfiles, sin cargar todo el padrón en memoria.
+
+- `clasificar_perfil`: categoría de un perfil (una sola vez por fila) para el
+  resumen y para la columna "Categoría".
+- `generar_csv_contabilidad`: generador de bytes (UTF-8 con BOM, `;`) que
+  emite el encabezado de inmediato y luego bloques de ~64 KB a medida que
+  llegan los perfiles; el resumen de categorías se acumula al pasar y se
+  agrega al final.
+- `escribir_xlsx_socios`: planilla de socios con openpyxl en modo write-only
+  (cada fila se serializa al agregarla, sin celdas en memoria); los anchos de
+  columna se estiman con una muestra de las primeras filas.
+- `leer_en_bloques`: recorre un archivo temporal ya generado en bloques y lo
+  cierra al terminar (para responder desde un SpooledTemporaryFile).
+"""
+
+import io
+import csv
+import itertools
+import logging
+from datetime import datetime
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CATEGORIAS_RESUMEN = (
+    "Socio Común",
+    "Grupo Familiar",
+    "Profesional",
+    "Comercial",
+    "Empleados",
+)
+TOTAL_AL_DIA = "Total General (Al día)"
+
+ENCABEZADOS_CONTABILIDAD = [
+    "Nombre y Apellido",
+    "DNI/CUIT",
+    "Email",
+    "Teléfono",
+    "Categoría",
+    "Municipio",
+    "Estado",
+    "Fecha Alta",
+]
+
+# (campo de profiles, encabezado)
+COLUMNAS_SOCIOS_EXCEL = [
+    ("nombre_apellido", "Nombre y Apellido"),
+    ("dni", "DNI"),
+    ("email", "Email"),
+    ("telefono", "Teléfono"),
+    ("estado", "Estado"),
+    ("municipio", "Municipio"),
+    ("created_at", "Fecha de Alta"),
+]
+
+TAM_BLOQUE = 64 * 1024
+ANCHO_MAX_COLUMNA = 50
+
+
+def clasificar_perfil(p: Dict[str, Any]) -> Tuple[str, str]:
+    """(categoría del resumen, etiqueta de la columna Categoría)."""
+    rol = p.get("rol", "SOCIO")
+    titular_id = p.get("titular_id")
+    es_empleado = p.get("es_empleado_comercial", False) and p.get("activo_empleado", True)
+
+    if es_empleado:
+        return "Empleados", "Empleado Comercial"
+    if rol == "COMERCIO":
+        return ("Empleados", "Empleado Comercial") if titular_id else ("Comercial", "Comercio")
+    # SOCIO o fallback
+    if titular_id:
+        return "Grupo Familiar", "Familiar (Adherente)"
+    if p.get("es_profesional", False):
+        return "Profesional", "Profesional"
+    return "Socio Común", "Socio Común"
+
+
+def formatear_fecha(valor: Any) -> str:
+    if not valor:
+        return "-"
+    return datetime.fromisoformat(str(valor).replace("Z", "+00:00")).strftime("%d/%m/%Y")
+
+
+def generar_csv_contabilidad(perfiles: Iterable[Dict[str, Any]], generado: datetime) -> Iterator[bytes]:
+    """CSV de contabilidad en bloques de bytes, listo para un StreamingResponse."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";", quoting=csv.QUOTE_MINIMAL)
+
+    def vaciar() -> bytes:
+        datos = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return datos
+
+    # Encabezado del Reporte
+    writer.writerow(["REPORTE DE CONTABILIDAD - SOCIEDAD RURAL DEL NORTE DE CORRIENTES"])
+    writer.writerow(["Fecha de Generación", generado.strftime("%d/%m/%Y %H:%M:%S")])
+    writer.writerow([])
+    # DETALLE DE SOCIOS (Arriba)
+    writer.writerow(["DETALLE DE SOCIOS"])
+    writer.writerow(ENCABEZADOS_CONTABILIDAD)
+    # BOM para que Excel detecte UTF-8; el primer bloque sale sin esperar a la base
+    yield b"\xef\xbb\xbf" + vaciar()
+
+    conteos = dict.fromkeys(CATEGORIAS_RESUMEN + (TOTAL_AL_DIA,), 0)
+    try:
+        for p in perfiles:
+            categoria, etiqueta = clasificar_perfil(p)
+            conteos[categoria] += 1
+            if p.get("estado", "PENDIENTE") == "APROBADO":
+                conteos[TOTAL_AL_DIA] += 1
+            writer.writerow([
+                p.get("nombre_apellido", "-"),
+                p.get("dni", "-"),
+                p.get("email", "-"),
+                p.get("telefono", "-"),
+                etiqueta,
+                p.get("municipio", "No especificado"),
+                p.get("estado", "PENDIENTE"),
+                formatear_fecha(p.get("created_at")),
+            ])
+            if buffer.tell() >= TAM_BLOQUE:
+                yield vaciar()
+    except Exception as e:
+        # Ya se enviaron bytes: no se puede responder 500. Se deja constancia en el archivo.
+        logger.error(f"[REPORTS] Error generando CSV de contabilidad: {e}")
+        writer.writerow([])
+        writer.writerow(["ERROR: reporte incompleto, volver a generarlo"])
+        yield vaciar()
+        return
+
+    writer.writerow([])
+    writer.writerow([])
+    # Sección de Resumen (Abajo)
+    writer.writerow(["RESUMEN DE CATEGORÍAS"])
+    writer.writerow(["Categoría", "Cantidad"])
+    for cat, cant in conteos.items():
+        writer.writerow([cat, cant])
+    yield vaciar()
+
+
+def fila_socio_excel(p: Dict[str, Any]) -> List[Any]:
+    fila = [p.get(campo) for campo, _ in COLUMNAS_SOCIOS_EXCEL[:-1]]
+    fila.append(formatear_fecha(p.get("created_at")) if p.get("created_at") else None)
+    return fila
+
+
+def estimar_anchos(encabezados: Sequence[str], muestra: Iterable[Sequence[Any]], maximo: int = ANCHO_MAX_COLUMNA) -> List[int]:
+    """Ancho de cada columna: el texto más largo entre encabezado y muestra, +2, con tope."""
+    anchos = [len(e) for e in encabezados]
+    for fila in muestra:
+        for i, valor in enumerate(fila):
+            if valor is not None:
+                anchos[i] = max(anchos[i], len(str(valor)))
+    return [min(a + 2, maximo) for a in anchos]
+
+
+def escribir_xlsx_socios(perfiles: Iterable[Dict[str, Any]], destino: IO[bytes], tam_muestra: int = 500) -> int:
+    """Escribe la hoja "Socios" en `destino`. Retorna la cantidad de filas de datos."""
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    filas = (fila_socio_excel(p) for p in perfiles)
+    muestra = list(itertools.islice(filas, tam_muestra))
+    encabezados = [e for _, e in COLUMNAS_SOCIOS_EXCEL]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Socios")
+    # En write-only los anchos deben fijarse antes de la primera fila
+    for i, ancho in enumerate(estimar_anchos(encabezados, muestra), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho
+
+    ws.append(encabezados)
+    total = 0
+    for fila in itertools.chain(muestra, filas):
+        ws.append(fila)
+        total += 1
+    wb.save(destino)
+    return total
+
+
+def leer_en_bloques(archivo: IO[bytes], tam_bloque: Optional[int] = None) -> Iterator[bytes]:
+    try:
+        archivo.seek(0)
+        while True:
+            bloque = archivo.read(tam_bloque or TAM_BLOQUE)
+            if not bloque:
+                return
+            yield bloque
+    finally:
+        archivo.close()
@@ -0,0 +1,126 @@
+"""
+Trabajos de Reportes Asincrónicos
+---------------------------------
+Los reportes grandes no se generan dentro del request: un POST encola el
+trabajo (tabla `reportes_jobs`), un pool acotado de hilos lo genera, el archivo
+se sube al almacén (ver almacen_reportes) y el cliente consulta el estado
+hasta obtener una URL de descarga de vida corta.
+
+- `clave_job`: hash de (tipo, parámetros); la base garantiza un solo trabajo
+  activo por clave, así pedidos iguales simultáneos comparten el trabajo.
+- `PoolReportes`: hilos acotados con tope de pendientes; si está lleno el
+  pedido se rechaza en lugar de acumularse sin límite.
+- `ejecutar_reporte`: genera a un archivo temporal, lo sube y mide filas,
+  bytes y duración.
+"""
+
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# tipo → (extensión, content-type)
+TIPOS_REPORTE = {
+    "socios_excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "contabilidad_csv": ("csv", "text/csv; charset=utf-8"),
+    "socios_pdf": ("pdf", "application/pdf"),
+}
+
+
+def clave_job(tipo: str, parametros: Dict[str, Any]) -> str:
+    normalizados = {k: v for k, v in parametros.items() if v is not None}
+    texto = json.dumps([tipo, normalizados], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+class ContadorFilas:
+    """Envuelve un iterable y cuenta los elementos que se consumieron."""
+
+    def __init__(self, filas: Iterable[Any]):
+        self._filas = iter(filas)
+        self.n = 0
+
+    def __iter__(self) -> Iterator[Any]:
+        for fila in self._filas:
+            self.n += 1
+            yield fila
+
+
+def ejecutar_reporte(
+    generar: Callable[[IO[bytes]], int],
+    almacen,
+    path: str,
+    content_type: str,
+    spool_max_bytes: int = 8 * 1024 * 1024,
+) -> Dict[str, int]:
+    """`generar(archivo)` escribe el reporte y retorna la cantidad de filas."""
+    inicio = time.monotonic()
+    with tempfile.SpooledTemporaryFile(max_size=spool_max_bytes) as archivo:
+        filas = generar(archivo)
+        archivo.seek(0, 2)
+        tamano = archivo.tell()
+        almacen.guardar(path, archivo, content_type)
+    return {
+        "filas": filas,
+        "bytes": tamano,
+        "duracion_ms": int((time.monotonic() - inicio) * 1000),
+    }
+
+
+class PoolReportes:
+
+    def __init__(self, max_workers: int = 2, max_pendientes: int = 20):
+        self.max_workers = max_workers
+        self.max_pendientes = max_pendientes
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self.enviados = 0
+        self.rechazados = 0
+        self.fallidos = 0
+
+    def enviar(self, fn: Callable[..., Any], *args) -> bool:
+        """Encola fn(*args). False si ya hay `max_pendientes` trabajos en el pool."""
+        with self._lock:
+            if self._pendientes >= self.max_pendientes:
+                self.rechazados += 1
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="reportes")
+            self._pendientes += 1
+            self.enviados += 1
+            self._executor.submit(self._correr, fn, *args)
+            return True
+
+    def _correr(self, fn: Callable[..., Any], *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            self.fallidos += 1
+            logger.error(f"[REPORTES] Error inesperado en trabajo: {e}")
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pendientes": self.max_pendientes,
+                "pendientes": self._pendientes,
+                "enviados": self.enviados,
+                "rechazados": self.rechazados,
+                "fallidos": self.fallidos,
+            }
@@ -0,0 +1,169 @@
+"""
+Caché Versionado de Respuestas Públicas
+---------------------------------------
+Guarda respuestas JSON ya serializadas (bytes + ETag) para endpoints públicos
+de alto tráfico, como el listado de ofertas por municipio.
+
+- Versión global: cada escritura relevante (crear/editar/borrar) llama a
+  `bump()`. Las entradas de una versión anterior dejan de servirse, sin
+  necesidad de saber qué claves afectó el cambio.
+- TTL de seguridad: con varios workers cada proceso tiene su propia versión,
+  así que una entrada nunca vive más de `ttl_seconds`.
+- `get_or_load` evita el "efecto estampida": si varios requests fallan a la vez
+  en la misma clave, solo uno consulta la base y el resto espera el resultado.
+- ETag fuerte calculado sobre el cuerpo serializado; `etag_coincide` interpreta
+  el header If-None-Match para responder 304.
+"""
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    version: int
+    creado: float
+
+
+def serializar(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def calcular_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """True si el header If-None-Match del cliente incluye `etag` (o es '*')."""
+    if not if_none_match:
+        return False
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*":
+            return True
+        # Comparación débil: un proxy puede haber agregado el prefijo W/
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        if candidato == etag:
+            return True
+    return False
+
+
+class VersionedResponseCache:
+
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 512):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._cargando: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+
+    # ── lectura ──────────────────────────────────────────────────────────────
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._vigente(entry):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> CachedResponse:
+        """Retorna la entrada vigente o ejecuta `loader()` (una sola vez por clave
+        aunque haya requests concurrentes) y guarda su resultado."""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            lock_clave = self._cargando.setdefault(key, threading.Lock())
+        with lock_clave:
+            # Otro thread pudo haberla cargado mientras esperábamos
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and self._vigente(entry):
+                    return entry
+                version = self.version
+            try:
+                # Se guarda con la versión leída ANTES de consultar: si hubo un
+                # bump durante la carga, la entrada ya nace vencida.
+                return self.set(key, loader(), version=version)
+            finally:
+                with self._lock:
+                    self._cargando.pop(key, None)
+
+    def get_many_or_load(
+        self, keys: Sequence[str], loader: Callable[[List[str]], Dict[str, Any]]
+    ) -> Dict[str, CachedResponse]:
+        """Como get_or_load para varias claves: las faltantes se cargan con UNA
+        llamada a `loader(faltantes)` → {clave: payload}. Las claves que el loader
+        no devuelve se guardan como None (así no se vuelven a consultar).
+        Sin protección contra estampida por clave."""
+        resultado: Dict[str, CachedResponse] = {}
+        faltantes = []
+        for key in keys:
+            entry = self.get(key)
+            if entry is None:
+                faltantes.append(key)
+            else:
+                resultado[key] = entry
+        if faltantes:
+            with self._lock:
+                version = self.version
+            cargados = loader(faltantes)
+            for key in faltantes:
+                resultado[key] = self.set(key, cargados.get(key), version=version)
+        return resultado
+
+    # ── escritura ────────────────────────────────────────────────────────────
+    def set(self, key: str, payload: Any, version: Optional[int] = None) -> CachedResponse:
+        body = serializar(payload)
+        with self._lock:
+            entry = CachedResponse(
+                body=body,
+                etag=calcular_etag(body),
+                version=self.version if version is None else version,
+                creado=time.monotonic(),
+            )
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+
+    def bump(self) -> int:
+        """Invalida todas las entradas actuales. Retorna la nueva versión."""
+        with self._lock:
+            self.version += 1
+            self.invalidaciones += 1
+            # Las entradas viejas ya no se sirven; se liberan de una vez
+            self._entries.clear()
+            return self.version
+
+    # ── observabilidad ───────────────────────────────────────────────────────
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entradas": len(self._entries),
+                "bytes": sum(len(e.body) for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / consultas, 4) if consultas else 0.0,
+                "invalidaciones": self.invalidaciones,
+            }
+
+    # ── internos (requieren el lock tomado) ──────────────────────────────────
+    def _vigente(self, entry: CachedResponse) -> bool:
+        return entry.version == self.version and time.monotonic() - entry.creado < self.ttl_seconds
@@ -0,0 +1,286 @@
+"""
+Índice de Búsqueda en Memoria
+-----------------------------
+Índice invertido para /api/buscar sobre ofertas, comercios, profesionales y
+eventos. Vive en el proceso: una consulta no toca la base de datos.
+
+- Análisis en español: minúsculas, sin acentos ni signos, sin stopwords y con
+  un stemming simple por sufijos (plural, género, -ciones, -mente), así
+  "Veterinarias" y "veterinario" comparten la raíz "veterinari".
+- Coincidencia por prefijo: "tomat" encuentra "tomates" (con menor peso que
+  la coincidencia exacta), útil mientras el usuario escribe.
+- Ranking BM25 con pesos por campo (p.ej. el título pesa más que la descripción).
+  Todas las palabras de la consulta deben aparecer (AND).
+- Actualización incremental con `upsert` / `eliminar`. `reconstruir` arma un
+  índice nuevo sin bloquear las búsquedas y reaplica los cambios incrementales
+  ocurridos mientras tanto.
+"""
+
+import math
+import heapq
+import bisect
+import threading
+from collections import defaultdict
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.faq_cache import normalizar_texto
+
+STOPWORDS_BUSQUEDA = frozenset("""
+a al como con de del e el en entre es la las lo los o para por que se sin su sus un una unas uno unos y
+""".split())
+
+# Sufijos derivativos que se reducen a una forma común antes de quitar el plural
+_DERIVADOS = (("ciones", "cion"), ("idades", "idad"), ("mente", ""))
+_RAIZ_MINIMA = 4
+
+# Documento: (tipo, id)
+DocKey = Tuple[str, str]
+
+
+def stem(token: str) -> str:
+    """Stemming liviano: derivados comunes, plural y vocal final de género.
+    remates/remate → remat, animales/animal → animal, vacunaciones → vacunacion."""
+    if len(token) <= _RAIZ_MINIMA or token.isdigit():
+        return token
+    for sufijo, reemplazo in _DERIVADOS:
+        if token.endswith(sufijo) and len(token) - len(sufijo) + len(reemplazo) >= _RAIZ_MINIMA:
+            token = token[: -len(sufijo)] + reemplazo
+            break
+    if token.endswith("es") and len(token) - 2 >= _RAIZ_MINIMA and token[-3] in "lrndzj":
+        token = token[:-2]
+    elif token.endswith("s") and len(token) - 1 >= _RAIZ_MINIMA:
+        token = token[:-1]
+    if token[-1] in "aeo" and len(token) - 1 >= _RAIZ_MINIMA:
+        token = token[:-1]
+    return token
+
+
+def analizar(texto: Optional[str]) -> List[str]:
+    return [
+        stem(t)
+        for t in normalizar_texto(texto or "").split()
+        if t not in STOPWORDS_BUSQUEDA and (len(t) > 1 or t.isdigit())
+    ]
+
+
+class _Estado:
+    """Estructuras del índice; se reemplazan juntas al reconstruir.
+
+    Los postings guardan el "impacto" BM25 de cada término en cada documento,
+    tf·(k1+1) / (tf + k1·(1 - b + b·largo/largo_medio)), calculado al indexar.
+    Así una consulta solo multiplica por el idf y suma. El largo medio usado
+    por las altas incrementales queda levemente desactualizado hasta la
+    próxima reconstrucción, lo que no altera el orden de forma apreciable.
+    """
+
+    def __init__(self, k1: float, b: float):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[DocKey, float]] = {}
+        self.docs: Dict[DocKey, Dict[str, Any]] = {}
+        self.vocab: List[str] = []  # términos ordenados, para búsqueda por prefijo
+        self.largo_total = 0.0
+
+    def _norma(self, largo: float) -> float:
+        largo_medio = (self.largo_total / len(self.docs)) if self.docs else largo
+        return self.k1 * (1 - self.b + self.b * largo / (largo_medio or 1.0))
+
+    def agregar(self, key: DocKey, campos: Sequence[Tuple[Optional[str], float]], resumen: Dict[str, Any]):
+        tf: Dict[str, float] = defaultdict(float)
+        for texto, peso in campos:
+            for termino in analizar(texto):
+                tf[termino] += peso
+        largo = sum(tf.values())
+        self.docs[key] = {"tf": dict(tf), "largo": largo, "resumen": resumen}
+        self.largo_total += largo
+        norma = self._norma(largo)
+        for termino, f in tf.items():
+            posting = self.postings.get(termino)
+            if posting is None:
+                posting = self.postings[termino] = {}
+                bisect.insort(self.vocab, termino)
+            posting[key] = f * (self.k1 + 1) / (f + norma)
+
+    def quitar(self, key: DocKey):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        self.largo_total -= doc["largo"]
+        for termino in doc["tf"]:
+            posting = self.postings.get(termino)
+            if posting is None:
+                continue
+            posting.pop(key, None)
+            if not posting:
+                del self.postings[termino]
+                i = bisect.bisect_left(self.vocab, termino)
+                if i < len(self.vocab) and self.vocab[i] == termino:
+                    del self.vocab[i]
+
+    def recalcular_impactos(self):
+        """Recalcula todos los impactos con el largo medio definitivo."""
+        for key, doc in self.docs.items():
+            norma = self._norma(doc["largo"])
+            for termino, f in doc["tf"].items():
+                self.postings[termino][key] = f * (self.k1 + 1) / (f + norma)
+
+
+class SearchIndex:
+
+    def __init__(self, min_prefijo: int = 3, peso_prefijo: float = 0.5, max_expansiones: int = 50,
+                 k1: float = 1.2, b: float = 0.75):
+        self.min_prefijo = min_prefijo
+        self.peso_prefijo = peso_prefijo
+        self.max_expansiones = max_expansiones
+        self.k1 = k1
+        self.b = b
+        self._estado = _Estado(k1, b)
+        self._lock = threading.RLock()
+        # Cambios incrementales durante una reconstrucción: key -> (campos, resumen) | None
+        self._pendientes: Optional[Dict[DocKey, Optional[tuple]]] = None
+        self.consultas = 0
+        self.reconstrucciones = 0
+
+    # ── escritura ────────────────────────────────────────────────────────────
+    def upsert(self, tipo: str, doc_id: Any, campos: Sequence[Tuple[Optional[str], float]], resumen: Dict[str, Any]):
+        """Indexa (o reindexa) un documento. `campos`: [(texto, peso), ...]."""
+        key = (tipo, str(doc_id))
+        with self._lock:
+            self._estado.quitar(key)
+            self._estado.agregar(key, campos, resumen)
+            if self._pendientes is not None:
+                self._pendientes[key] = (campos, resumen)
+
+    def eliminar(self, tipo: str, doc_id: Any):
+        key = (tipo, str(doc_id))
+        with self._lock:
+            self._estado.quitar(key)
+            if self._pendientes is not None:
+                self._pendientes[key] = None
+
+    def reconstruir(self, documentos: Iterable[Tuple[str, Any, Sequence[Tuple[Optional[str], float]], Dict[str, Any]]]) -> int:
+        """Arma un índice nuevo con `documentos` (tipo, id, campos, resumen) y lo
+        reemplaza de una vez. Las búsquedas siguen usando el índice actual mientras
+        tanto. Retorna la cantidad de documentos indexados."""
+        with self._lock:
+            self._pendientes = {}
+        try:
+            nuevo = _Estado(self.k1, self.b)
+            for tipo, doc_id, campos, resumen in documentos:
+                nuevo.agregar((tipo, str(doc_id)), campos, resumen)
+        except BaseException:
+            with self._lock:
+                self._pendientes = None
+            raise
+
+        with self._lock:
+            # Lo que cambió durante la carga es más nuevo que lo leído de la base
+            for key, cambio in self._pendientes.items():
+                nuevo.quitar(key)
+                if cambio is not None:
+                    nuevo.agregar(key, *cambio)
+            nuevo.recalcular_impactos()
+            self._estado = nuevo
+            self._pendientes = None
+            self.reconstrucciones += 1
+            return len(nuevo.docs)
+
+    # ── lectura ──────────────────────────────────────────────────────────────
+    def buscar(
+        self,
+        consulta: str,
+        tipos: Optional[Iterable[str]] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """Retorna {"total", "resultados": [{tipo, id, score, **resumen}]} ordenado por relevancia."""
+        tokens = list(dict.fromkeys(analizar(consulta)))
+        tipos = set(tipos) if tipos else None
+        with self._lock:
+            self.consultas += 1
+            estado = self._estado
+            if not tokens or not estado.docs:
+                return {"total": 0, "resultados": []}
+
+            por_token = [self._expandir(estado, t) for t in tokens]
+            if any(not terminos for terminos in por_token):
+                return {"total": 0, "resultados": []}
+
+            # Por token: (documento → impacto, multiplicador). Con un solo término
+            # se usa el posting tal cual; con varios (prefijos) se toma el mejor.
+            n_docs = len(estado.docs)
+            tablas = []
+            for terminos in por_token:
+                pesos = {
+                    t: factor * math.log(1 + (n_docs - len(estado.postings[t]) + 0.5) / (len(estado.postings[t]) + 0.5))
+                    for t, factor in terminos.items()
+                }
+                if len(pesos) == 1:
+                    (termino, peso), = pesos.items()
+                    tablas.append((estado.postings[termino], peso))
+                    continue
+                combinado: Dict[DocKey, float] = {}
+                for termino, peso in pesos.items():
+                    for key, impacto in estado.postings[termino].items():
+                        v = peso * impacto
+                        if v > combinado.get(key, 0.0):
+                            combinado[key] = v
+                tablas.append((combinado, 1.0))
+
+            # AND: se recorre la tabla más chica y se suman las demás
+            tablas.sort(key=lambda t: len(t[0]))
+            (base, mult), resto = tablas[0], tablas[1:]
+            if not resto and tipos is None:
+                # Un solo token: el orden por impacto ya es el orden final
+                puntajes, escala = base, mult
+            else:
+                puntajes, escala = {}, 1.0
+                for key, impacto in base.items():
+                    if tipos is not None and key[0] not in tipos:
+                        continue
+                    total = impacto * mult
+                    for tabla, m in resto:
+                        v = tabla.get(key)
+                        if v is None:
+                            break
+                        total += v * m
+                    else:
+                        puntajes[key] = total
+            top = heapq.nlargest(offset + limit, puntajes.items(), key=itemgetter(1))[offset:]
+            return {
+                "total": len(puntajes),
+                "resultados": [
+                    {"tipo": key[0], "id": key[1], "score": round(score * escala, 4), **estado.docs[key]["resumen"]}
+                    for key, score in top
+                ],
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            por_tipo: Dict[str, int] = defaultdict(int)
+            for tipo, _ in self._estado.docs:
+                por_tipo[tipo] += 1
+            return {
+                "documentos": len(self._estado.docs),
+                "por_tipo": dict(por_tipo),
+                "terminos": len(self._estado.vocab),
+                "consultas": self.consultas,
+                "reconstrucciones": self.reconstrucciones,
+            }
+
+    # ── internos (requieren el lock tomado) ──────────────────────────────────
+    def _expandir(self, estado: _Estado, token: str) -> Dict[str, float]:
+        """Términos del vocabulario que matchean `token`: exacto (peso 1) o por prefijo."""
+        terminos = {}
+        if token in estado.postings:
+            terminos[token] = 1.0
+        if len(token) >= self.min_prefijo:
+            i = bisect.bisect_left(estado.vocab, token)
+            while i < len(estado.vocab) and len(terminos) < self.max_expansiones:
+                termino = estado.vocab[i]
+                if not termino.startswith(token):
+                    break
+                terminos.setdefault(termino, self.peso_prefijo)
+                i += 1
+        return terminos
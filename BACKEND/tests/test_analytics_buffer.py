@@ -0,0 +1,130 @@
+import time
+import unittest
+from services.analytics_buffer import BufferedBatchWriter, es_error_sqlstate_de_datos
+
+
+class _ErrorDeDatos(Exception):
+    pass
+
+
+class _ErrorPostgres(Exception):
+    """Como postgrest.APIError: el SQLSTATE viene en `code`."""
+
+    def __init__(self, code):
+        super().__init__(f"SQLSTATE {code}")
+        self.code = code
+
+
+class _Destino:
+    """Simula la tabla: rechaza filas marcadas como inválidas o falla entera."""
+
+    def __init__(self):
+        self.lotes = []
+        self.caida = False
+
+    def __call__(self, filas):
+        if self.caida:
+            raise ConnectionError("base caída")
+        if any(f.get("invalido") for f in filas):
+            raise _ErrorDeDatos("violates foreign key constraint")
+        self.lotes.append(list(filas))
+
+    @property
+    def filas(self):
+        return [f for lote in self.lotes for f in lote]
+
+
+def _writer(destino, **kwargs):
+    return BufferedBatchWriter(destino, es_error_de_datos=lambda e: isinstance(e, _ErrorDeDatos), **kwargs)
+
+
+class TestBufferedBatchWriter(unittest.TestCase):
+
+    def test_flush_en_lotes(self):
+        destino = _Destino()
+        w = _writer(destino, tam_lote=4)
+        for i in range(10):
+            w.agregar({"n": i})
+        self.assertEqual(w.flush(), 10)
+        self.assertEqual([len(l) for l in destino.lotes], [4, 4, 2])
+        self.assertEqual([f["n"] for f in destino.filas], list(range(10)))
+
+    def test_cola_llena_descarta_lo_mas_viejo(self):
+        destino = _Destino()
+        w = _writer(destino, max_cola=3)
+        for i in range(5):
+            w.agregar({"n": i})
+        w.flush()
+        self.assertEqual([f["n"] for f in destino.filas], [2, 3, 4])
+        self.assertEqual(w.stats()["descartados_cola"], 2)
+
+    def test_error_de_datos_aisla_la_fila(self):
+        destino = _Destino()
+        w = _writer(destino, tam_lote=8)
+        for i in range(8):
+            w.agregar({"n": i, "invalido": i == 5})
+        self.assertEqual(w.flush(), 7)
+        self.assertEqual(sorted(f["n"] for f in destino.filas), [0, 1, 2, 3, 4, 6, 7])
+        self.assertEqual(w.stats()["descartados_error"], 1)
+
+    def test_base_caida_reencola_y_reintenta(self):
+        destino = _Destino()
+        w = _writer(destino, tam_lote=2)
+        for i in range(3):
+            w.agregar({"n": i})
+        destino.caida = True
+        self.assertEqual(w.flush(), 0)
+        self.assertEqual(len(w), 3)
+        self.assertEqual(w.stats()["reintentos"], 1)
+
+        destino.caida = False
+        self.assertEqual(w.flush(), 3)
+        self.assertEqual([f["n"] for f in destino.filas], [0, 1, 2])
+
+    def test_clasificacion_por_sqlstate(self):
+        for code in ("23503", "23502", "22P02", "22001"):
+            self.assertTrue(es_error_sqlstate_de_datos(_ErrorPostgres(code)), code)
+        for code in ("57014", "08006", "PGRST301", "42501", None, ""):
+            self.assertFalse(es_error_sqlstate_de_datos(_ErrorPostgres(code)), code)
+        self.assertFalse(es_error_sqlstate_de_datos(ConnectionError("sin code")))
+
+    def test_error_transitorio_devuelve_el_lote_a_la_cola(self):
+        errores = []
+
+        def escribir(filas):
+            if errores:
+                raise errores.pop()
+            destino.lotes.append(list(filas))
+
+        destino = _Destino()
+        w = BufferedBatchWriter(escribir, tam_lote=4, es_error_de_datos=es_error_sqlstate_de_datos)
+        for i in range(4):
+            w.agregar({"n": i})
+        errores.append(_ErrorPostgres("57014"))  # statement timeout
+        self.assertEqual(w.flush(), 0)
+        self.assertEqual(len(w), 4)
+        self.assertEqual(w.stats()["reintentos"], 1)
+        self.assertEqual(w.stats()["descartados_error"], 0)
+
+        self.assertEqual(w.flush(), 4)
+        self.assertEqual([f["n"] for f in destino.filas], [0, 1, 2, 3])
+
+    def test_hilo_por_intervalo_y_cierre_ordenado(self):
+        destino = _Destino()
+        w = _writer(destino, tam_lote=1000, intervalo_ms=20)
+        w.iniciar()
+        try:
+            w.agregar({"n": 1})
+            limite = time.monotonic() + 2
+            while not destino.filas and time.monotonic() < limite:
+                time.sleep(0.01)
+            self.assertEqual(len(destino.filas), 1)
+        finally:
+            w.agregar({"n": 2})
+            w.cerrar()
+        self.assertEqual([f["n"] for f in destino.filas], [1, 2])
+        self.assertEqual(len(w), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
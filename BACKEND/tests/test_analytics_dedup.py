@@ -0,0 +1,70 @@
+import unittest
+from services.analytics_dedup import InMemoryDedupStore
+
+
+class _Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+class TestInMemoryDedupStore(unittest.TestCase):
+
+    def test_enfriamiento_por_tipo_de_evento(self):
+        reloj = _Reloj()
+        store = InMemoryDedupStore(reloj=reloj)
+        self.assertTrue(store.permitir("ip:p1:view", "view"))
+        self.assertTrue(store.permitir("ip:p1:maps_click", "maps_click"))
+        self.assertFalse(store.permitir("ip:p1:view", "view"))
+
+        reloj.t += 60
+        # El click ya se enfrió (30 s); la vista no (300 s)
+        self.assertTrue(store.permitir("ip:p1:maps_click", "maps_click"))
+        self.assertFalse(store.permitir("ip:p1:view", "view"))
+
+        reloj.t += 300
+        self.assertTrue(store.permitir("ip:p1:view", "view"))
+
+        stats = store.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 4)
+
+    def test_enfriamiento_nunca_menor_al_configurado(self):
+        reloj = _Reloj()
+        store = InMemoryDedupStore(cooldowns={}, cooldown_defecto=30, reloj=reloj)
+        for inicio in (0.0, 1.5, 2.9):
+            reloj.t = 2000.0 + inicio * 100
+            clave = f"k{inicio}"
+            self.assertTrue(store.permitir(clave, "share"))
+            reloj.t += 29.9
+            self.assertFalse(store.permitir(clave, "share"))
+            reloj.t += 3.1  # ventana + un tramo
+            self.assertTrue(store.permitir(clave, "share"))
+
+    def test_expiracion_libera_claves(self):
+        reloj = _Reloj()
+        store = InMemoryDedupStore(reloj=reloj)
+        for i in range(100):
+            store.permitir(f"ip{i}:p1:share", "share")
+        self.assertEqual(store.stats()["claves"], 100)
+        reloj.t += 40
+        store.permitir("otra", "share")
+        self.assertEqual(store.stats()["claves"], 1)
+
+    def test_tope_duro_de_claves(self):
+        reloj = _Reloj()
+        store = InMemoryDedupStore(max_claves=50, reloj=reloj)
+        for i in range(200):
+            reloj.t += 1
+            store.permitir(f"ip{i}:p1:view", "view")
+        stats = store.stats()
+        self.assertLessEqual(stats["claves"], 50)
+        self.assertGreater(stats["evictions"], 0)
+        # Las más recientes siguen deduplicándose
+        self.assertFalse(store.permitir("ip199:p1:view", "view"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from datetime import date, datetime, timedelta
+from services.analytics_series import armar_serie, contar_eventos, diarios_a_conteos, parse_marca
+
+
+class TestAnalyticsSeries(unittest.TestCase):
+
+    def test_serie_diaria_desde_agregados_y_cola_cruda(self):
+        diarios = [
+            {"fecha": "2026-10-17", "tipo_evento": "view", "cantidad": 5},
+            {"fecha": "2026-10-17", "tipo_evento": "whatsapp_click", "cantidad": 2},
+            {"fecha": "2026-10-17", "tipo_evento": "maps_click", "cantidad": 1},
+            {"fecha": "2026-10-19", "tipo_evento": "desconocido", "cantidad": 9},
+        ]
+        # 02:30 UTC del 19 es todavía 18 en Argentina (UTC-3)
+        crudos = [
+            {"created_at": "2026-10-19T02:30:00+00:00", "tipo_evento": "view"},
+            {"created_at": "2026-10-19T15:00:00.123+00:00", "tipo_evento": "favorito"},
+        ]
+        serie = armar_serie(
+            [diarios_a_conteos(diarios), contar_eventos(crudos, "dia")],
+            date(2026, 10, 16), date(2026, 10, 19), "dia",
+        )
+        self.assertEqual(serie["periodos"], ["2026-10-16", "2026-10-17", "2026-10-18", "2026-10-19"])
+        self.assertEqual(serie["series"]["vistas"], [0, 5, 1, 0])
+        self.assertEqual(serie["series"]["clicks"], [0, 3, 0, 0])
+        self.assertEqual(serie["series"]["favoritos"], [0, 0, 0, 1])
+        self.assertEqual(serie["totales"], {"vistas": 6, "clicks": 3, "shares": 0, "favoritos": 1})
+
+    def test_serie_horaria(self):
+        inicio = datetime(2026, 10, 19, 9)
+        eventos = [
+            {"created_at": (datetime(2026, 10, 19, 12, 10) + timedelta(minutes=i)).isoformat() + "+00:00",
+             "tipo_evento": "share_whatsapp"}
+            for i in range(3)
+        ]
+        serie = armar_serie([contar_eventos(eventos, "hora")], inicio, inicio + timedelta(hours=2), "hora")
+        self.assertEqual(serie["periodos"], ["2026-10-19T09:00", "2026-10-19T10:00", "2026-10-19T11:00"])
+        self.assertEqual(serie["series"]["shares"], [3, 0, 0])
+
+    def test_sin_datos_y_marca(self):
+        serie = armar_serie([contar_eventos([], "dia")], date(2026, 10, 19), date(2026, 10, 19), "dia")
+        self.assertEqual(serie["series"]["vistas"], [0])
+        self.assertIsNone(parse_marca("-infinity"))
+        self.assertIsNone(parse_marca(None))
+        self.assertEqual(parse_marca("2026-10-19T10:00:00-03:00").hour, 13)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from services.chat_context import (
+    construir_contexto,
+    estimar_tokens,
+    MARCA_IMAGEN_PREVIA,
+)
+
+
+def _msg(i, role="user", **extra):
+    return {
+        "role": role,
+        "content": f"mensaje {i}",
+        "metadata": extra.get("metadata"),
+        "created_at": f"2026-10-01T10:00:{i:02d}+00:00",
+    }
+
+
+class TestChatContext(unittest.TestCase):
+
+    def test_estimar_tokens(self):
+        self.assertEqual(estimar_tokens(""), 0)
+        self.assertEqual(estimar_tokens("abcd"), 1)
+        self.assertEqual(estimar_tokens("abcde"), 2)
+
+    def test_imagen_previa_no_fuerza_vision(self):
+        history = [
+            _msg(1, metadata={"image_url": "https://x/img.jpg"}),
+            _msg(2, "assistant"),
+        ]
+        ctx = construir_contexto("sys", history, "¿y ahora?")
+        self.assertFalse(ctx["requiere_vision"])
+        # El historial no lleva partes image_url
+        for m in ctx["messages"]:
+            self.assertIsInstance(m["content"], str)
+        self.assertIn(MARCA_IMAGEN_PREVIA, ctx["messages"][1]["content"])
+
+    def test_imagen_actual_requiere_vision(self):
+        ctx = construir_contexto("sys", [], "mirá esta hoja", image_url="https://x/hoja.jpg")
+        self.assertTrue(ctx["requiere_vision"])
+        self.assertEqual(ctx["messages"][-1]["content"][1]["type"], "image_url")
+
+    def test_presupuesto_descarta_los_mas_antiguos(self):
+        history = [_msg(i) for i in range(10)]
+        # sistema + actual + 3 mensajes de historial (cada uno ~7 tokens)
+        ctx = construir_contexto("sys", history, "hola", presupuesto_tokens=35, max_sin_resumir=50)
+        contenidos = [m["content"] for m in ctx["messages"][1:-1]]
+        self.assertEqual(contenidos, ["mensaje 7", "mensaje 8", "mensaje 9"])
+        self.assertEqual([m["content"] for m in ctx["a_resumir"]], [f"mensaje {i}" for i in range(7)])
+        self.assertLessEqual(ctx["tokens_estimados"], 35)
+
+    def test_compacta_al_superar_max_sin_resumir(self):
+        history = [_msg(i) for i in range(14)]
+        ctx = construir_contexto("sys", history, "hola", max_sin_resumir=12, conservar_recientes=6)
+        self.assertEqual(len(ctx["a_resumir"]), 8)
+        # Todos entran en el presupuesto: se siguen enviando hasta que exista el resumen
+        self.assertEqual(len(ctx["messages"]), 16)
+
+    def test_resumen_reemplaza_mensajes_resumidos(self):
+        history = [_msg(i) for i in range(6)]
+        history.append({
+            "role": "system",
+            "content": "El usuario consulta por un ternero con diarrea.",
+            "metadata": {"tipo": "resumen", "resumen_hasta": "2026-10-01T10:00:03+00:00"},
+            "created_at": "2026-10-01T10:00:06+00:00",
+        })
+        ctx = construir_contexto("sys", history, "hola")
+        self.assertEqual(ctx["resumen_previo"], "El usuario consulta por un ternero con diarrea.")
+        self.assertIn("ternero", ctx["messages"][1]["content"])
+        contenidos = [m["content"] for m in ctx["messages"][2:-1]]
+        self.assertEqual(contenidos, ["mensaje 4", "mensaje 5"])
+        self.assertEqual(ctx["a_resumir"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from services.chat_history_cache import InMemoryChatHistoryCache
+
+
+def _msg(i, role="user"):
+    return {"role": role, "content": f"mensaje {i}", "metadata": None}
+
+
+class TestInMemoryChatHistoryCache(unittest.TestCase):
+
+    def test_miss_luego_hit(self):
+        cache = InMemoryChatHistoryCache(max_turns=4)
+        self.assertIsNone(cache.get("u1"))
+        cache.warm("u1", [_msg(1), _msg(2, "assistant")])
+        self.assertEqual(cache.get("u1"), [_msg(1), _msg(2, "assistant")])
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_ring_buffer_conserva_ultimos_n(self):
+        cache = InMemoryChatHistoryCache(max_turns=3)
+        cache.warm("u1", [_msg(i) for i in range(5)])
+        self.assertEqual([m["content"] for m in cache.get("u1")], ["mensaje 2", "mensaje 3", "mensaje 4"])
+
+        cache.append("u1", [_msg(5), _msg(6)])
+        self.assertEqual([m["content"] for m in cache.get("u1")], ["mensaje 4", "mensaje 5", "mensaje 6"])
+
+    def test_append_sin_warm_no_cachea(self):
+        # Sin precarga no sabemos el historial previo: no se debe cachear parcial
+        cache = InMemoryChatHistoryCache()
+        cache.append("u1", [_msg(1)])
+        self.assertIsNone(cache.get("u1"))
+
+    def test_desalojo_lru_por_cantidad_de_usuarios(self):
+        cache = InMemoryChatHistoryCache(max_users=2)
+        cache.warm("u1", [_msg(1)])
+        cache.warm("u2", [_msg(1)])
+        cache.get("u1")  # u1 pasa a ser el más reciente
+        cache.warm("u3", [_msg(1)])
+
+        self.assertIsNone(cache.get("u2"))
+        self.assertIsNotNone(cache.get("u1"))
+        self.assertIsNotNone(cache.get("u3"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_desalojo_por_tope_de_memoria(self):
+        grande = {"role": "user", "content": "x" * 1000, "metadata": None}
+        cache = InMemoryChatHistoryCache(max_bytes=2500)
+        cache.warm("u1", [grande])
+        cache.warm("u2", [grande])
+        cache.warm("u3", [grande])
+
+        stats = cache.stats()
+        self.assertLessEqual(stats["bytes_estimados"], 2500)
+        self.assertEqual(stats["usuarios"], 2)
+        self.assertIsNone(cache.get("u1"))
+
+    def test_invalidate(self):
+        cache = InMemoryChatHistoryCache()
+        cache.warm("u1", [_msg(1)])
+        cache.invalidate("u1")
+        self.assertIsNone(cache.get("u1"))
+        self.assertEqual(cache.stats()["bytes_estimados"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import io
+import asyncio
+import unittest
+from services.chat_images import (
+    leer_con_limite,
+    normalizar_imagen,
+    resolver_detalle,
+    ImagenDemasiadoGrandeError,
+    ImagenInvalidaError,
+)
+
+try:
+    from PIL import Image
+    HAY_PIL = True
+except ImportError:
+    HAY_PIL = False
+
+
+class _FakeUpload:
+    def __init__(self, data: bytes):
+        self._buf = io.BytesIO(data)
+        self.lecturas = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        self.lecturas += 1
+        return self._buf.read(size)
+
+
+class TestChatImages(unittest.TestCase):
+
+    def test_leer_con_limite_corta_al_superar_el_tope(self):
+        upload = _FakeUpload(b"x" * 1000)
+        with self.assertRaises(ImagenDemasiadoGrandeError):
+            asyncio.run(leer_con_limite(upload, max_bytes=300, chunk_size=100))
+        # Deja de leer apenas se supera el tope
+        self.assertEqual(upload.lecturas, 4)
+
+    def test_leer_con_limite_ok(self):
+        data = asyncio.run(leer_con_limite(_FakeUpload(b"abc" * 10), max_bytes=100, chunk_size=7))
+        self.assertEqual(data, b"abc" * 10)
+
+    def test_resolver_detalle(self):
+        self.assertEqual(resolver_detalle("LOW"), "low")
+        self.assertEqual(resolver_detalle("high"), "high")
+        self.assertIn(resolver_detalle("ultra"), {"low", "high", "auto"})
+        self.assertIn(resolver_detalle(None), {"low", "high", "auto"})
+
+    @unittest.skipUnless(HAY_PIL, "Pillow no instalado")
+    def test_normalizar_redimensiona_y_quita_exif(self):
+        img = Image.new("RGB", (4000, 3000), (10, 120, 30))
+        exif = Image.Exif()
+        exif[0x010F] = "CamaraCelular"  # Make
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", exif=exif, quality=95)
+
+        procesada, info = normalizar_imagen(buf.getvalue(), max_lado=1024)
+        resultado = Image.open(io.BytesIO(procesada))
+        self.assertEqual(max(resultado.size), 1024)
+        self.assertEqual(len(resultado.getexif()), 0)
+        self.assertEqual(info["content_type"], "image/jpeg")
+        self.assertLess(info["procesada"]["bytes"], info["original"]["bytes"])
+
+    @unittest.skipUnless(HAY_PIL, "Pillow no instalado")
+    def test_normalizar_rechaza_archivo_no_imagen(self):
+        with self.assertRaises(ImagenInvalidaError):
+            normalizar_imagen(b"no soy una imagen")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import patch
+from services.faq_cache import FAQCache, normalizar_texto, tokenizar
+
+
+class TestFAQCache(unittest.TestCase):
+
+    def test_normalizacion(self):
+        self.assertEqual(normalizar_texto("¿Cómo PAGO la Cuota?"), "como pago la cuota")
+        self.assertEqual(tokenizar("¿Cómo pago la cuota?"), ["pago", "cuota"])
+
+    def test_no_sirve_entradas_sin_aprobar(self):
+        cache = FAQCache()
+        entry_id = cache.guardar("¿Cómo pago la cuota?", "Desde la sección Cuotas.")
+        self.assertIsNone(cache.buscar("como pago la cuota"))
+
+        cache.aprobar(entry_id)
+        hit = cache.buscar("Como pago la cuota??")
+        self.assertEqual(hit["respuesta"], "Desde la sección Cuotas.")
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["lookups"], 2)
+
+    def test_umbral_de_similitud(self):
+        cache = FAQCache(umbral=0.85, auto_aprobar=True)
+        cache.guardar("cómo pago la cuota social", "Desde la sección Cuotas.")
+        cache.guardar("cuándo vacunar terneros contra aftosa", "Según el calendario de SENASA.")
+
+        self.assertIsNotNone(cache.buscar("Buenas! cómo pago la cuota social"))
+        self.assertIsNone(cache.buscar("cómo pago al veterinario"))
+        self.assertIsNone(cache.buscar("mi perro no come"))
+
+    def test_desalojo_por_tamano(self):
+        cache = FAQCache(max_entries=2, auto_aprobar=True)
+        cache.guardar("pregunta uno maiz", "r1")
+        cache.guardar("pregunta dos soja", "r2")
+        cache.guardar("pregunta tres trigo", "r3")
+        self.assertEqual(cache.stats()["entradas"], 2)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertIsNone(cache.buscar("pregunta uno maiz"))
+
+    def test_expiracion_por_ttl(self):
+        cache = FAQCache(ttl_seconds=60, auto_aprobar=True)
+        with patch("services.faq_cache.time.time", return_value=1000.0):
+            cache.guardar("cómo pago la cuota", "r")
+        with patch("services.faq_cache.time.time", return_value=1000.0 + 3600):
+            self.assertIsNone(cache.buscar("cómo pago la cuota"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_purgar_y_eliminar(self):
+        cache = FAQCache(auto_aprobar=True)
+        entry_id = cache.guardar("cómo pago la cuota", "r")
+        self.assertTrue(cache.eliminar(entry_id))
+        self.assertFalse(cache.eliminar(entry_id))
+        cache.guardar("cómo pago la cuota", "r")
+        self.assertEqual(cache.purgar(), 1)
+        self.assertEqual(cache.listar(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
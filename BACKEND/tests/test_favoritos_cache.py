@@ -0,0 +1,39 @@
+import unittest
+from services.favoritos_cache import FavoritosCache
+
+
+class TestFavoritosCache(unittest.TestCase):
+
+    def test_miss_carga_y_toggle(self):
+        cache = FavoritosCache()
+        self.assertIsNone(cache.get("u1"))
+        cache.cargar("u1", ["p2", "p1"])
+        cache.agregar("u1", "p3")
+        cache.agregar("u1", "p1")  # ya estaba: pasa al frente sin duplicarse
+        self.assertEqual(cache.get("u1"), ["p1", "p3", "p2"])
+        cache.quitar("u1", "p3")
+        self.assertEqual(cache.get("u1"), ["p1", "p2"])
+        self.assertEqual(cache.stats()["hits"], 2)
+
+    def test_toggle_sin_carga_no_cachea_parcial(self):
+        cache = FavoritosCache()
+        cache.agregar("u1", "p1")
+        self.assertIsNone(cache.get("u1"))
+
+    def test_ttl_y_lru(self):
+        cache = FavoritosCache(max_usuarios=2, ttl_seconds=0)
+        cache.cargar("u1", ["p1"])
+        self.assertIsNone(cache.get("u1"))
+
+        cache = FavoritosCache(max_usuarios=2)
+        cache.cargar("u1", [])
+        cache.cargar("u2", [])
+        cache.get("u1")
+        cache.cargar("u3", [])
+        self.assertIsNone(cache.get("u2"))
+        self.assertEqual(cache.get("u1"), [])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import random
+import unittest
+from services.geo_index import GridIndex, geocodificar, haversine_km, parse_coordenadas
+
+
+class TestGeocodificacion(unittest.TestCase):
+
+    def test_parse_coordenadas(self):
+        self.assertEqual(parse_coordenadas("-27.4692, -58.8306"), (-27.4692, -58.8306))
+        self.assertEqual(parse_coordenadas("https://www.google.com/maps/@-27.46,-58.83,15z"), (-27.46, -58.83))
+        self.assertEqual(parse_coordenadas("https://maps.google.com/?q=-27.5%2C-58.9"), (-27.5, -58.9))
+        self.assertEqual(parse_coordenadas("https://www.google.com/maps/place/X/data=!3d-27.1!4d-58.2"), (-27.1, -58.2))
+        self.assertIsNone(parse_coordenadas("Av. 3 de Abril 1234"))
+        self.assertIsNone(parse_coordenadas("0, 0"))
+        self.assertIsNone(parse_coordenadas(None))
+
+    def test_geocodificar_prioridades(self):
+        centroides = {"Goya": (-29.14, -59.26)}
+        self.assertEqual(geocodificar({"latitud": "-27.0", "longitud": "-58.0"}, centroides.get), (-27.0, -58.0, "exacta"))
+        self.assertEqual(geocodificar({"ubicacion": "-27.5, -58.8", "municipio": "Goya"}, centroides.get), (-27.5, -58.8, "exacta"))
+        self.assertEqual(geocodificar({"direccion": "San Martín 100", "municipio": "Goya"}, centroides.get), (-29.14, -59.26, "municipio"))
+        self.assertIsNone(geocodificar({"direccion": "San Martín 100"}, centroides.get))
+
+    def test_haversine(self):
+        # Corrientes - Resistencia: ~15 km
+        self.assertAlmostEqual(haversine_km(-27.4692, -58.8306, -27.4514, -58.9867), 15.5, delta=1.0)
+        self.assertEqual(haversine_km(-27.0, -58.0, -27.0, -58.0), 0.0)
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def _lineal(self, puntos, lat, lon, radio):
+        dist = sorted((haversine_km(lat, lon, plat, plon), key) for key, (plat, plon) in puntos.items())
+        return [key for d, key in dist if d <= radio]
+
+    def test_coincide_con_recorrido_lineal(self):
+        rnd = random.Random(7)
+        puntos = {i: (-27.47 + rnd.uniform(-1, 1), -58.83 + rnd.uniform(-1, 1)) for i in range(2000)}
+        idx = GridIndex(celda_grados=0.05)
+        idx.reemplazar([(k, lat, lon, {"n": k}) for k, (lat, lon) in puntos.items()])
+
+        for _ in range(20):
+            lat, lon = -27.47 + rnd.uniform(-1, 1), -58.83 + rnd.uniform(-1, 1)
+            radio = rnd.choice([2, 10, 40])
+            esperados = self._lineal(puntos, lat, lon, radio)
+            self.assertEqual([r["id"] for r in idx.cercanos(lat, lon, radio, limit=15)], esperados[:15])
+            self.assertEqual([r["id"] for r in idx.cercanos(lat, lon, radio, limit=15, offset=15)], esperados[15:30])
+
+        self.assertLess(idx.stats()["evaluados_promedio"], len(puntos))
+
+    def test_upsert_eliminar_y_filtro(self):
+        idx = GridIndex()
+        idx.upsert("a", -27.47, -58.83, {"municipio": "Corrientes"})
+        idx.upsert("b", -27.48, -58.84, {"municipio": "Riachuelo"})
+        self.assertEqual([r["id"] for r in idx.cercanos(-27.47, -58.83, 5)], ["a", "b"])
+
+        # Mover "a" lejos la saca del radio
+        idx.upsert("a", -29.14, -59.26, {"municipio": "Goya"})
+        self.assertEqual([r["id"] for r in idx.cercanos(-27.47, -58.83, 5)], ["b"])
+
+        filtrados = idx.cercanos(-27.47, -58.83, 500, filtro=lambda d: d["municipio"] == "Goya")
+        self.assertEqual([r["id"] for r in filtrados], ["a"])
+        self.assertEqual(filtrados[0]["municipio"], "Goya")
+
+        idx.eliminar("b")
+        idx.eliminar("inexistente")
+        self.assertEqual(len(idx), 1)
+        self.assertEqual(idx.stats()["celdas"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import time
+import asyncio
+import unittest
+from services.llm_limiter import (
+    AdaptiveConcurrencyLimiter,
+    LimiterSaturadoError,
+    PRIORIDAD_ALTA,
+    PRIORIDAD_NORMAL,
+)
+
+
+class RateLimitFalso(Exception):
+    pass
+
+
+class LLMFalso:
+    """Simula un proveedor con capacidad fija: por encima responde 429."""
+
+    def __init__(self, capacidad: int, latencia: float = 0.01):
+        self.capacidad = capacidad
+        self.latencia = latencia
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+        self.rechazos = 0
+
+    async def llamar(self):
+        if self.en_vuelo >= self.capacidad:
+            self.rechazos += 1
+            raise RateLimitFalso()
+        self.en_vuelo += 1
+        self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+        try:
+            await asyncio.sleep(self.latencia)
+        finally:
+            self.en_vuelo -= 1
+
+
+async def _consulta(limiter, llm, user_id, prioridad=PRIORIDAD_NORMAL, reintentos=5):
+    for _ in range(reintentos):
+        try:
+            async with limiter.slot(user_id, prioridad) as slot:
+                try:
+                    await llm.llamar()
+                    return True
+                except RateLimitFalso:
+                    slot.rate_limited()
+                    raise
+        except RateLimitFalso:
+            await asyncio.sleep(0.005)
+    return False
+
+
+class TestAdaptiveConcurrencyLimiter(unittest.TestCase):
+
+    def test_aimd_crece_con_exitos_y_se_reduce_con_429(self):
+        limiter = AdaptiveConcurrencyLimiter(limite_inicial=4)
+        for _ in range(8):
+            limiter.release("ok")
+        self.assertGreater(limiter.limite, 5)
+
+        antes = limiter.limite
+        limiter.release("rate_limited")
+        self.assertAlmostEqual(limiter.limite, antes / 2)
+
+        # Un error que no es 429 no modifica el límite
+        limiter.release("error")
+        self.assertAlmostEqual(limiter.limite, antes / 2)
+
+    def test_rafaga_de_429_de_la_misma_ventana_reduce_una_vez(self):
+        limiter = AdaptiveConcurrencyLimiter(limite_inicial=16)
+        inicio = time.monotonic()
+        for _ in range(5):
+            limiter.release("rate_limited", inicio=inicio)
+        self.assertEqual(limiter.limite, 8)
+        self.assertEqual(limiter.stats()["rate_limits"], 5)
+
+        # Un 429 de una llamada iniciada después de la reducción sí cuenta
+        limiter.release("rate_limited", inicio=time.monotonic())
+        self.assertEqual(limiter.limite, 4)
+
+    def test_converge_a_la_capacidad_del_proveedor(self):
+        async def escenario():
+            limiter = AdaptiveConcurrencyLimiter(limite_inicial=16)
+            llm = LLMFalso(capacidad=3)
+            resultados = await asyncio.gather(*(_consulta(limiter, llm, f"u{i % 5}") for i in range(100)))
+            return limiter, llm, resultados
+
+        limiter, llm, resultados = asyncio.run(escenario())
+        self.assertTrue(all(resultados))
+        # El límite oscila alrededor de la capacidad real y los 429 son la excepción
+        self.assertLess(limiter.limite, 8)
+        self.assertLess(llm.rechazos, 50)
+        self.assertEqual(limiter.stats()["en_cola"], 0)
+        self.assertEqual(limiter.stats()["en_vuelo"], 0)
+
+    def test_cola_justa_entre_usuarios(self):
+        async def escenario():
+            limiter = AdaptiveConcurrencyLimiter(limite_inicial=1, limite_max=1)
+            orden = []
+
+            async def tarea(user_id):
+                async with limiter.slot(user_id):
+                    orden.append(user_id)
+                    await asyncio.sleep(0)
+
+            await limiter.acquire("bloqueo")
+            tareas = [asyncio.create_task(tarea("pesado")) for _ in range(4)]
+            tareas.append(asyncio.create_task(tarea("liviano")))
+            await asyncio.sleep(0)
+            self.assertEqual(limiter.stats()["en_cola"], 5)
+            limiter.release("ok")
+            await asyncio.gather(*tareas)
+            return orden
+
+        orden = asyncio.run(escenario())
+        # El usuario liviano no espera a que terminen los 4 mensajes del pesado
+        self.assertEqual(orden[:2], ["pesado", "liviano"])
+
+    def test_prioridad_alta_se_atiende_primero(self):
+        async def escenario():
+            limiter = AdaptiveConcurrencyLimiter(limite_inicial=1, limite_max=1)
+            orden = []
+
+            async def tarea(user_id, prioridad):
+                async with limiter.slot(user_id, prioridad):
+                    orden.append(user_id)
+
+            await limiter.acquire("bloqueo")
+            tareas = [asyncio.create_task(tarea(f"chat{i}", PRIORIDAD_NORMAL)) for i in range(3)]
+            tareas.append(asyncio.create_task(tarea("soporte", PRIORIDAD_ALTA)))
+            await asyncio.sleep(0)
+            limiter.release("ok")
+            await asyncio.gather(*tareas)
+            return orden
+
+        self.assertEqual(asyncio.run(escenario())[0], "soporte")
+
+    def test_cola_llena_y_timeout(self):
+        async def escenario():
+            limiter = AdaptiveConcurrencyLimiter(limite_inicial=1, limite_max=1, max_cola=1, timeout_espera=0.05)
+            await limiter.acquire("a")
+            espera = asyncio.create_task(limiter.acquire("b"))
+            await asyncio.sleep(0)
+            with self.assertRaises(LimiterSaturadoError):
+                await limiter.acquire("c")  # cola llena
+            with self.assertRaises(LimiterSaturadoError):
+                await espera  # timeout esperando slot
+            return limiter.stats()
+
+        stats = asyncio.run(escenario())
+        self.assertEqual(stats["rechazos"], 1)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["en_cola"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
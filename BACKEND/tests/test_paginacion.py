@@ -0,0 +1,123 @@
+import unittest
+from services.paginacion import (
+    CursorInvalidoError,
+    codificar_cursor,
+    decodificar_cursor,
+    filtro_keyset,
+    pagina_keyset,
+    recorrer_keyset,
+    LectorKeyset,
+    metricas_lecturas,
+)
+
+
+class _Res:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """Query builder mínimo: ordena y filtra en Python según las filas dadas."""
+
+    def __init__(self, filas, log):
+        self.filas = filas
+        self.log = log
+        self._orden = []
+        self._despues_de = None
+        self._limite = None
+
+    def or_(self, filtro):
+        self.log.append(filtro)
+        return self
+
+    def order(self, col, desc=False):
+        self._orden.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self._limite = n
+        return self
+
+    def execute(self):
+        filas = sorted(self.filas, key=lambda f: f["id"])
+        if self.log:
+            # El último filtro usado corresponde al cursor: id > último id visto
+            ultimo = self.log[-1].split('"')[1]
+            filas = [f for f in filas if f["id"] > ultimo]
+        return _Res(filas[: self._limite])
+
+
+class TestPaginacion(unittest.TestCase):
+
+    def test_cursor_ida_y_vuelta(self):
+        cursor = codificar_cursor(["Pérez, Juan", "abc-1"])
+        self.assertEqual(decodificar_cursor(cursor, 2), ["Pérez, Juan", "abc-1"])
+        with self.assertRaises(CursorInvalidoError):
+            decodificar_cursor(cursor, 3)
+        with self.assertRaises(CursorInvalidoError):
+            decodificar_cursor("no-es-un-cursor!!", 2)
+
+    def test_filtro_keyset_asc_con_nulos_al_final(self):
+        orden = [("nombre_apellido", False), ("id", False)]
+        self.assertEqual(
+            filtro_keyset(orden, ["Ana (Campo)", "7"]),
+            'or(nombre_apellido.gt."Ana (Campo)",nombre_apellido.is.null),'
+            'and(nombre_apellido.eq."Ana (Campo)",id.gt."7")',
+        )
+        # Después de un nombre nulo solo quedan los nulos con id mayor
+        self.assertEqual(
+            filtro_keyset(orden, [None, "7"]),
+            'and(nombre_apellido.is.null,id.gt."7")',
+        )
+
+    def test_filtro_keyset_desc(self):
+        orden = [("created_at", True), ("id", True)]
+        self.assertEqual(
+            filtro_keyset(orden, ["2026-01-01T00:00:00", "9"]),
+            'created_at.lt."2026-01-01T00:00:00",and(created_at.eq."2026-01-01T00:00:00",id.lt."9")',
+        )
+
+    def test_pagina_y_next_cursor(self):
+        filas = [{"id": f"{i:02d}"} for i in range(5)]
+        log = []
+        pagina, cursor = pagina_keyset(lambda: FakeQuery(filas, log), [("id", False)], 2)
+        self.assertEqual([f["id"] for f in pagina], ["00", "01"])
+        self.assertEqual(decodificar_cursor(cursor, 1), ["01"])
+
+        pagina, cursor = pagina_keyset(lambda: FakeQuery(filas, log), [("id", False)], 2, cursor)
+        self.assertEqual([f["id"] for f in pagina], ["02", "03"])
+
+        pagina, cursor = pagina_keyset(lambda: FakeQuery(filas, log), [("id", False)], 2, cursor)
+        self.assertEqual([f["id"] for f in pagina], ["04"])
+        self.assertIsNone(cursor)
+
+    def test_recorrer_todo(self):
+        filas = [{"id": f"{i:03d}"} for i in range(23)]
+        log = []
+        todas = list(recorrer_keyset(lambda: FakeQuery(filas, log), [("id", False)], tamano_pagina=5))
+        self.assertEqual(len(todas), 23)
+        self.assertEqual(len(log), 4)
+
+    def test_lector_con_prefetch_y_metricas(self):
+        filas = [{"id": f"{i:03d}"} for i in range(23)]
+        for prefetch in (False, True):
+            log = []
+            lector = LectorKeyset(lambda: FakeQuery(filas, log), tamano_pagina=5, prefetch=prefetch, nombre=f"test.{prefetch}")
+            self.assertEqual([f["id"] for f in lector], [f["id"] for f in filas])
+            self.assertEqual(lector.stats()["paginas"], 5)
+            self.assertEqual(lector.stats()["filas"], 23)
+            self.assertEqual(metricas_lecturas()[f"test.{prefetch}"]["filas"], 23)
+
+    def test_lector_es_perezoso(self):
+        filas = [{"id": f"{i:03d}"} for i in range(50)]
+        log = []
+        it = iter(LectorKeyset(lambda: FakeQuery(filas, log), tamano_pagina=10, prefetch=True))
+        for _ in range(12):
+            next(it)
+        # Se leyó la segunda página y, como mucho, se pidió la tercera por adelantado
+        self.assertLessEqual(len(log), 2)
+        it.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
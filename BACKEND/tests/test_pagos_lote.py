@@ -0,0 +1,152 @@
+import unittest
+import uuid
+from types import SimpleNamespace
+from services.pagos_lote import aprobar_pagos, rechazar_pagos, separar_ids
+
+COLUMNAS = "id, socio_id, estado_pago"
+
+
+class _Query:
+
+    def __init__(self, base, tabla):
+        self.base = base
+        self.tabla = tabla
+        self.op = "select"
+        self.datos = None
+        self.filtros = []
+
+    def select(self, columnas):
+        return self
+
+    def update(self, datos):
+        self.op, self.datos = "update", datos
+        return self
+
+    def in_(self, campo, valores):
+        self.filtros.append((campo, set(valores)))
+        return self
+
+    def eq(self, campo, valor):
+        self.filtros.append((campo, {valor}))
+        return self
+
+    def execute(self):
+        return SimpleNamespace(data=self.base.ejecutar(self))
+
+
+class _Supabase:
+    """Simula pagos_cuotas y profiles; `fallas` lista (tabla, op, condición) a hacer fallar."""
+
+    def __init__(self, pagos):
+        self.tablas = {
+            "pagos_cuotas": {p["id"]: dict(p) for p in pagos},
+            "profiles": {p["socio_id"]: {"id": p["socio_id"], "estado": "EN_MORA"} for p in pagos},
+        }
+        self.fallas = []
+        self.antes_de_update = None
+
+    def table(self, nombre):
+        return _Query(self, nombre)
+
+    def ejecutar(self, q):
+        for tabla, op, condicion in self.fallas:
+            if tabla == q.tabla and op == q.op and condicion(q):
+                raise RuntimeError(f"falla simulada en {tabla}")
+        filas = [f for f in self.tablas[q.tabla].values() if all(f.get(c) in v for c, v in q.filtros)]
+        if q.op == "update":
+            if q.tabla == "pagos_cuotas" and self.antes_de_update:
+                self.antes_de_update(self)
+                filas = [f for f in self.tablas[q.tabla].values() if all(f.get(c) in v for c, v in q.filtros)]
+            for f in filas:
+                f.update(q.datos)
+        return [dict(f) for f in filas]
+
+
+def _id():
+    return str(uuid.uuid4())
+
+
+def _pagos(n, estado="PENDIENTE_VALIDACION"):
+    return [{"id": _id(), "socio_id": _id(), "estado_pago": estado} for _ in range(n)]
+
+
+class TestSepararIds(unittest.TestCase):
+
+    def test_invalidos_y_duplicados(self):
+        valido = _id()
+        ids, invalidos = separar_ids([valido, "no-es-uuid", valido.upper(), "", "1; drop"])
+        self.assertEqual(ids, [valido, "no-es-uuid", "1; drop"])
+        self.assertEqual(invalidos, ["no-es-uuid", "1; drop"])
+
+
+class TestAprobarPagos(unittest.TestCase):
+
+    def test_no_encontrado_y_estado_invalido(self):
+        pendiente, pagado = _pagos(1)[0], _pagos(1, "PAGADO")[0]
+        db = _Supabase([pendiente, pagado])
+        inexistente = _id()
+        resultados, aprobados = aprobar_pagos(db, [pendiente["id"], pagado["id"], inexistente], "admin", COLUMNAS)
+        self.assertEqual([p["id"] for p in aprobados], [pendiente["id"]])
+        self.assertEqual(resultados[pendiente["id"]], {"ok": True, "resultado": "aprobado"})
+        self.assertEqual(resultados[pagado["id"]]["resultado"], "estado_invalido")
+        self.assertEqual(resultados[inexistente]["resultado"], "no_encontrado")
+        self.assertEqual(db.tablas["profiles"][pendiente["socio_id"]]["estado"], "APROBADO")
+        self.assertEqual(db.tablas["profiles"][pagado["socio_id"]]["estado"], "EN_MORA")
+
+    def test_pago_procesado_por_otro_admin_en_el_medio(self):
+        pagos = _pagos(3)
+        db = _Supabase(pagos)
+
+        def otro_admin(base):
+            base.tablas["pagos_cuotas"][pagos[1]["id"]]["estado_pago"] = "RECHAZADO"
+            base.antes_de_update = None
+
+        db.antes_de_update = otro_admin
+        resultados, aprobados = aprobar_pagos(db, [p["id"] for p in pagos], "admin", COLUMNAS)
+        self.assertEqual([p["id"] for p in aprobados], [pagos[0]["id"], pagos[2]["id"]])
+        self.assertEqual(resultados[pagos[1]["id"]], {"ok": False, "resultado": "estado_invalido"})
+        self.assertEqual(db.tablas["profiles"][pagos[1]["socio_id"]]["estado"], "EN_MORA")
+
+    def test_falla_en_un_tramo_no_afecta_a_los_otros(self):
+        pagos = _pagos(4)
+        db = _Supabase(pagos)
+        fallido = pagos[2]["id"]
+        db.fallas.append(("pagos_cuotas", "update", lambda q: fallido in q.filtros[0][1]))
+        resultados, aprobados = aprobar_pagos(db, [p["id"] for p in pagos], "admin", COLUMNAS, tam_tramo=2)
+        self.assertEqual([p["id"] for p in aprobados], [pagos[0]["id"], pagos[1]["id"]])
+        self.assertEqual(resultados[pagos[2]["id"]]["resultado"], "error")
+        self.assertEqual(resultados[pagos[3]["id"]]["resultado"], "error")
+
+    def test_falla_de_perfiles_no_deshace_la_aprobacion(self):
+        pagos = _pagos(3)
+        db = _Supabase(pagos)
+        rebelde = pagos[1]["socio_id"]
+        # Falla el update masivo y, en el reintento, solo el del socio `rebelde`
+        db.fallas.append(("profiles", "update", lambda q: rebelde in q.filtros[0][1]))
+        resultados, aprobados = aprobar_pagos(db, [p["id"] for p in pagos], "admin", COLUMNAS)
+
+        self.assertEqual(len(aprobados), 3)
+        self.assertTrue(all(r["ok"] for r in resultados.values()))
+        self.assertTrue(resultados[pagos[1]["id"]]["perfil_no_actualizado"])
+        self.assertNotIn("perfil_no_actualizado", resultados[pagos[0]["id"]])
+        self.assertEqual(db.tablas["profiles"][pagos[0]["socio_id"]]["estado"], "APROBADO")
+        self.assertEqual(db.tablas["profiles"][rebelde]["estado"], "EN_MORA")
+        self.assertEqual(db.tablas["pagos_cuotas"][pagos[1]["id"]]["estado_pago"], "PAGADO")
+
+
+class TestRechazarPagos(unittest.TestCase):
+
+    def test_resultado_por_pago(self):
+        pendiente, pagado = _pagos(1)[0], _pagos(1, "PAGADO")[0]
+        db = _Supabase([pendiente, pagado])
+        inexistente = _id()
+        resultados, rechazados = rechazar_pagos(db, [pendiente["id"], pagado["id"], inexistente], "ilegible")
+        self.assertEqual(rechazados, 1)
+        self.assertEqual(resultados[pendiente["id"]]["resultado"], "rechazado")
+        self.assertEqual(resultados[pagado["id"]]["resultado"], "estado_invalido")
+        self.assertEqual(resultados[inexistente]["resultado"], "no_encontrado")
+        self.assertEqual(db.tablas["pagos_cuotas"][pendiente["id"]]["motivo_rechazo"], "ilegible")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from datetime import date
+from services.paginacion import CursorInvalidoError
+from services.popularidad import RankingPopularidad, calcular_scores
+
+HOY = date(2026, 10, 19)
+
+
+class TestCalcularScores(unittest.TestCase):
+
+    def test_pesos_y_decaimiento(self):
+        filas = [
+            {"promocion_id": "a", "fecha": "2026-10-19", "tipo_evento": "view", "cantidad": 10},
+            {"promocion_id": "b", "fecha": "2026-10-12", "tipo_evento": "view", "cantidad": 10},
+            {"promocion_id": "c", "fecha": "2026-10-19", "tipo_evento": "favorito", "cantidad": 2},
+            {"promocion_id": "d", "fecha": "2026-10-19", "tipo_evento": "desconocido", "cantidad": 99},
+        ]
+        scores = calcular_scores(filas, HOY, vida_media_dias=7)
+        self.assertAlmostEqual(scores["a"], 11.0)
+        # Una vida media atrás vale la mitad
+        self.assertAlmostEqual(scores["b"], 6.0)
+        self.assertAlmostEqual(scores["c"], 13.0)
+        self.assertNotIn("d", scores)
+
+    def test_boost_destacada(self):
+        filas = [{"promocion_id": "a", "fecha": date(2026, 10, 19), "tipo_evento": "view", "cantidad": 3}]
+        scores = calcular_scores(filas, HOY, destacadas=["a", "sin-trafico"], factor_destacada=2.0)
+        self.assertAlmostEqual(scores["a"], 8.0)
+        self.assertAlmostEqual(scores["sin-trafico"], 2.0)
+
+
+class TestRankingPopularidad(unittest.TestCase):
+
+    def _ofertas(self):
+        return [
+            {"id": f"o{i}", "created_at": f"2026-10-{10 + i:02d}T12:00:00+00:00"}
+            for i in range(6)
+        ]
+
+    def test_ordenar_por_score_y_luego_recientes(self):
+        ranking = RankingPopularidad()
+        ranking.reemplazar({"o1": 5.0, "o3": 9.0})
+        ids = [o["id"] for o in ranking.ordenar(self._ofertas())]
+        self.assertEqual(ids, ["o3", "o1", "o5", "o4", "o2", "o0"])
+        self.assertEqual(ranking.stats()["version"], 1)
+
+    def test_paginacion_keyset(self):
+        ranking = RankingPopularidad()
+        ranking.reemplazar({"o1": 5.0, "o3": 9.0})
+        ordenadas = ranking.ordenar(self._ofertas())
+
+        vistos, cursor = [], None
+        while True:
+            filas, cursor = ranking.pagina(ordenadas, 4, cursor)
+            vistos += [o["id"] for o in filas]
+            if not cursor:
+                break
+        self.assertEqual(vistos, [o["id"] for o in ordenadas])
+
+        with self.assertRaises(CursorInvalidoError):
+            ranking.pagina(ordenadas, 4, "basura")
+
+    def test_listado_se_lee_una_vez_por_version(self):
+        ranking = RankingPopularidad()
+        ranking.reemplazar({"o1": 5.0, "o3": 9.0})
+        lecturas = []
+
+        def cargar():
+            lecturas.append(1)
+            return self._ofertas()
+
+        primera = ranking.listado("Corrientes", cargar, version_ofertas=1)
+        segunda = ranking.listado("Corrientes", cargar, version_ofertas=1)
+        self.assertIs(primera, segunda)
+        self.assertEqual(len(lecturas), 1)
+        self.assertEqual(primera[0]["id"], "o3")
+
+        # Otro municipio, otra versión de ofertas o un ranking nuevo: se relee
+        ranking.listado("Bella Vista", cargar, version_ofertas=1)
+        ranking.listado("Corrientes", cargar, version_ofertas=2)
+        self.assertEqual(len(lecturas), 3)
+        ranking.reemplazar({"o0": 50.0})
+        self.assertEqual(ranking.listado("Corrientes", cargar, version_ofertas=2)[0]["id"], "o0")
+        self.assertEqual(len(lecturas), 4)
+        self.assertEqual(ranking.stats()["listados_hits"], 1)
+
+    def test_listado_respeta_tope_y_ttl(self):
+        ranking = RankingPopularidad(max_listados=2)
+        for municipio in ("a", "b", "c"):
+            ranking.listado(municipio, self._ofertas)
+        self.assertEqual(ranking.stats()["listados"], 2)
+
+        lecturas = []
+        ranking.listado("x", lambda: lecturas.append(1) or self._ofertas(), ttl_seconds=0)
+        ranking.listado("x", lambda: lecturas.append(1) or self._ofertas(), ttl_seconds=0)
+        self.assertEqual(len(lecturas), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+try:
+    from services.recibos import PlantillaRecibo
+    HAY_REPORTLAB = True
+except ImportError:
+    HAY_REPORTLAB = False
+
+DATOS = {
+    "pago_id": "0000-abcdef12",
+    "fecha_pago": "19/10/2026",
+    "nombre_apellido": "Ana Pérez",
+    "dni": "20123456",
+    "periodo": "2026-10",
+    "monto": 15000,
+}
+
+
+@unittest.skipUnless(HAY_REPORTLAB, "reportlab no instalado")
+class TestPlantillaRecibo(unittest.TestCase):
+
+    def test_renderiza_en_memoria(self):
+        pdf = PlantillaRecibo(None).renderizar(DATOS)
+        self.assertTrue(pdf.startswith(b"%PDF"))
+
+    def test_logo_se_decodifica_una_vez(self):
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest("Pillow no instalado")
+        with tempfile.TemporaryDirectory() as d:
+            logo = os.path.join(d, "logo.jpg")
+            Image.new("RGB", (8, 8), "green").save(logo)
+            plantilla = PlantillaRecibo(logo)
+            os.remove(logo)  # los recibos no vuelven a leer el archivo
+            self.assertIsNotNone(plantilla.logo)
+            self.assertTrue(plantilla.renderizar(DATOS).startswith(b"%PDF"))
+
+    def test_logo_inexistente_no_falla(self):
+        plantilla = PlantillaRecibo("/no/existe/logo.jpg")
+        self.assertIsNone(plantilla.logo)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import patch
+from services.reference_data import ReferenceDataCache, normalizar_nombre
+
+
+MUNICIPIOS = [
+    {"id": "m1", "nombre": "Itatí", "activo": True},
+    {"id": "m2", "nombre": "Paso de la Patria", "activo": True},
+    {"id": "m3", "nombre": "Otros", "activo": False},
+]
+
+
+class TestReferenceDataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cargas = 0
+
+        def loader():
+            self.cargas += 1
+            return list(MUNICIPIOS)
+
+        self.cache = ReferenceDataCache(ttl_seconds=60)
+        self.cache.registrar("municipios", loader, indices={"nombre": normalizar_nombre})
+
+    def test_busqueda_sin_acentos_ni_mayusculas(self):
+        self.assertEqual(self.cache.buscar("municipios", "nombre", "ITATI")["id"], "m1")
+        self.assertEqual(self.cache.buscar("municipios", "nombre", "  paso de  la patria ")["id"], "m2")
+        self.assertIsNone(self.cache.buscar("municipios", "nombre", "Corrientes"))
+        self.assertEqual(self.cargas, 1)
+
+    def test_recarga_por_ttl_e_invalidacion(self):
+        with patch("services.reference_data.time.monotonic", return_value=1000.0):
+            self.cache.filas("municipios")
+            self.cache.filas("municipios")
+        self.assertEqual(self.cargas, 1)
+        with patch("services.reference_data.time.monotonic", return_value=1061.0):
+            self.cache.filas("municipios")
+        self.assertEqual(self.cargas, 2)
+
+        self.cache.invalidar("municipios")
+        self.cache.filas("municipios")
+        self.assertEqual(self.cargas, 3)
+
+    def test_falla_de_recarga_mantiene_datos_previos(self):
+        self.cache.filas("municipios")
+        self.cache.registrar("fallida", lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            self.cache.filas("fallida")
+
+        def roto():
+            raise ConnectionError("supabase caído")
+
+        self.cache._tablas["municipios"].loader = roto
+        self.cache.invalidar("municipios")
+        self.assertEqual(len(self.cache.filas("municipios")), 3)
+        self.assertEqual(self.cache.stats()["municipios"]["errores"], 1)
+
+    def test_refrescar_y_precargar(self):
+        self.cache.precargar()
+        self.assertEqual(self.cargas, 1)
+        self.assertEqual(self.cache.refrescar(), {"municipios": 3})
+        self.assertEqual(self.cargas, 2)
+        with self.assertRaises(KeyError):
+            self.cache.refrescar("inexistente")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import importlib.util
+import unittest
+from services.reporte_pdf import fila_pdf, hash_contenido, generar_pdf_socios
+
+HAY_REPORTLAB = importlib.util.find_spec("reportlab") is not None
+
+
+class TestReportePdf(unittest.TestCase):
+
+    def test_fila_sin_nones(self):
+        self.assertEqual(
+            fila_pdf({"nombre_apellido": "Ana", "dni": 123, "estado": None}),
+            ["Ana", "123", "-", "-", "No especificado"],
+        )
+
+    def test_hash_por_contenido_y_dia(self):
+        filas = [["Ana", "1", "APROBADO", "-", "Corrientes"]]
+        base = hash_contenido(filas, "2026-10-19")
+        self.assertEqual(base, hash_contenido([list(f) for f in filas], "2026-10-19"))
+        self.assertNotEqual(base, hash_contenido(filas, "2026-10-20"))
+        self.assertNotEqual(base, hash_contenido([["Ana", "1", "PENDIENTE", "-", "Corrientes"]], "2026-10-19"))
+        # Sin ambigüedad al concatenar celdas
+        self.assertNotEqual(hash_contenido([["ab", "c"]], "d"), hash_contenido([["a", "bc"]], "d"))
+
+    @unittest.skipUnless(HAY_REPORTLAB, "reportlab no instalado")
+    def test_pdf_en_tramos(self):
+        filas = [[f"Socio {i}", str(i), "APROBADO", "-", "Corrientes"] for i in range(120)]
+        pdf = generar_pdf_socios(filas, "19/10/2026 10:00", None, filas_por_tabla=25)
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        # Padrón vacío: solo el encabezado de la tabla
+        self.assertTrue(generar_pdf_socios([], "19/10/2026 10:00").startswith(b"%PDF"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import csv
+import io
+import unittest
+from datetime import datetime
+from services import reportes
+from services.reportes import clasificar_perfil, generar_csv_contabilidad, escribir_xlsx_socios, estimar_anchos
+
+try:
+    import openpyxl
+    HAY_OPENPYXL = True
+except ImportError:
+    HAY_OPENPYXL = False
+
+
+def _leer(bloques):
+    datos = b"".join(bloques)
+    return datos, list(csv.reader(io.StringIO(datos.decode("utf-8-sig")), delimiter=";"))
+
+
+class TestClasificarPerfil(unittest.TestCase):
+
+    def test_categorias(self):
+        self.assertEqual(clasificar_perfil({"es_empleado_comercial": True}), ("Empleados", "Empleado Comercial"))
+        self.assertEqual(clasificar_perfil({"es_empleado_comercial": True, "activo_empleado": False}), ("Socio Común", "Socio Común"))
+        self.assertEqual(clasificar_perfil({"rol": "COMERCIO"}), ("Comercial", "Comercio"))
+        self.assertEqual(clasificar_perfil({"rol": "COMERCIO", "titular_id": "x"}), ("Empleados", "Empleado Comercial"))
+        self.assertEqual(clasificar_perfil({"titular_id": "x", "es_profesional": True}), ("Grupo Familiar", "Familiar (Adherente)"))
+        self.assertEqual(clasificar_perfil({"es_profesional": True}), ("Profesional", "Profesional"))
+
+
+class TestCsvContabilidad(unittest.TestCase):
+
+    def test_detalle_y_resumen(self):
+        perfiles = [
+            {"nombre_apellido": "Ana; Pérez", "estado": "APROBADO", "created_at": "2026-01-02T10:00:00Z"},
+            {"nombre_apellido": "Comercio SA", "rol": "COMERCIO", "estado": "PENDIENTE", "created_at": None},
+        ]
+        datos, filas = _leer(generar_csv_contabilidad(perfiles, datetime(2026, 3, 4, 5, 6, 7)))
+
+        self.assertTrue(datos.startswith(b"\xef\xbb\xbf"))
+        self.assertFalse(datos[3:].startswith(b"\xef\xbb\xbf"))  # un solo BOM
+        self.assertEqual(filas[1], ["Fecha de Generación", "04/03/2026 05:06:07"])
+        self.assertEqual(filas[5][0], "Ana; Pérez")
+        self.assertEqual(filas[5][4], "Socio Común")
+        self.assertEqual(filas[5][7], "02/01/2026")
+        self.assertEqual(filas[6][4], "Comercio")
+        self.assertEqual(filas[6][7], "-")
+        resumen = dict(f for f in filas[filas.index(["Categoría", "Cantidad"]) + 1:])
+        self.assertEqual(resumen["Socio Común"], "1")
+        self.assertEqual(resumen["Comercial"], "1")
+        self.assertEqual(resumen["Total General (Al día)"], "1")
+
+    def test_emite_por_bloques_sin_acumular(self):
+        consumidos = []
+
+        def perfiles():
+            for i in range(2000):
+                consumidos.append(i)
+                yield {"nombre_apellido": f"Socio {i}" + "x" * 100}
+
+        original = reportes.TAM_BLOQUE
+        reportes.TAM_BLOQUE = 4096
+        try:
+            gen = generar_csv_contabilidad(perfiles(), datetime(2026, 1, 1))
+            next(gen)  # encabezado antes de leer perfiles
+            self.assertEqual(consumidos, [])
+            segundo = next(gen)
+            self.assertLess(len(consumidos), 2000)
+            self.assertLess(len(segundo), 4096 + 512)
+            list(gen)
+        finally:
+            reportes.TAM_BLOQUE = original
+
+    def test_error_a_mitad_deja_constancia(self):
+        def perfiles():
+            yield {"nombre_apellido": "Ana"}
+            raise ConnectionError("base caída")
+
+        _, filas = _leer(generar_csv_contabilidad(perfiles(), datetime(2026, 1, 1)))
+        self.assertIn(["ERROR: reporte incompleto, volver a generarlo"], filas)
+        self.assertNotIn(["RESUMEN DE CATEGORÍAS"], filas)
+
+
+class TestXlsxSocios(unittest.TestCase):
+
+    def test_estimar_anchos(self):
+        self.assertEqual(estimar_anchos(["DNI", "Email"], [["1", None], ["12345", "x" * 80]]), [7, 50])
+
+    @unittest.skipUnless(HAY_OPENPYXL, "openpyxl no instalado")
+    def test_planilla(self):
+        perfiles = ({"nombre_apellido": f"Socio {i}", "dni": str(i), "created_at": "2026-01-02T10:00:00+00:00"} for i in range(30))
+        destino = io.BytesIO()
+        self.assertEqual(escribir_xlsx_socios(perfiles, destino, tam_muestra=10), 30)
+
+        ws = openpyxl.load_workbook(destino)["Socios"]
+        filas = list(ws.iter_rows(values_only=True))
+        self.assertEqual(filas[0][0], "Nombre y Apellido")
+        self.assertEqual(len(filas), 31)
+        self.assertEqual(filas[30][:2], ("Socio 29", "29"))
+        self.assertEqual(filas[1][6], "02/01/2026")
+        self.assertEqual(ws.column_dimensions["A"].width, len("Nombre y Apellido") + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import time
+import tempfile
+import threading
+import unittest
+from services.almacen_reportes import AlmacenLocal
+from services.reportes_jobs import ContadorFilas, PoolReportes, clave_job, ejecutar_reporte
+
+
+class TestAlmacenLocal(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.almacen = AlmacenLocal(self._dir.name, "/api/admin/reports/archivos", "secreto")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_guardar_leer_y_url_firmada(self):
+        self.almacen.guardar("jobs/x/1.csv", io.BytesIO(b"a;b\n"), "text/csv")
+        self.assertEqual(self.almacen.leer("jobs/x/1.csv"), b"a;b\n")
+        self.assertIsNone(self.almacen.leer("jobs/x/2.csv"))
+
+        url = self.almacen.url_descarga("jobs/x/1.csv", 60)
+        self.assertTrue(url.startswith("/api/admin/reports/archivos/jobs/x/1.csv?"))
+        params = dict(p.split("=") for p in url.split("?")[1].split("&"))
+        expira, firma = int(params["expira"]), params["firma"]
+        self.assertIsNotNone(self.almacen.verificar("jobs/x/1.csv", expira, firma))
+        self.assertIsNone(self.almacen.verificar("jobs/x/1.csv", expira + 1, firma))
+        self.assertIsNone(self.almacen.verificar("jobs/x/1.csv", int(time.time()) - 1, self.almacen._firma("jobs/x/1.csv", int(time.time()) - 1)))
+
+    def test_no_sale_del_directorio(self):
+        with self.assertRaises(ValueError):
+            self.almacen.guardar("../fuera.csv", io.BytesIO(b"x"), "text/csv")
+        self.assertIsNone(self.almacen.leer("../../etc/passwd"))
+
+
+class TestReportesJobs(unittest.TestCase):
+
+    def test_clave_ignora_orden_y_nulos(self):
+        self.assertEqual(
+            clave_job("socios_excel", {"municipio": "Corrientes", "estado": None}),
+            clave_job("socios_excel", {"municipio": "Corrientes"}),
+        )
+        self.assertEqual(clave_job("a", {"x": 1, "y": 2}), clave_job("a", {"y": 2, "x": 1}))
+        self.assertNotEqual(clave_job("socios_excel", {}), clave_job("socios_pdf", {}))
+
+    def test_ejecutar_reporte_mide_y_guarda(self):
+        with tempfile.TemporaryDirectory() as d:
+            almacen = AlmacenLocal(d, "/x", "s")
+
+            def generar(archivo):
+                filas = ContadorFilas(range(3))
+                for i in filas:
+                    archivo.write(f"{i}\n".encode())
+                return filas.n
+
+            metricas = ejecutar_reporte(generar, almacen, "jobs/r.csv", "text/csv", spool_max_bytes=4)
+            self.assertEqual(metricas["filas"], 3)
+            self.assertEqual(metricas["bytes"], 6)
+            self.assertGreaterEqual(metricas["duracion_ms"], 0)
+            self.assertEqual(almacen.leer("jobs/r.csv"), b"0\n1\n2\n")
+
+    def test_pool_acotado(self):
+        pool = PoolReportes(max_workers=1, max_pendientes=2)
+        liberar = threading.Event()
+        hechos = []
+        try:
+            self.assertTrue(pool.enviar(lambda: (liberar.wait(2), hechos.append(1))))
+            self.assertTrue(pool.enviar(lambda: hechos.append(2)))
+            self.assertFalse(pool.enviar(lambda: hechos.append(3)))
+            self.assertEqual(pool.stats()["rechazados"], 1)
+            liberar.set()
+            limite = time.monotonic() + 2
+            while pool.stats()["pendientes"] and time.monotonic() < limite:
+                time.sleep(0.01)
+            self.assertEqual(hechos, [1, 2])
+            self.assertTrue(pool.enviar(lambda: None))
+        finally:
+            liberar.set()
+            pool.cerrar()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from services.response_cache import VersionedResponseCache, etag_coincide
+
+
+class TestVersionedResponseCache(unittest.TestCase):
+
+    def test_hit_y_etag_estable(self):
+        cache = VersionedResponseCache()
+        llamadas = []
+        loader = lambda: llamadas.append(1) or {"ofertas": [{"id": 1, "titulo": "Descuento"}]}
+
+        a = cache.get_or_load("ofertas:*", loader)
+        b = cache.get_or_load("ofertas:*", loader)
+        self.assertEqual(len(llamadas), 1)
+        self.assertIs(a, b)
+        self.assertEqual(json.loads(a.body), {"ofertas": [{"id": 1, "titulo": "Descuento"}]})
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_bump_invalida_todas_las_claves(self):
+        cache = VersionedResponseCache()
+        cache.set("ofertas:Posadas", {"ofertas": []})
+        cache.set("oferta:1", {"oferta": {}})
+        cache.bump()
+        self.assertIsNone(cache.get("ofertas:Posadas"))
+        self.assertIsNone(cache.get("oferta:1"))
+        self.assertEqual(cache.stats()["version"], 1)
+
+    def test_carga_concurrente_con_bump_nace_vencida(self):
+        cache = VersionedResponseCache()
+
+        def loader():
+            cache.bump()  # una escritura ocurre mientras se consulta la base
+            return {"ofertas": ["viejo"]}
+
+        cache.get_or_load("ofertas:*", loader)
+        self.assertIsNone(cache.get("ofertas:*"))
+
+    def test_ttl(self):
+        cache = VersionedResponseCache(ttl_seconds=60)
+        with patch("services.response_cache.time.monotonic", return_value=1000.0):
+            cache.set("k", {"a": 1})
+        with patch("services.response_cache.time.monotonic", return_value=1061.0):
+            self.assertIsNone(cache.get("k"))
+
+    def test_una_sola_carga_con_requests_simultaneos(self):
+        cache = VersionedResponseCache()
+        llamadas = []
+
+        def loader():
+            llamadas.append(1)
+            time.sleep(0.05)
+            return {"ok": True}
+
+        hilos = [threading.Thread(target=cache.get_or_load, args=("k", loader)) for _ in range(8)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        self.assertEqual(len(llamadas), 1)
+
+    def test_error_del_loader_no_se_cachea(self):
+        cache = VersionedResponseCache()
+
+        def falla():
+            raise ValueError("no encontrada")
+
+        with self.assertRaises(ValueError):
+            cache.get_or_load("oferta:x", falla)
+        self.assertEqual(cache.stats()["entradas"], 0)
+
+    def test_get_many_or_load_una_sola_carga(self):
+        cache = VersionedResponseCache()
+        cache.set("t:1", {"id": 1})
+        pedidas = []
+
+        def loader(claves):
+            pedidas.append(list(claves))
+            return {"t:2": {"id": 2}}
+
+        res = cache.get_many_or_load(["t:1", "t:2", "t:3"], loader)
+        self.assertEqual(pedidas, [["t:2", "t:3"]])
+        self.assertEqual(res["t:2"].body, b'{"id":2}')
+        # Las faltantes en la base quedan cacheadas como null
+        self.assertEqual(res["t:3"].body, b"null")
+        cache.get_many_or_load(["t:1", "t:2", "t:3"], loader)
+        self.assertEqual(len(pedidas), 1)
+
+    def test_if_none_match(self):
+        etag = '"abc"'
+        self.assertTrue(etag_coincide('"abc"', etag))
+        self.assertTrue(etag_coincide('"zzz", W/"abc"', etag))
+        self.assertTrue(etag_coincide("*", etag))
+        self.assertFalse(etag_coincide('"zzz"', etag))
+        self.assertFalse(etag_coincide(None, etag))
+
+
+if __name__ == '__main__':
+    unittest.main()
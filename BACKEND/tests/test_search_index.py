@@ -0,0 +1,76 @@
+import unittest
+from services.search_index import SearchIndex, analizar, stem
+
+
+def _indice():
+    idx = SearchIndex()
+    idx.upsert("oferta", 1, [("20% en Veterinarias del Norte", 3.0), ("alimento balanceado", 1.0)], {"titulo": "Vet"})
+    idx.upsert("oferta", 2, [("Remate de tomates", 3.0), ("Verdulería", 2.0)], {"titulo": "Tomates"})
+    idx.upsert("comercio", "c1", [("Ferretería El Campo", 3.0), ("ferretería", 2.0)], {"titulo": "Ferretería"})
+    idx.upsert("profesional", "p1", [("Juan Pérez", 3.0), ("Veterinario", 2.0), ("MP-1234", 2.0)], {"titulo": "Juan"})
+    idx.upsert("evento", "e1", [("Gran remate ganadero", 3.0), ("Predio Itatí", 2.0)], {"titulo": "Remate"})
+    return idx
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def test_analisis(self):
+        self.assertEqual(stem("remates"), stem("remate"))
+        self.assertEqual(stem("veterinarias"), stem("veterinario"))
+        self.assertEqual(stem("animales"), "animal")
+        self.assertEqual(analizar("¡Descuentos en la Ferretería!"), ["descuent", "ferreteri"])
+
+    def test_acentos_raices_y_prefijos(self):
+        idx = _indice()
+        ids = {(r["tipo"], r["id"]) for r in idx.buscar("veterinario")["resultados"]}
+        self.assertEqual(ids, {("oferta", "1"), ("profesional", "p1")})
+
+        self.assertEqual(idx.buscar("ferreteria")["resultados"][0]["id"], "c1")
+        self.assertEqual(idx.buscar("itati")["resultados"][0]["id"], "e1")
+        # Prefijo mientras se escribe
+        self.assertEqual(idx.buscar("toma")["resultados"][0]["id"], "2")
+        self.assertEqual(idx.buscar("mp 1234")["resultados"][0]["id"], "p1")
+
+    def test_and_ranking_y_filtro_por_tipo(self):
+        idx = _indice()
+        res = idx.buscar("remate")
+        self.assertEqual(res["total"], 2)
+        self.assertEqual(idx.buscar("remate tomates")["total"], 1)
+        self.assertEqual(idx.buscar("remate", tipos=["evento"])["resultados"][0]["id"], "e1")
+        self.assertEqual(idx.buscar("inexistente")["total"], 0)
+
+    def test_paginacion(self):
+        idx = SearchIndex()
+        for i in range(30):
+            idx.upsert("oferta", i, [(f"descuento semillas lote {i}", 1.0)], {})
+        primera = idx.buscar("semillas", limit=10)
+        segunda = idx.buscar("semillas", limit=10, offset=10)
+        self.assertEqual(primera["total"], 30)
+        self.assertEqual(len(segunda["resultados"]), 10)
+        self.assertFalse({r["id"] for r in primera["resultados"]} & {r["id"] for r in segunda["resultados"]})
+
+    def test_actualizacion_incremental(self):
+        idx = _indice()
+        idx.upsert("oferta", 2, [("Remate de zapallos", 3.0)], {})
+        self.assertEqual(idx.buscar("tomates")["total"], 0)
+        self.assertEqual(idx.buscar("zapallos")["total"], 1)
+        idx.eliminar("oferta", 2)
+        self.assertEqual(idx.buscar("zapallos")["total"], 0)
+        self.assertNotIn("zapall", idx._estado.vocab)
+
+    def test_reconstruir_conserva_cambios_concurrentes(self):
+        idx = _indice()
+
+        def documentos():
+            yield ("oferta", 1, [("Veterinarias", 3.0)], {})
+            # Un upsert incremental llega mientras se recorre la base
+            idx.upsert("oferta", 99, [("Oferta nueva de maíz", 3.0)], {})
+            yield ("oferta", 2, [("Remate de tomates", 3.0)], {})
+
+        self.assertEqual(idx.reconstruir(documentos()), 3)
+        self.assertEqual(idx.buscar("maiz")["resultados"][0]["id"], "99")
+        self.assertEqual(idx.buscar("ferreteria")["total"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
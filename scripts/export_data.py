@@ -1,9 +1,15 @@
 import os
+import sys
 import json
+import textwrap
 from datetime import datetime
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "BACKEND"))
+
+from services.paginacion import LectorKeyset
+
 # Cargar variables de entorno desde el Backend
 load_dotenv('../BACKEND/.env')
 
@@ -31,6 +37,28 @@ TABLES = [
     "localidades"
 ]
 
+TAM_PAGINA = int(os.environ.get("LECTURA_MASIVA_TAM_PAGINA", "1000"))
+
+
+def exportar_tabla(table: str, destino: str) -> dict:
+    """
+    Escribe la tabla como un array JSON, fila por fila, leyendo por páginas
+    (keyset por id) para no quedar truncada en max-rows ni cargarla entera.
+    """
+    lector = LectorKeyset(
+        lambda: supabase.table(table).select("*"),
+        tamano_pagina=TAM_PAGINA,
+        prefetch=True,
+        nombre=f"export_data.{table}",
+    )
+    with open(destino, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, fila in enumerate(lector):
+            f.write(",\n" if i else "\n")
+            f.write(textwrap.indent(json.dumps(fila, indent=2, ensure_ascii=False), "  "))
+        f.write("\n]\n" if lector.filas else "]\n")
+    return lector.stats()
+
 def backup_database():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_path = f"backup_{timestamp}"
@@ -43,12 +71,8 @@ def backup_database():
     for table in TABLES:
         try:
             print(f"Exportando tabla: {table}...", end=" ", flush=True)
-            response = supabase.table(table).select("*").execute()
-            
-            with open(os.path.join(backup_path, f"{table}.json"), "w", encoding="utf-8") as f:
-                json.dump(response.data, f, indent=2, ensure_ascii=False)
-            
-            print("OK")
+            stats = exportar_tabla(table, os.path.join(backup_path, f"{table}.json"))
+            print(f"OK ({stats['filas']} filas, {stats['paginas']} páginas, {stats['latencia_ms_total']:.0f} ms)")
         except Exception as e:
             print(f"ERROR: {str(e)}")
 
@@ -0,0 +1,11 @@
+-- Migration: Resumen rodante de conversaciones de SapucAI
+-- El backend guarda el resumen de los mensajes antiguos como un registro más
+-- de chat_history con role = 'system' y metadata.tipo = 'resumen'.
+
+ALTER TABLE chat_history DROP CONSTRAINT IF EXISTS chat_history_role_check;
+ALTER TABLE chat_history
+ADD CONSTRAINT chat_history_role_check CHECK (role IN ('user', 'assistant', 'system'));
+
+-- Lectura de los últimos mensajes por usuario (/api/chat)
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_created
+    ON chat_history (user_id, created_at DESC);
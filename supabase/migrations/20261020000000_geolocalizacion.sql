@@ -0,0 +1,32 @@
+-- Migration: Geolocalización de ofertas y comercios (búsqueda "cerca mío")
+-- Las coordenadas se completan en el backend al crear/editar ofertas, a partir
+-- de `ubicacion` (coordenadas o link de mapas) o del centroide del municipio.
+-- Backfill: python BACKEND/scripts/geocodificar.py
+
+ALTER TABLE promociones
+ADD COLUMN IF NOT EXISTS latitud DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS longitud DOUBLE PRECISION;
+
+ALTER TABLE comercios
+ADD COLUMN IF NOT EXISTS latitud DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS longitud DOUBLE PRECISION;
+
+ALTER TABLE municipios
+ADD COLUMN IF NOT EXISTS latitud DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS longitud DOUBLE PRECISION;
+
+-- Centroides aproximados de los municipios cargados por seed_municipios.py
+UPDATE municipios AS m
+SET latitud = c.latitud, longitud = c.longitud
+FROM (VALUES
+    ('Capital',           -27.4692, -58.8306),
+    ('San Cosme',         -27.3711, -58.5119),
+    ('Santa Ana',         -27.4557, -58.6539),
+    ('Itatí',             -27.2706, -58.2442),
+    ('Ituzaingó',         -27.5845, -56.6880),
+    ('Ramada Paso',       -27.3667, -58.3000),
+    ('Riachuelo',         -27.5815, -58.7444),
+    ('El Sombrero',       -27.7044, -58.7664),
+    ('Paso de la Patria', -27.3167, -58.5722)
+) AS c(nombre, latitud, longitud)
+WHERE m.nombre = c.nombre AND m.latitud IS NULL;
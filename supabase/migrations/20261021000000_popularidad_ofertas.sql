@@ -0,0 +1,105 @@
+-- Migration: Ranking de popularidad de ofertas
+-- Agregados diarios de promociones_analytics, marca de agua del job y puntaje
+-- precalculado por oferta para ordenar el feed público (sort=popular).
+
+-- 1. Agregados diarios por (oferta, día, tipo de evento)
+CREATE TABLE IF NOT EXISTS promociones_analytics_diario (
+    promocion_id UUID REFERENCES promociones(id) ON DELETE CASCADE,
+    comercio_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+    fecha DATE NOT NULL,
+    tipo_evento VARCHAR(50) NOT NULL,
+    cantidad INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (promocion_id, fecha, tipo_evento)
+);
+
+CREATE INDEX IF NOT EXISTS idx_analytics_diario_comercio_fecha
+    ON promociones_analytics_diario (comercio_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_analytics_diario_fecha
+    ON promociones_analytics_diario (fecha);
+
+-- El job lee los eventos crudos por rango de created_at
+CREATE INDEX IF NOT EXISTS idx_promociones_analytics_created_at
+    ON promociones_analytics (created_at);
+
+ALTER TABLE promociones_analytics_diario ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Comercios pueden ver sus analytics diarios"
+    ON promociones_analytics_diario FOR SELECT
+    USING (auth.uid() = comercio_id);
+
+-- 2. Marcas de agua de jobs incrementales
+CREATE TABLE IF NOT EXISTS jobs_watermarks (
+    job TEXT PRIMARY KEY,
+    marca TIMESTAMP WITH TIME ZONE NOT NULL,
+    actualizado_en TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now())
+);
+
+ALTER TABLE jobs_watermarks ENABLE ROW LEVEL SECURITY;
+
+-- 3. Puntaje de popularidad precalculado
+CREATE TABLE IF NOT EXISTS promociones_popularidad (
+    promocion_id UUID PRIMARY KEY REFERENCES promociones(id) ON DELETE CASCADE,
+    score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    actualizado_en TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now())
+);
+
+ALTER TABLE promociones_popularidad ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Public puede ver la popularidad"
+    ON promociones_popularidad FOR SELECT
+    USING (true);
+
+-- 4. Acumula los eventos crudos en (marca de agua, p_hasta] y avanza la marca
+-- en la misma transacción. FOR UPDATE serializa corridas concurrentes (varios
+-- workers), así ningún evento se cuenta dos veces. Los días se cortan en hora
+-- argentina.
+CREATE OR REPLACE FUNCTION acumular_analytics_diario(p_hasta TIMESTAMP WITH TIME ZONE)
+RETURNS TABLE (eventos BIGINT, desde TIMESTAMP WITH TIME ZONE, hasta TIMESTAMP WITH TIME ZONE)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_desde TIMESTAMP WITH TIME ZONE;
+    v_eventos BIGINT := 0;
+BEGIN
+    INSERT INTO jobs_watermarks (job, marca)
+    VALUES ('analytics_diario', '-infinity')
+    ON CONFLICT (job) DO NOTHING;
+
+    SELECT w.marca INTO v_desde
+    FROM jobs_watermarks w
+    WHERE w.job = 'analytics_diario'
+    FOR UPDATE;
+
+    IF p_hasta > v_desde THEN
+        WITH nuevos AS (
+            SELECT a.promocion_id,
+                   max(a.comercio_id::text)::uuid AS comercio_id,
+                   (a.created_at AT TIME ZONE 'America/Argentina/Buenos_Aires')::date AS fecha,
+                   a.tipo_evento,
+                   count(*) AS cantidad
+            FROM promociones_analytics a
+            WHERE a.created_at > v_desde
+              AND a.created_at <= p_hasta
+              AND a.promocion_id IS NOT NULL
+            GROUP BY a.promocion_id, 3, a.tipo_evento
+        ), acumulados AS (
+            INSERT INTO promociones_analytics_diario AS d
+                (promocion_id, comercio_id, fecha, tipo_evento, cantidad)
+            SELECT promocion_id, comercio_id, fecha, tipo_evento, cantidad FROM nuevos
+            ON CONFLICT (promocion_id, fecha, tipo_evento)
+            DO UPDATE SET cantidad = d.cantidad + EXCLUDED.cantidad,
+                          comercio_id = COALESCE(d.comercio_id, EXCLUDED.comercio_id)
+        )
+        -- El INSERT del CTE se ejecuta aunque no se lo referencie
+        SELECT COALESCE(sum(cantidad), 0) INTO v_eventos FROM nuevos;
+
+        UPDATE jobs_watermarks
+        SET marca = p_hasta, actualizado_en = timezone('utc'::text, now())
+        WHERE job = 'analytics_diario';
+    END IF;
+
+    RETURN QUERY SELECT v_eventos, v_desde, GREATEST(v_desde, p_hasta);
+END;
+$$;
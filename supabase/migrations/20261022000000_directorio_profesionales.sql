@@ -0,0 +1,26 @@
+-- Migration: Vista del directorio público de profesionales
+-- Une profiles con profesionales (matrícula) en una sola consulta para
+-- GET /api/profesionales. Solo expone campos no sensibles de profesionales
+-- aprobados. security_invoker: respeta el RLS de las tablas base.
+
+CREATE OR REPLACE VIEW profesionales_directorio
+WITH (security_invoker = true) AS
+SELECT
+    p.id,
+    p.nombre_apellido,
+    p.rubro,
+    p.municipio,
+    p.provincia,
+    p.telefono,
+    p.direccion,
+    pr.matricula
+FROM profiles p
+LEFT JOIN profesionales pr ON pr.id = p.id
+WHERE p.rol = 'SOCIO'
+  AND p.es_profesional = true
+  AND p.estado = 'APROBADO';
+
+-- Orden del listado y filtro por municipio
+CREATE INDEX IF NOT EXISTS idx_profiles_profesionales_directorio
+    ON profiles (municipio, nombre_apellido, id)
+    WHERE rol = 'SOCIO' AND es_profesional = true AND estado = 'APROBADO';
@@ -0,0 +1,76 @@
+-- Migration: Métricas de comercio desde los agregados diarios
+-- mis-metricas deja de descargar eventos crudos: lee promociones_analytics_diario
+-- más los eventos crudos posteriores a la marca de agua (lo que todavía no se
+-- acumuló, típicamente los últimos minutos). Ambas partes se leen en una sola
+-- sentencia, así el corte de la marca es consistente aunque el job corra a la vez.
+-- Los eventos crudos ya acumulados y más viejos que la retención se purgan en lotes.
+
+CREATE INDEX IF NOT EXISTS idx_promociones_analytics_comercio_created_at
+    ON promociones_analytics (comercio_id, created_at);
+
+CREATE OR REPLACE FUNCTION metricas_comercio(p_comercio_id UUID, p_desde DATE)
+RETURNS TABLE (promocion_id UUID, tipo_evento VARCHAR, cantidad BIGINT)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH marca AS (
+        SELECT COALESCE(
+            (SELECT w.marca FROM jobs_watermarks w WHERE w.job = 'analytics_diario'),
+            '-infinity'::timestamptz
+        ) AS valor
+    )
+    SELECT t.promocion_id, t.tipo_evento, sum(t.cantidad)::bigint
+    FROM (
+        SELECT d.promocion_id, d.tipo_evento, d.cantidad::bigint AS cantidad
+        FROM promociones_analytics_diario d
+        WHERE d.comercio_id = p_comercio_id
+          AND d.fecha >= p_desde
+        UNION ALL
+        SELECT a.promocion_id, a.tipo_evento, 1::bigint
+        FROM promociones_analytics a, marca m
+        WHERE a.comercio_id = p_comercio_id
+          AND a.created_at > m.valor
+          AND (a.created_at AT TIME ZONE 'America/Argentina/Buenos_Aires')::date >= p_desde
+    ) t
+    GROUP BY t.promocion_id, t.tipo_evento;
+$$;
+
+-- Borra hasta p_lote eventos crudos anteriores a p_antes que ya estén
+-- acumulados (anteriores a la marca de agua). Retorna cuántos borró.
+CREATE OR REPLACE FUNCTION purgar_analytics_crudos(p_antes TIMESTAMP WITH TIME ZONE, p_lote INTEGER DEFAULT 5000)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_marca TIMESTAMP WITH TIME ZONE;
+    v_borrados INTEGER;
+BEGIN
+    SELECT w.marca INTO v_marca FROM jobs_watermarks w WHERE w.job = 'analytics_diario';
+    IF v_marca IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    DELETE FROM promociones_analytics
+    WHERE id IN (
+        SELECT a.id
+        FROM promociones_analytics a
+        WHERE a.created_at < LEAST(p_antes, v_marca)
+        ORDER BY a.created_at
+        LIMIT p_lote
+    );
+    GET DIAGNOSTICS v_borrados = ROW_COUNT;
+    RETURN v_borrados;
+END;
+$$;
+
+-- Solo el backend (service_role) ejecuta las funciones de analytics
+REVOKE EXECUTE ON FUNCTION acumular_analytics_diario(TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION metricas_comercio(UUID, DATE) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION purgar_analytics_crudos(TIMESTAMP WITH TIME ZONE, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION acumular_analytics_diario(TIMESTAMP WITH TIME ZONE) TO service_role;
+GRANT EXECUTE ON FUNCTION metricas_comercio(UUID, DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION purgar_analytics_crudos(TIMESTAMP WITH TIME ZONE, INTEGER) TO service_role;
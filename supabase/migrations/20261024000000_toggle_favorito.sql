@@ -0,0 +1,34 @@
+-- Migration: Toggle atómico de favoritos
+-- Reemplaza SELECT + DELETE/INSERT desde el backend por una sola llamada.
+-- Si el favorito existe lo borra; si no, lo inserta apoyándose en
+-- UNIQUE(usuario_id, promocion_id). Retorna el estado final (true = favorito).
+
+CREATE OR REPLACE FUNCTION toggle_favorito(p_usuario_id UUID, p_promocion_id UUID)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_borrados INTEGER;
+BEGIN
+    DELETE FROM favoritos
+    WHERE usuario_id = p_usuario_id AND promocion_id = p_promocion_id;
+    GET DIAGNOSTICS v_borrados = ROW_COUNT;
+    IF v_borrados > 0 THEN
+        RETURN false;
+    END IF;
+
+    INSERT INTO favoritos (usuario_id, promocion_id)
+    VALUES (p_usuario_id, p_promocion_id)
+    ON CONFLICT (usuario_id, promocion_id) DO NOTHING;
+    RETURN true;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION toggle_favorito(UUID, UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION toggle_favorito(UUID, UUID) TO service_role;
+
+-- Lectura de los favoritos de un usuario, más reciente primero
+CREATE INDEX IF NOT EXISTS idx_favoritos_usuario_created_at
+    ON favoritos (usuario_id, created_at DESC);
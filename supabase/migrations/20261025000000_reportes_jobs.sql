@@ -0,0 +1,79 @@
+-- Migration: Trabajos de reportes asincrónicos
+-- Los reportes administrativos (Excel de socios, CSV de contabilidad, PDF
+-- estatutario) se encolan y se generan en segundo plano; el archivo queda en
+-- storage y el cliente consulta el estado hasta que está listo.
+-- Cada trabajo registra filas, bytes y duración para planificar capacidad.
+
+CREATE TABLE IF NOT EXISTS reportes_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    tipo VARCHAR(50) NOT NULL,
+    parametros JSONB NOT NULL DEFAULT '{}'::jsonb,
+    -- Hash de (tipo, parametros): dos pedidos iguales comparten el trabajo activo
+    clave TEXT NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'PENDIENTE'
+        CHECK (estado IN ('PENDIENTE', 'PROCESANDO', 'LISTO', 'ERROR')),
+    solicitado_por UUID REFERENCES auth.users(id) ON DELETE SET NULL,
+    path TEXT,
+    filas INTEGER,
+    bytes BIGINT,
+    duracion_ms INTEGER,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()),
+    iniciado_en TIMESTAMP WITH TIME ZONE,
+    finalizado_en TIMESTAMP WITH TIME ZONE
+);
+
+-- A lo sumo un trabajo activo por clave
+CREATE UNIQUE INDEX IF NOT EXISTS uq_reportes_jobs_clave_activa
+    ON reportes_jobs (clave)
+    WHERE estado IN ('PENDIENTE', 'PROCESANDO');
+
+CREATE INDEX IF NOT EXISTS idx_reportes_jobs_created_at
+    ON reportes_jobs (created_at DESC);
+
+ALTER TABLE reportes_jobs ENABLE ROW LEVEL SECURITY;
+
+-- Encola un trabajo o devuelve el activo con la misma clave.
+-- Los activos creados antes de p_vencido_antes se consideran abandonados
+-- (p.ej. el proceso que los generaba se reinició) y se marcan ERROR.
+CREATE OR REPLACE FUNCTION encolar_reporte_job(
+    p_tipo VARCHAR,
+    p_parametros JSONB,
+    p_clave TEXT,
+    p_solicitado_por UUID,
+    p_vencido_antes TIMESTAMPTZ
+)
+RETURNS TABLE (id UUID, estado VARCHAR, nuevo BOOLEAN)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_id UUID;
+BEGIN
+    UPDATE reportes_jobs j
+    SET estado = 'ERROR', error = 'abandonado', finalizado_en = now()
+    WHERE j.clave = p_clave
+      AND j.estado IN ('PENDIENTE', 'PROCESANDO')
+      AND j.created_at < p_vencido_antes;
+
+    INSERT INTO reportes_jobs (tipo, parametros, clave, solicitado_por)
+    VALUES (p_tipo, p_parametros, p_clave, p_solicitado_por)
+    ON CONFLICT (clave) WHERE reportes_jobs.estado IN ('PENDIENTE', 'PROCESANDO') DO NOTHING
+    RETURNING reportes_jobs.id INTO v_id;
+
+    IF v_id IS NOT NULL THEN
+        RETURN QUERY SELECT v_id, 'PENDIENTE'::VARCHAR, true;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT j.id, j.estado, false
+    FROM reportes_jobs j
+    WHERE j.clave = p_clave AND j.estado IN ('PENDIENTE', 'PROCESANDO')
+    LIMIT 1;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION encolar_reporte_job(VARCHAR, JSONB, TEXT, UUID, TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION encolar_reporte_job(VARCHAR, JSONB, TEXT, UUID, TIMESTAMPTZ) TO service_role;
@@ -0,0 +1,105 @@
+-- Migration: Dueño de los eventos de analytics según la promoción
+-- promociones_analytics.comercio_id viene del cliente (endpoint público, sin
+-- autenticación): un evento con el id de otro comercio movía todo el balde
+-- (oferta, día) a ese comercio en los agregados diarios. El comercio se toma
+-- ahora de promociones.comercio_id, tanto al acumular como al leer la cola de
+-- eventos crudos en metricas_comercio.
+
+CREATE INDEX IF NOT EXISTS idx_promociones_comercio_id
+    ON promociones (comercio_id);
+
+-- 1. Corrige los agregados ya acumulados
+UPDATE promociones_analytics_diario d
+SET comercio_id = p.comercio_id
+FROM promociones p
+WHERE p.id = d.promocion_id
+  AND d.comercio_id IS DISTINCT FROM p.comercio_id;
+
+-- 2. Acumulación: el comercio sale de la promoción, no del evento
+CREATE OR REPLACE FUNCTION acumular_analytics_diario(p_hasta TIMESTAMP WITH TIME ZONE)
+RETURNS TABLE (eventos BIGINT, desde TIMESTAMP WITH TIME ZONE, hasta TIMESTAMP WITH TIME ZONE)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_desde TIMESTAMP WITH TIME ZONE;
+    v_eventos BIGINT := 0;
+BEGIN
+    INSERT INTO jobs_watermarks (job, marca)
+    VALUES ('analytics_diario', '-infinity')
+    ON CONFLICT (job) DO NOTHING;
+
+    SELECT w.marca INTO v_desde
+    FROM jobs_watermarks w
+    WHERE w.job = 'analytics_diario'
+    FOR UPDATE;
+
+    IF p_hasta > v_desde THEN
+        WITH nuevos AS (
+            SELECT a.promocion_id,
+                   p.comercio_id,
+                   (a.created_at AT TIME ZONE 'America/Argentina/Buenos_Aires')::date AS fecha,
+                   a.tipo_evento,
+                   count(*) AS cantidad
+            FROM promociones_analytics a
+            JOIN promociones p ON p.id = a.promocion_id
+            WHERE a.created_at > v_desde
+              AND a.created_at <= p_hasta
+            GROUP BY a.promocion_id, p.comercio_id, 3, a.tipo_evento
+        ), acumulados AS (
+            INSERT INTO promociones_analytics_diario AS d
+                (promocion_id, comercio_id, fecha, tipo_evento, cantidad)
+            SELECT promocion_id, comercio_id, fecha, tipo_evento, cantidad FROM nuevos
+            ON CONFLICT (promocion_id, fecha, tipo_evento)
+            DO UPDATE SET cantidad = d.cantidad + EXCLUDED.cantidad,
+                          comercio_id = EXCLUDED.comercio_id
+        )
+        -- El INSERT del CTE se ejecuta aunque no se lo referencie
+        SELECT COALESCE(sum(cantidad), 0) INTO v_eventos FROM nuevos;
+
+        UPDATE jobs_watermarks
+        SET marca = p_hasta, actualizado_en = timezone('utc'::text, now())
+        WHERE job = 'analytics_diario';
+    END IF;
+
+    RETURN QUERY SELECT v_eventos, v_desde, GREATEST(v_desde, p_hasta);
+END;
+$$;
+
+-- 3. Métricas: la cola de eventos crudos también se filtra por la promoción
+CREATE OR REPLACE FUNCTION metricas_comercio(p_comercio_id UUID, p_desde DATE)
+RETURNS TABLE (promocion_id UUID, tipo_evento VARCHAR, cantidad BIGINT)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH marca AS (
+        SELECT COALESCE(
+            (SELECT w.marca FROM jobs_watermarks w WHERE w.job = 'analytics_diario'),
+            '-infinity'::timestamptz
+        ) AS valor
+    )
+    SELECT t.promocion_id, t.tipo_evento, sum(t.cantidad)::bigint
+    FROM (
+        SELECT d.promocion_id, d.tipo_evento, d.cantidad::bigint AS cantidad
+        FROM promociones_analytics_diario d
+        WHERE d.comercio_id = p_comercio_id
+          AND d.fecha >= p_desde
+        UNION ALL
+        SELECT a.promocion_id, a.tipo_evento, 1::bigint
+        FROM promociones_analytics a
+        JOIN promociones p ON p.id = a.promocion_id
+        CROSS JOIN marca m
+        WHERE p.comercio_id = p_comercio_id
+          AND a.created_at > m.valor
+          AND (a.created_at AT TIME ZONE 'America/Argentina/Buenos_Aires')::date >= p_desde
+    ) t
+    GROUP BY t.promocion_id, t.tipo_evento;
+$$;
+
+REVOKE EXECUTE ON FUNCTION acumular_analytics_diario(TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION metricas_comercio(UUID, DATE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION acumular_analytics_diario(TIMESTAMP WITH TIME ZONE) TO service_role;
+GRANT EXECUTE ON FUNCTION metricas_comercio(UUID, DATE) TO service_role;